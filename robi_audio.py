@@ -4,63 +4,33 @@
 from __future__ import annotations
 
 import argparse
+import math
+import multiprocessing as mp
 import os
 import json
-import socket
-import subprocess
+import queue
+import threading
 import time
+from array import array
+from collections import deque
 from dataclasses import dataclass
 from typing import Optional, List
 
 import webrtcvad
-from vosk import Model, KaldiRecognizer  # type: ignore
-from robi_constants import BUS_SOCKET, VOSK_EN_MODEL, VOSK_TR_MODEL
+from robi_client import BusClient
+from robi_constants import BUS_SOCKET, MIC_RING_PATH, VOSK_EN_MODEL, VOSK_TR_MODEL
 from robi_events import make_event
+from robi_models import SessionLost, make_recognizer, open_model
+from robi_rpc import RpcServer, request_topic
+from robi_sources import AudioSource, device_spec, open_source
+from robi_stateboard import slot_writer
+from robi_wakeword import StreamingWake
 
 # -----------------------------
 # Bus client
 # -----------------------------
-class BusClient:
-    def __init__(self, sock_path: str):
-        self.sock_path = sock_path
-        self.pub = self._connect(role="PUB")
-        self.sub = self._connect(role="SUB")
-        self._sub_buf = b""
-
-    def _connect(self, role: str) -> socket.socket:
-        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        s.connect(self.sock_path)
-        s.sendall((role + "\n").encode())
-        return s
-
-    def publish(self, ev: dict):
-        line = (json.dumps(ev, ensure_ascii=False) + "\n").encode()
-        self.pub.sendall(line)
-
-    def poll(self) -> Optional[dict]:
-        self.sub.settimeout(0.0)
-        try:
-            chunk = self.sub.recv(4096)
-            if not chunk:
-                return None
-            self._sub_buf += chunk
-        except BlockingIOError:
-            return None
-        except Exception:
-            return None
-        finally:
-            try:
-                self.sub.settimeout(None)
-            except Exception:
-                pass
-
-        if b"\n" not in self._sub_buf:
-            return None
-        line, self._sub_buf = self._sub_buf.split(b"\n", 1)
-        try:
-            return json.loads(line.decode("utf-8", errors="ignore"))
-        except Exception:
-            return None
+# Audio'nun bus'tan dinlediği event'ler (geri kalanı bus'ta filtrelenir)
+BUS_TOPICS = ["LISTEN", "TTS_START", "TTS_END", "DONE", request_topic("audio")]
 
 
 # -----------------------------
@@ -73,11 +43,22 @@ class AudioCfg:
     channels: int = 1
     frame_ms: int = 20
     vad_mode: int = 2
+    # robi_mic ring'i (tek capture owner); None → cihazı kendi arecord'umuzla aç
+    mic_ring: Optional[str] = MIC_RING_PATH
+    # robi_sources spec (file:test.wav, synth:noise, sd:1 ...); None → mic_ring / arecord
+    source: Optional[str] = None
+    source_realtime: bool = True    # dosya replay: False → olabildiğince hızlı
 
     # wake
     wake_grammar: Optional[List[str]] = None
     wake_accept: Optional[List[str]] = None
     wake_cooldown: float = 1.2
+    # streaming wake: tek grammar recognizer sürekli beslenir, "robi" partial'da
+    # görülünce tetiklenir (False: VAD segmenti bitince yeniden decode)
+    wake_streaming: bool = True
+    wake_hangover_ms: int = 300     # son konuşma frame'inden sonra beslemeye devam
+    wake_partial_ms: int = 100      # PartialResult kontrol aralığı
+    wake_reset_sec: float = 10.0    # kesintisiz seste (TV) recognizer state'i sınırı
 
     # listening
     listen_max_sec: float = 6.0
@@ -87,13 +68,100 @@ class AudioCfg:
     debug: bool = False
     stt_min_confidence: float = 0.55
     stt_min_chars: int = 3
+    # streaming STT: frame'ler konuşma sürerken recognizer'a gider, endpoint'te
+    # sadece FinalResult kalır (False: eski buffer-then-decode)
+    stt_streaming: bool = True
+    stt_partials: bool = False          # UTTERANCE_PARTIAL event'leri
+    stt_partial_interval_ms: int = 300
+    # TR STT ayrı process'te (Pipe): uzun decode wake / bus / timeout'u bekletmez
+    stt_worker: bool = True
+    # robi_models.py: modeller tek process'te; None → socket varsa kullan
+    model_server: Optional[bool] = None
     tts_resume_delay_ms: int = 400
+    # capture thread → işleme döngüsü arası tampon (uzun STT decode'u sırasında dolar)
+    capture_buffer_sec: float = 8.0
 
 
 def now_ts() -> float:
     return time.time()
 
 
+def source_spec(cfg: AudioCfg) -> str:
+    return cfg.source or device_spec(cfg.mic_ring, cfg.arecord_device)
+
+
+def frame_level(data: bytes) -> tuple:
+    """S16_LE frame → (rms, peak), 0..1"""
+    a = array("h", data)
+    if not a:
+        return 0.0, 0.0
+    peak = max(max(a), -min(a))
+    rms = math.sqrt(sum(x * x for x in a) / len(a))
+    return rms / 32768.0, peak / 32768.0
+
+
+# -----------------------------
+# Capture ring (capture thread → processing loop)
+# -----------------------------
+class FrameRing:
+    """
+    Preallocated single-producer / single-consumer frame ring.
+    Producer: slot() → fill in place (readinto) → commit(). Consumer: get().
+    If the consumer falls behind by a full ring, commit() drops the oldest
+    frame and counts it in `overruns`; the producer never blocks. A slot
+    handed out but never committed (read timeout) costs nothing.
+    """
+
+    def __init__(self, frame_bytes: int, nframes: int):
+        self.frame_bytes = frame_bytes
+        self.nframes = max(2, nframes)
+        # +1 yedek slot: ring doluyken bile yazılan slot okunmamış bir frame'in üstüne düşmez
+        self._slots = self.nframes + 1
+        self._buf = bytearray(frame_bytes * self._slots)
+        self._mv = memoryview(self._buf)
+        self._ts = [0.0] * self._slots
+        self.head = 0           # yazılan frame sayısı
+        self.tail = 0           # okunan frame sayısı
+        self.overruns = 0       # tüketici yetişemediği için atılan frame'ler
+        self.last_ts = 0.0      # get() ile dönen son frame'in capture zamanı
+        self._cond = threading.Condition()
+
+    def slot(self) -> memoryview:
+        """View of the next slot to fill (never one the consumer can still read)."""
+        p = (self.head % self._slots) * self.frame_bytes
+        return self._mv[p:p + self.frame_bytes]
+
+    def commit(self, ts: Optional[float] = None):
+        with self._cond:
+            if self.head - self.tail >= self.nframes:
+                # ring dolu: okunmamış en eski frame atılır (sadece gerçekten yeni frame yazıldıysa)
+                self.overruns += 1
+                self.tail += 1
+            self._ts[self.head % self._slots] = now_ts() if ts is None else ts
+            self.head += 1
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """Oldest unread frame (copy) or None on timeout."""
+        with self._cond:
+            if self.head == self.tail and not self._cond.wait_for(lambda: self.head != self.tail, timeout):
+                return None
+            i = self.tail % self._slots
+            p = i * self.frame_bytes
+            data = bytes(self._mv[p:p + self.frame_bytes])
+            self.last_ts = self._ts[i]
+            self.tail += 1
+            self._cond.notify()     # wait_space() bekleyen producer
+            return data
+
+    def wait_space(self, timeout: Optional[float] = None) -> bool:
+        """Block until a commit would not drop a frame (backpressure for replay). False: timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.head - self.tail < self.nframes, timeout)
+
+    def pending(self) -> int:
+        return self.head - self.tail
+
 
 # -----------------------------
 # VAD segmenter (frame -> utterance)
@@ -154,18 +222,24 @@ class Segmenter:
 # Recognizers
 # -----------------------------
 class WakeRecognizer:
-    def __init__(self, model: Model, cfg: AudioCfg):
+    def __init__(self, model, cfg: AudioCfg):
         grammar = cfg.wake_grammar or ["robi", "roby", "robby", "rubi"]
         self.accept = cfg.wake_accept or ["robi", "roby", "robby", "rubi"]
-        self.rec = KaldiRecognizer(model, cfg.sample_rate, json.dumps(grammar, ensure_ascii=False))
+        self.rec = make_recognizer(model, cfg.sample_rate, json.dumps(grammar, ensure_ascii=False))
         self.rec.SetWords(True)
 
-    def detect(self, utt: bytes) -> Optional[dict]:
+    def _decode(self, utt: bytes) -> dict:
         self.rec.Reset()
         for i in range(0, len(utt), 4000):
             self.rec.AcceptWaveform(utt[i:i + 4000])
+        return json.loads(self.rec.FinalResult() or "{}")
+
+    def detect(self, utt: bytes) -> Optional[dict]:
+        try:
+            data = self._decode(utt)
+        except SessionLost:
+            data = self._decode(utt)    # model server yeniden başladı: segment elde, baştan çöz
 
-        data = json.loads(self.rec.FinalResult() or "{}")
         text = (data.get("text") or "").strip().lower()
         if not text:
             return None
@@ -183,18 +257,29 @@ class WakeRecognizer:
 
 
 class SttRecognizer:
-    def __init__(self, model: Model, cfg: AudioCfg):
-        self.rec = KaldiRecognizer(model, cfg.sample_rate)
+    def __init__(self, model, cfg: AudioCfg):
+        self.rec = make_recognizer(model, cfg.sample_rate)
         self.rec.SetWords(False)
+        self._parts: List[dict] = []
 
-    def transcribe(self, utt: bytes) -> dict:
+    # ---- streaming ----
+    def begin(self):
         self.rec.Reset()
-        for i in range(0, len(utt), 4000):
-            self.rec.AcceptWaveform(utt[i:i + 4000])
+        self._parts = []
+
+    def feed(self, chunk: bytes):
+        # True: Kaldi kendi içinde bir endpoint buldu → o parçanın sonucu şimdi alınmazsa kaybolur
+        if self.rec.AcceptWaveform(chunk):
+            self._parts.append(json.loads(self.rec.Result() or "{}"))
 
-        data = json.loads(self.rec.FinalResult() or "{}")
-        text = (data.get("text") or "").strip()
-        words = data.get("result") if isinstance(data.get("result"), list) else []
+    def partial(self) -> str:
+        return (json.loads(self.rec.PartialResult() or "{}").get("partial") or "").strip()
+
+    def end(self) -> dict:
+        self._parts.append(json.loads(self.rec.FinalResult() or "{}"))
+        parts, self._parts = self._parts, []
+        text = " ".join(t for t in ((d.get("text") or "").strip() for d in parts) if t)
+        words = [w for d in parts if isinstance(d.get("result"), list) for w in d["result"]]
         conf = None
         if words:
             confs = [
@@ -206,8 +291,247 @@ class SttRecognizer:
                 conf = sum(confs) / len(confs)
         return {"text": text, "confidence": conf, "words": words}
 
+    # ---- batch (whole utterance) ----
+    def transcribe(self, utt: bytes) -> dict:
+        for attempt in (0, 1):
+            try:
+                self.begin()
+                for i in range(0, len(utt), 4000):
+                    self.feed(utt[i:i + 4000])
+                return self.end()
+            except SessionLost:
+                if attempt:
+                    raise
+        raise AssertionError("unreachable")
+
+
+class StreamingStt:
+    """
+    Segmenter + SttRecognizer, incremental: every frame of a speech segment is
+    decoded as it arrives, so at the endpoint only FinalResult() is left.
+    push() returns the result dict at the endpoint, None otherwise (also when
+    the segment was too short, same as Segmenter.push).
+    """
+
+    def __init__(self, seg: Segmenter, stt: SttRecognizer, on_partial=None, partial_interval_ms: int = 300):
+        self.seg = seg
+        self.stt = stt
+        self.on_partial = on_partial
+        self.partial_interval = partial_interval_ms / 1000.0
+        self._next_partial = 0.0
+        self._last_partial = ""
+
+    def push(self, frame: bytes) -> Optional[dict]:
+        seg = self.seg
+        was_in_speech = seg.in_speech
+        utt = seg.push(frame)
+        if utt is not None:
+            try:
+                self.stt.feed(frame)
+                return self.stt.end()
+            except SessionLost:
+                return self.stt.transcribe(utt)
+        if not seg.in_speech:
+            return None     # sessizlik ya da kısa gürültü atıldı (recognizer bir sonraki başlangıçta sıfırlanır)
+        if not was_in_speech or len(seg.buf) == 1:
+            # yeni segment (dışarıdan reset() edilmiş olabilir)
+            self.stt.begin()
+            self._last_partial = ""
+            self._next_partial = now_ts() + self.partial_interval
+        try:
+            self.stt.feed(frame)
+        except SessionLost:
+            # yeni model server session'ı: segment baştan beslenir
+            self.stt.begin()
+            self.stt.feed(b"".join(seg.buf))
+        if self.on_partial is not None and now_ts() >= self._next_partial:
+            self._next_partial = now_ts() + self.partial_interval
+            text = self.stt.partial()
+            if text and text != self._last_partial:
+                self._last_partial = text
+                self.on_partial(text)
+        return None
+
+
+# -----------------------------
+# STT worker process
+# -----------------------------
+def _stt_worker_main(conn, model_path: str, cfg: AudioCfg):
+    """
+    Child process: loads the TR model and serves one recognizer.
+    in:  ("begin", seg) ("feed", seg, frame) ("end", seg, ts) ("utt", seg, pcm, ts) ("stop",)
+    out: ("ready",) ("partial", seg, text) ("result", seg, dict, ts) ("error", seg, msg, ts)
+    Exactly one result/error per end/utt; a begin/feed failure is reported
+    at that segment's end.
+    """
+    stt = SttRecognizer(open_model(model_path, use_server=cfg.model_server), cfg)
+    conn.send(("ready",))
+    partial_every = max(1, cfg.stt_partial_interval_ms // cfg.frame_ms)
+    seg = 0
+    fed = 0
+    last_partial = ""
+    failed = None       # bu segmentte begin/feed hatası: "end" gelince error olarak döner
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            return
+        op = msg[0]
+        try:
+            if op == "feed":
+                if msg[1] != seg or failed is not None:
+                    continue    # başlangıcını kaçırdığımız / bozulmuş segment
+                text = None
+                try:
+                    stt.feed(msg[2])
+                    fed += 1
+                    if cfg.stt_partials and fed % partial_every == 0:
+                        text = stt.partial()
+                except Exception as e:
+                    failed = str(e)
+                    continue
+                if text and text != last_partial:
+                    last_partial = text
+                    conn.send(("partial", seg, text))
+            elif op == "begin":
+                seg = msg[1]
+                fed = 0
+                last_partial = ""
+                failed = None
+                try:
+                    stt.begin()
+                except Exception as e:
+                    failed = str(e)
+            elif op == "end":
+                # error sadece endpoint'e (end / utt) cevap olarak gider: inflight sayacı eşleşir
+                if msg[1] == seg and failed is not None:
+                    conn.send(("error", msg[1], failed, msg[2]))
+                    failed = None
+                    continue
+                try:
+                    out = ("result", msg[1], stt.end(), msg[2])
+                except Exception as e:
+                    out = ("error", msg[1], str(e), msg[2])
+                conn.send(out)
+            elif op == "utt":
+                try:
+                    out = ("result", msg[1], stt.transcribe(msg[2]), msg[3])
+                except Exception as e:
+                    out = ("error", msg[1], str(e), msg[3])
+                conn.send(out)
+            elif op == "stop":
+                return
+        except (EOFError, OSError):
+            return
+
+
+class SttWorker:
+    """
+    SttRecognizer-shaped proxy for _stt_worker_main. begin/feed/end/transcribe
+    only enqueue (a sender thread writes the Pipe, so the audio loop never
+    blocks on a busy worker); end()/transcribe() return None and the result
+    comes back later through poll(). frame_ts: capture time of the frame
+    being pushed (set by the caller), carried with the result for latency.
+    """
+
+    def __init__(self, model_path: str, cfg: AudioCfg):
+        self.model_path = model_path
+        self.cfg = cfg
+        self.frame_ts = 0.0
+        self.inflight = 0       # endpoint'i gönderilmiş, sonucu gelmemiş segment sayısı
+        self.restarts = 0
+        self.ready = False
+        self._seg = 0
+        self._start()
+
+    def _start(self):
+        ctx = mp.get_context("spawn")   # capture thread'li process'i fork'lamıyoruz
+        self.conn, child = ctx.Pipe()
+        self.proc = ctx.Process(
+            target=_stt_worker_main,
+            args=(child, self.model_path, self.cfg),
+            name="robi-stt",
+            daemon=True,
+        )
+        self.proc.start()
+        child.close()
+        self._q: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._sender = threading.Thread(target=self._send_loop, args=(self.conn, self._q),
+                                        name="stt-send", daemon=True)
+        self._sender.start()
+
+    @staticmethod
+    def _send_loop(conn, q):
+        while True:
+            msg = q.get()
+            if msg is None:
+                return
+            try:
+                conn.send(msg)
+            except (OSError, ValueError):
+                return  # worker öldü: poll() yeniden başlatır
+
+    # ---- SttRecognizer interface ----
+    def begin(self):
+        self._seg += 1
+        self._q.put(("begin", self._seg))
+
+    def feed(self, chunk: bytes):
+        self._q.put(("feed", self._seg, chunk))
+
+    def partial(self) -> str:
+        return ""   # partial'lar worker'dan poll() ile gelir
+
+    def end(self) -> None:
+        self.inflight += 1
+        self._q.put(("end", self._seg, self.frame_ts))
+        return None
+
+    def transcribe(self, utt: bytes) -> None:
+        self._seg += 1
+        self.inflight += 1
+        self._q.put(("utt", self._seg, utt, self.frame_ts))
+        return None
+
+    # ---- results ----
+    def poll(self) -> List[tuple]:
+        """Messages from the worker (non-blocking). Restarts a dead worker."""
+        out = []
+        try:
+            while self.conn.poll():
+                msg = self.conn.recv()
+                if msg[0] == "ready":
+                    self.ready = True
+                    continue
+                if msg[0] in ("result", "error"):
+                    self.inflight = max(0, self.inflight - 1)
+                out.append(msg)
+        except (EOFError, OSError):
+            pass
+        if not self.proc.is_alive():
+            print(f"[AUDIO][ERR] STT worker died (exit {self.proc.exitcode}), restarting")
+            self.close()
+            self.restarts += 1
+            self.inflight = 0
+            self.ready = False
+            self._start()
+        return out
+
+    def stats(self) -> dict:
+        return {"pid": self.proc.pid, "ready": self.ready, "inflight": self.inflight, "restarts": self.restarts}
+
+    def close(self):
+        self._q.put(("stop",))
+        self._q.put(None)
+        self._sender.join(timeout=1.0)
+        self.proc.join(timeout=1.0)
+        if self.proc.is_alive():
+            self.proc.terminate()
+        self.conn.close()
+
+
 # -----------------------------
-# Main audio service (single mic owner)
+# Main audio service (wake + STT; mic: robi_mic ring)
 # -----------------------------
 class RobiAudio:
     STATE_IDLE = "IDLE"
@@ -217,53 +541,198 @@ class RobiAudio:
         self.cfg = cfg
 
         # 🔊 MODELLER (AYRI)
-        self.wake_model = Model(wake_model_path)   # EN wake
-        self.stt_model = Model(stt_model_path)     # TR STT
+        self.wake_model = open_model(wake_model_path, use_server=cfg.model_server)   # EN wake
+        # segment modu: her VAD segmenti yeniden decode (stream modunda recognizer StreamingWake'te)
+        self.wake = None if cfg.wake_streaming else WakeRecognizer(self.wake_model, cfg)
+
+        # TR STT: worker process'te (model orada yüklenir) ya da bu process'te
+        self.stt_worker = None
+        if cfg.stt_worker:
+            self.stt_worker = SttWorker(stt_model_path, cfg)
+            self.stt = self.stt_worker
+        else:
+            self.stt_model = open_model(stt_model_path, use_server=cfg.model_server)     # TR STT
+            self.stt = SttRecognizer(self.stt_model, cfg)
 
-        self.wake = WakeRecognizer(self.wake_model, cfg)
-        self.stt = SttRecognizer(self.stt_model, cfg)
+        self.bus = BusClient(BUS_SOCKET, topics=BUS_TOPICS)
 
-        self.bus = BusClient(BUS_SOCKET)
+        # RPC: "audio.listen" / "audio.state" (run loop içinde servis edilir)
+        self.rpc = RpcServer("audio", self.bus)
+        self.rpc.register("listen", self._rpc_listen)
+        self.rpc.register("state", self._rpc_state)
 
         self.state = self.STATE_IDLE
         self.cooldown_until = 0.0
         self.listen_continuous = False
 
         self.seg_wake = Segmenter(cfg, max_sec=2.2)
+        self.stream_wake = None
+        if cfg.wake_streaming:
+            self.stream_wake = StreamingWake(
+                self.wake_model,
+                cfg.sample_rate,
+                cfg.frame_ms,
+                grammar=cfg.wake_grammar or ["robi", "roby", "robby", "rubi"],
+                accept=cfg.wake_accept or ["robi", "roby", "robby", "rubi"],
+                vad_mode=cfg.vad_mode,
+                hangover_ms=cfg.wake_hangover_ms,
+                partial_ms=cfg.wake_partial_ms,
+                reset_sec=cfg.wake_reset_sec,
+            )
+        # wake maliyeti: işlenen ses süresine karşı thread CPU zamanı
+        self.wake_cpu_s = 0.0
+        self.wake_audio_s = 0.0
         self.seg_listen = Segmenter(cfg, max_sec=cfg.listen_max_sec)
+        self.stream_stt = None
+        if cfg.stt_streaming:
+            self.stream_stt = StreamingStt(
+                self.seg_listen,
+                self.stt,
+                # worker modunda partial'ları worker üretir (poll ile gelir)
+                on_partial=self._publish_partial if cfg.stt_partials and not cfg.stt_worker else None,
+                partial_interval_ms=cfg.stt_partial_interval_ms,
+            )
+        # endpoint (son frame'in capture zamanı) → UTTERANCE publish, ms
+        self.endpoint_ms = deque(maxlen=50)
 
         self.frame_bytes = int(cfg.sample_rate * (cfg.frame_ms / 1000.0) * 2)
-        self._arecord = None
+        self.source: Optional[AudioSource] = None
+        self._capturing = False
+        self._capture_thread: Optional[threading.Thread] = None
+        self.frames = FrameRing(
+            self.frame_bytes,
+            int(cfg.capture_buffer_sec * 1000 / cfg.frame_ms),
+        )
+        self._reported_overruns = 0
+        # ses seviyesi her frame state board'a (bus'a değil)
+        self.level = slot_writer("audio.level")
         self.tts_mute_until = 0.0
 
-    def _start_arecord(self):
-        cmd = [
-            "arecord",
-            "-D", self.cfg.arecord_device,
-            "-f", "S16_LE",
-            "-r", str(self.cfg.sample_rate),
-            "-c", str(self.cfg.channels),
-            "-t", "raw",
-            "--buffer-size=32768",
-        ]
-        if self.cfg.debug:
-            print("[AUDIO] 🎙️ arecord:", " ".join(cmd))
-        self._arecord = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL,
-            bufsize=self.frame_bytes * 50
+    def _start_capture(self):
+        """Capture thread: AudioSource (robi_mic ring / arecord / file ...) → self.frames."""
+        self.source = open_source(
+            source_spec(self.cfg),
+            self.cfg.sample_rate,
+            self.cfg.frame_ms,
+            realtime=self.cfg.source_realtime,
+            pad_ms=500,
+            debug=self.cfg.debug,
+        )
+        self._capturing = True
+        self._capture_thread = threading.Thread(target=self._capture, name="audio-capture", daemon=True)
+        self._capture_thread.start()
+
+    def _capture(self):
+        # canlı kaynak: işleme döngüsünü hiç beklemez, ring doluysa en eski frame atılır;
+        # hızlı replay (realtime=False): ring'de yer açılana kadar bekler, frame kaybolmaz
+        frames = self.frames
+        src = self.source
+        while self._capturing:
+            if not src.realtime and not frames.wait_space(timeout=0.1):
+                continue
+            if src.readinto(frames.slot(), timeout=0.1):
+                frames.commit(src.ts)
+            elif src.eof:
+                print(f"[AUDIO] 📼 source ended: {src.stats()} overruns={frames.overruns}")
+                break
+
+    def _stop_capture(self):
+        self._capturing = False
+        src = self.source
+        if src is not None:
+            src.close()     # arecord pipe kapanır → readinto EOF ile döner
+        t = self._capture_thread
+        if t is not None:
+            t.join(timeout=1.0)
+            self._capture_thread = None
+        c = self.capture_counters()
+        if c["overruns"] or c["mic_dropped"] or c["restarts"]:
+            print(f"[AUDIO] ⚠️ capture: {c}")
+
+    def _source_done(self) -> bool:
+        """Finite source (file / synth) fully processed."""
+        return (
+            self.source is not None
+            and self.source.eof
+            and self.frames.pending() == 0
+            and not (self.stt_worker is not None and self.stt_worker.inflight)
         )
 
-    def _stop_arecord(self):
-        p = self._arecord
-        self._arecord = None
-        if not p:
-            return
+    def capture_counters(self) -> dict:
+        src = self.source
+        return {
+            "overruns": self.frames.overruns,
+            "mic_dropped": src.stats()["dropped"] if src is not None else 0,
+            "restarts": src.restarts if src is not None else 0,
+            "backlog": self.frames.pending(),
+        }
+
+    def _read_frame(self) -> Optional[bytes]:
+        """Next 20 ms frame from the capture ring (None: henüz yok)."""
+        return self.frames.get(timeout=0.05)
+
+    def _reset_wake(self):
+        self.seg_wake.reset()
+        if self.stream_wake is not None:
+            self.stream_wake.reset()
+
+    def _wake_push(self, data: bytes) -> Optional[dict]:
+        """IDLE frame → wake hit (dict) or None."""
+        t0 = time.thread_time()
         try:
-            p.terminate()
-        except Exception:
-            pass
+            if self.stream_wake is not None:
+                return self.stream_wake.push(data)
+            utt = self.seg_wake.push(data)
+            return self.wake.detect(utt) if utt else None
+        finally:
+            self.wake_cpu_s += time.thread_time() - t0
+            self.wake_audio_s += self.cfg.frame_ms / 1000.0
+
+    def wake_stats(self) -> dict:
+        hours = self.wake_audio_s / 3600.0
+        return {
+            "mode": "stream" if self.stream_wake is not None else "segment",
+            "audio_s": round(self.wake_audio_s, 1),
+            "cpu_s": round(self.wake_cpu_s, 2),
+            "cpu_s_per_audio_hour": round(self.wake_cpu_s / hours, 1) if hours else None,
+            "resets": self.stream_wake.resets if self.stream_wake is not None else 0,
+        }
+
+    def _enter_listening(self, mode: Optional[str] = None):
+        self.state = self.STATE_LISTENING
+        self.listen_continuous = mode == "auto"
+        self.seg_listen.reset()
+        self._reset_wake()  # ⛔️ wake buffer tamamen sıfırlansın
+        self._listen_started_at = now_ts()
+
+    def _muted(self) -> bool:
+        return os.path.exists("/tmp/robi_mic.lock") or now_ts() < self.tts_mute_until
+
+    def _rpc_state(self) -> dict:
+        return {
+            "state": self.state,
+            "continuous": self.listen_continuous,
+            "muted": self._muted(),
+            "capture": self.capture_counters(),
+            "stt": self.stt_stats(),
+            "wake": self.wake_stats(),
+        }
+
+    def stt_stats(self) -> dict:
+        lat = sorted(self.endpoint_ms)
+        return {
+            "mode": "stream" if self.stream_stt is not None else "batch",
+            "worker": self.stt_worker.stats() if self.stt_worker is not None else None,
+            "n": len(lat),
+            "endpoint_p50_ms": round(lat[len(lat) // 2], 1) if lat else None,
+            "endpoint_max_ms": round(lat[-1], 1) if lat else None,
+        }
+
+    def _rpc_listen(self, mode: Optional[str] = None) -> dict:
+        if self.cfg.debug:
+            print("[AUDIO] 🎧 Audio got rpc listen -> LISTENING")
+        self._enter_listening(mode)
+        return self._rpc_state()
 
     def _publish(self, typ: str, **payload):
         # 1) Legacy bus event (Brain/Core bunu bekliyor)
@@ -282,78 +751,201 @@ class RobiAudio:
                 )
             )
 
+    def _publish_partial(self, text: str):
+        if self.cfg.debug:
+            print("[AUDIO][STT][PARTIAL]", repr(text))
+        self.bus.publish({"type": "UTTERANCE_PARTIAL", "ts": now_ts(), "text": text})
+
+    def _listen_push(self, data: bytes) -> Optional[dict]:
+        """LISTENING frame → STT result at the endpoint (None: konuşma sürüyor / yok)."""
+        if self.stream_stt is not None:
+            return self.stream_stt.push(data)
+        utt = self.seg_listen.push(data)
+        if not utt:
+            return None
+        return self.stt.transcribe(utt)
+
+    def _on_bus_event(self, ev: dict):
+        # RPC isteği (listen/state): cevap aynı turda döner
+        if self.rpc.handle(ev):
+            return
+
+        typ = ev.get("type")
+
+        # Brain dinle dedi (eski fire-and-forget yol)
+        if typ == "LISTEN":
+            if self.cfg.debug:
+                print("[AUDIO] 🎧 Audio got LISTEN -> LISTENING")
+            self._enter_listening(ev.get("mode"))
+            return
+
+        # TTS başladıysa mic sustur ama STATE DEĞİŞTİRME
+        if typ == "TTS_START":
+            if self.cfg.debug:
+                print("[AUDIO] 🔇 Audio got TTS_START (mic muted)")
+            self._reset_wake()
+            self.tts_mute_until = max(self.tts_mute_until, now_ts())
+            return
+        if typ == "TTS_END":
+            if self.cfg.debug:
+                print("[AUDIO] 🔈 Audio got TTS_END (resume after delay)")
+            self.tts_mute_until = max(
+                self.tts_mute_until,
+                now_ts() + (self.cfg.tts_resume_delay_ms / 1000.0),
+            )
+            self._reset_wake()
+            self.seg_listen.reset()
+            return
+
+        # Brain iş bitti dedi
+        if typ == "DONE":
+            if self.cfg.debug:
+                print("[AUDIO] 🟦 Audio got DONE -> IDLE")
+            self.cooldown_until = now_ts() + 3
+            self.state = self.STATE_IDLE
+            self._reset_wake()
+            self.seg_listen.reset()
+
+    def _handle_stt_result(self, result: dict, endpoint_ts: float):
+        """STT result (inline ya da worker'dan) → filtre → UTTERANCE → state geçişi."""
+        # 🔒 text HER ZAMAN tanımlı
+        text = ""
+        raw_text = ""
+        confidence = None
+        words = []
+
+        try:
+            raw_text = result.get("text", "") or ""
+            text = raw_text
+            confidence = result.get("confidence")
+            words = result.get("words") or []
+            if text and confidence is not None and confidence < self.cfg.stt_min_confidence:
+                if self.cfg.debug:
+                    print(
+                        "[AUDIO][STT][FILTER]",
+                        "low confidence",
+                        confidence,
+                        "text=",
+                        repr(text),
+                    )
+                text = ""
+            if text and len(text) < self.cfg.stt_min_chars:
+                if self.cfg.debug:
+                    print(
+                        "[AUDIO][STT][FILTER]",
+                        "too short",
+                        len(text),
+                        "text=",
+                        repr(text),
+                    )
+                text = ""
+            if text:
+                print("[AUDIO][STT]", repr(text))
+            else:
+                print("[AUDIO][STT] (empty)")
+            if self.cfg.debug:
+                print(
+                    "[AUDIO][STT][DETAIL]",
+                    "conf=",
+                    confidence,
+                    "words=",
+                    len(words),
+                    "raw=",
+                    repr(raw_text),
+                )
+            if self.cfg.debug:
+                print("[AUDIO] 🗣 STT:", repr(text))
+        except Exception as e:
+            print("[AUDIO][ERR] STT failed:", e)
+
+        # ✅ UTTERANCE'ı mutlaka publish et (boş bile olsa)
+        endpoint_ms = (now_ts() - endpoint_ts) * 1000.0
+        self.endpoint_ms.append(endpoint_ms)
+        if self.cfg.debug:
+            print(f"[AUDIO][STT] endpoint -> UTTERANCE {endpoint_ms:.0f} ms")
+        self._publish("UTTERANCE", text=text, confidence=confidence, words=words,
+                      endpoint_ms=round(endpoint_ms, 1))
+
+        # seg_listen endpoint'te kendini sıfırladı; burada tekrar reset etmiyoruz:
+        # worker modunda sonuç gelene kadar yeni bir segment başlamış olabilir
+        if not text and not self.listen_continuous:
+            # boş transkripsiyon: tek seferlik dinlemede WAKE'e dönme,
+            # kısa bir pencere daha dinlemeye devam et
+            self._listen_started_at = now_ts()
+            return
+
+        if self.listen_continuous:
+            self._listen_started_at = now_ts()
+        else:
+            # ✅ tek seferlik dinleme bitti: tekrar WAKE moduna dön
+            self.cooldown_until = now_ts() + 0.8
+            self.state = self.STATE_IDLE
+            self._reset_wake()
+            self.seg_listen.reset()
+
+    def _poll_stt_worker(self):
+        for msg in self.stt_worker.poll():
+            kind = msg[0]
+            if kind == "partial":
+                if self.state == self.STATE_LISTENING:
+                    self._publish_partial(msg[2])
+                continue
+            if kind == "error":
+                print("[AUDIO][ERR] STT failed:", msg[2])
+                result, endpoint_ts = {"text": "", "confidence": None, "words": []}, msg[3]
+            else:
+                result, endpoint_ts = msg[2], msg[3]
+            if self.state != self.STATE_LISTENING:
+                # sonuç gelene kadar DONE/timeout ile dinleme bitti: bayat sonuç
+                if self.cfg.debug:
+                    print("[AUDIO][STT] stale result dropped:", repr(result.get("text")))
+                continue
+            self._handle_stt_result(result, endpoint_ts or now_ts())
+
     def run(self):
         print("[AUDIO] 🎧 ROBI Audio online")
-        print("[AUDIO]   device:", self.cfg.arecord_device)
-        self._start_arecord()
+        print("[AUDIO]   source:", source_spec(self.cfg))
+        self._start_capture()
 
         try:
             while True:
-                ev = self.bus.poll()
-
-                # Brain dinle dedi
-                if ev and ev.get("type") == "LISTEN":
-                    if self.cfg.debug:
-                        print("[AUDIO] 🎧 Audio got LISTEN -> LISTENING")
-                    self.state = self.STATE_LISTENING
-                    self.listen_continuous = ev.get("mode") == "auto"
-                    self.seg_listen.reset()
-                    self.seg_wake.reset()  # ⛔️ wake buffer tamamen sıfırlansın
-                    self._listen_started_at = now_ts()
-                    continue
-
-                # TTS başladıysa mic sustur ama STATE DEĞİŞTİRME
-                if ev and ev.get("type") == "TTS_START":
-                    if self.cfg.debug:
-                        print("[AUDIO] 🔇 Audio got TTS_START (mic muted)")
-                    self.seg_wake.reset()
-                    self.tts_mute_until = max(self.tts_mute_until, now_ts())
-                    continue
-                if ev and ev.get("type") == "TTS_END":
-                    if self.cfg.debug:
-                        print("[AUDIO] 🔈 Audio got TTS_END (resume after delay)")
-                    self.tts_mute_until = max(
-                        self.tts_mute_until,
-                        now_ts() + (self.cfg.tts_resume_delay_ms / 1000.0),
-                    )
-                    self.seg_wake.reset()
-                    self.seg_listen.reset()
-                    continue
-
-                # Brain iş bitti dedi
-                if ev and ev.get("type") == "DONE":
-                    if self.cfg.debug:
-                        print("[AUDIO] 🟦 Audio got DONE -> IDLE")
-                    self.cooldown_until = now_ts() + 3
-                    self.state = self.STATE_IDLE
-                    self.seg_wake.reset()
-                    self.seg_listen.reset()
+                # Bekleyen tüm bus event'leri (kontrol olanlar önce) bu frame'de işlenir
+                for ev in self.bus.recv_many(timeout=0.0):
+                    self._on_bus_event(ev)
+
+                # STT worker sonuçları (asenkron; wake bu arada frame hızında sürer)
+                if self.stt_worker is not None:
+                    self._poll_stt_worker()
+
+                data = self._read_frame()
+                if data is None:
+                    if self._source_done():
+                        break
                     continue
+                if self.frames.overruns != self._reported_overruns:
+                    print(f"[AUDIO] ⚠️ capture overrun: {self.frames.overruns - self._reported_overruns} "
+                          f"frames dropped (processing too slow)")
+                    self._reported_overruns = self.frames.overruns
 
                 # 🔇 TTS sırasında mic tamamen kapalı: kendi sesini dinleme
+                # (frame yine okunup atılır: TTS sesi kuyrukta birikip sonra işlenmesin)
                 if os.path.exists("/tmp/robi_mic.lock"):
-                    self.seg_wake.reset()
+                    self._reset_wake()
                     self.seg_listen.reset()
                     continue
                 if now_ts() < self.tts_mute_until:
-                    self.seg_wake.reset()
+                    self._reset_wake()
                     self.seg_listen.reset()
                     continue
 
-                data = self._arecord.stdout.read(self.frame_bytes)
-                if not data or len(data) != self.frame_bytes:
-                    continue
+                self.level.write(*frame_level(data))
 
                 # -------- IDLE: Wake bekle --------
                 if self.state == self.STATE_IDLE:
                     if now_ts() < self.cooldown_until:
                         continue
 
-                    utt = self.seg_wake.push(data)
-                    if not utt:
-                        continue
-
-                    hit = self.wake.detect(utt)
+                    hit = self._wake_push(data)
                     if hit:
                         # ⛔️ cooldown süresince WAKE BASMA
                         if now_ts() < self.cooldown_until:
@@ -371,9 +963,20 @@ class RobiAudio:
 
                 # -------- LISTENING: STT --------
                 elif self.state == self.STATE_LISTENING:
-                    utt = self.seg_listen.push(data)
-                    if not utt:
-                        # ✅ TIMEOUT kontrolü (hiç konuşma gelmediyse)
+                    if self.stt_worker is not None:
+                        self.stt_worker.frame_ts = self.frames.last_ts
+                    try:
+                        result = self._listen_push(data)
+                    except Exception as e:
+                        print("[AUDIO][ERR] STT failed:", e)
+                        self.seg_listen.reset()
+                        result = {"text": "", "confidence": None, "words": []}
+                    endpoint_ts = self.frames.last_ts
+
+                    if result is None:
+                        # ✅ TIMEOUT kontrolü (hiç konuşma gelmediyse; worker'da bekleyen sonuç varsa değil)
+                        if self.stt_worker is not None and self.stt_worker.inflight:
+                            continue
                         if now_ts() - getattr(self, "_listen_started_at", now_ts()) >= self.cfg.listen_max_sec:
                             if self.cfg.debug:
                                 print("[AUDIO] ⏱️ LISTEN timeout -> publish TIMEOUT")
@@ -384,83 +987,16 @@ class RobiAudio:
                             else:
                                 self.cooldown_until = now_ts() + 0.8
                                 self.state = self.STATE_IDLE
-                                self.seg_wake.reset()
+                                self._reset_wake()
                                 self.seg_listen.reset()
                         continue
 
-                    # 🔒 text HER ZAMAN tanımlı
-                    text = ""
-                    raw_text = ""
-                    confidence = None
-                    words = []
-
-                    try:
-                        result = self.stt.transcribe(utt)
-                        raw_text = result.get("text", "") or ""
-                        text = raw_text
-                        confidence = result.get("confidence")
-                        words = result.get("words") or []
-                        if text and confidence is not None and confidence < self.cfg.stt_min_confidence:
-                            if self.cfg.debug:
-                                print(
-                                    "[AUDIO][STT][FILTER]",
-                                    "low confidence",
-                                    confidence,
-                                    "text=",
-                                    repr(text),
-                                )
-                            text = ""
-                        if text and len(text) < self.cfg.stt_min_chars:
-                            if self.cfg.debug:
-                                print(
-                                    "[AUDIO][STT][FILTER]",
-                                    "too short",
-                                    len(text),
-                                    "text=",
-                                    repr(text),
-                                )
-                            text = ""
-                        if text:
-                            print("[AUDIO][STT]", repr(text))
-                        else:
-                            print("[AUDIO][STT] (empty)")
-                        if self.cfg.debug:
-                            print(
-                                "[AUDIO][STT][DETAIL]",
-                                "conf=",
-                                confidence,
-                                "words=",
-                                len(words),
-                                "raw=",
-                                repr(raw_text),
-                            )
-                        if self.cfg.debug:
-                            print("[AUDIO] 🗣 STT:", repr(text))
-                    except Exception as e:
-                        print("[AUDIO][ERR] STT failed:", e)
-
-                    # ✅ UTTERANCE'ı mutlaka publish et (boş bile olsa)
-                    self._publish("UTTERANCE", text=text, confidence=confidence, words=words)
-
-                    if not text and not self.listen_continuous:
-                        # boş transkripsiyon: tek seferlik dinlemede WAKE'e dönme,
-                        # kısa bir pencere daha dinlemeye devam et
-                        self._listen_started_at = now_ts()
-                        self.seg_listen.reset()
-                        continue
-
-                    if self.listen_continuous:
-                        self._listen_started_at = now_ts()
-                        self.seg_listen.reset()
-                    else:
-                        # ✅ tek seferlik dinleme bitti: tekrar WAKE moduna dön
-                        self.cooldown_until = now_ts() + 0.8
-                        self.state = self.STATE_IDLE
-                        self.seg_wake.reset()
-                        self.seg_listen.reset()
+                    self._handle_stt_result(result, endpoint_ts)
                     continue
         finally:
-            self._stop_arecord()
+            self._stop_capture()
+            if self.stt_worker is not None:
+                self.stt_worker.close()
             print("[AUDIO] \n🎧 ROBI Audio offline")
 
 # -----------------------------
@@ -473,8 +1009,23 @@ def parse_args():
     ap.add_argument(
         "--device",
         default="plughw:CARD=sndrpigooglevoi,DEV=0",
-        help="arecord -D device"
+        help="arecord -D device (only with --own-mic)"
     )
+    ap.add_argument("--mic-ring", default=MIC_RING_PATH, help="robi_mic.py PCM ring to read from")
+    ap.add_argument("--own-mic", action="store_true",
+                    help="open the device with our own arecord instead of the robi_mic ring (legacy)")
+    ap.add_argument("--source", default=None,
+                    help="robi_sources spec instead of the mic: file:test.wav, sd:DEV, synth:noise:10 ...")
+    ap.add_argument("--replay-fast", action="store_true", help="replay --source files as fast as possible")
+    ap.add_argument("--stt-mode", choices=["stream", "batch"], default="stream",
+                    help="stream: decode while the user talks; batch: decode the whole utterance at the endpoint")
+    ap.add_argument("--partials", action="store_true", help="publish UTTERANCE_PARTIAL events while listening")
+    ap.add_argument("--stt-inline", action="store_true",
+                    help="decode STT in the audio process instead of a worker process")
+    ap.add_argument("--wake-mode", choices=["stream", "segment"], default="stream",
+                    help="stream: continuous grammar spotting; segment: re-decode each VAD segment")
+    ap.add_argument("--model-server", choices=["auto", "on", "off"], default="auto",
+                    help="recognizers from robi_models.py (auto: if its socket answers) or load models here")
     ap.add_argument("--debug", action="store_true")
     return ap.parse_args()
 
@@ -483,6 +1034,14 @@ def main():
         args = parse_args()
         cfg = AudioCfg(
             arecord_device=args.device,
+            mic_ring=None if args.own_mic else args.mic_ring,
+            source=args.source,
+            source_realtime=not args.replay_fast,
+            stt_streaming=args.stt_mode == "stream",
+            stt_partials=args.partials,
+            stt_worker=not args.stt_inline,
+            wake_streaming=args.wake_mode == "stream",
+            model_server={"auto": None, "on": True, "off": False}[args.model_server],
             debug=args.debug,
             wake_grammar=["robi", "roby", "robby", "rubi"],
             wake_accept=["robi", "roby", "robby", "rubi"],
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+robi_audio_bench.py
+Offline robi_audio pipeline benchmark: real-time factor, per-stage CPU,
+endpoint → result latency and memory over a set of WAV files.
+
+Her dosya robi_sources.FileSource ile (olabildiğince hızlı) frame'lere
+bölünür, önce belleğe alınır (dosya okuma / resample ölçüme girmez), sonra
+aşamalar ayrı ayrı ölçülür:
+  vad        webrtcvad.Vad.is_speech, her frame
+  segmenter  Segmenter.push, her frame (kendi VAD'ı dahil)
+  wake       WakeRecognizer.detect, her segment (EN grammar)
+  stt        SttRecognizer.transcribe, her segment (batch: endpoint'te tüm segment)
+  stt_stream StreamingStt: frame'ler konuşma sürerken beslenir, endpoint'te FinalResult
+CPU = thread_time (vosk decode aynı thread'de); RTF = CPU / ses süresi
+(< 1: gerçek zamandan hızlı, Pi'de 1'e yaklaştıkça headroom biter).
+Latency: segment bitişi (endpoint frame'i) → sonucun hazır olduğu an (wall).
+Modeller bu process'te yüklenir (robi_models server kullanılmaz).
+
+Examples:
+  python3 robi_audio_bench.py                                # repo'daki *.wav, tüm aşamalar
+  python3 robi_audio_bench.py recordings/ --repeat 3
+  python3 robi_audio_bench.py test.wav --no-wake --stt-model models/vosk-model-small-tr-0.3
+  python3 robi_audio_bench.py --json > bench.json            # commit'ler / Pi vs x86 karşılaştırma
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+import webrtcvad  # noqa: E402
+
+from robi_audio import AudioCfg, Segmenter, StreamingStt, SttRecognizer, WakeRecognizer  # noqa: E402
+from robi_constants import VOSK_EN_MODEL, VOSK_TR_MODEL  # noqa: E402
+from robi_models import open_model  # noqa: E402
+from robi_sources import AudioSourceError, FileSource  # noqa: E402
+
+STAGES = ("vad", "segmenter", "wake", "stt", "stt_stream")
+
+
+@dataclass
+class BenchCfg:
+    paths: List[str] = field(default_factory=list)
+    rate: int = 16000
+    frame_ms: int = 20
+    vad_mode: int = 2
+    pad_ms: int = 500            # dosya sonuna sessizlik: son segment kapansın
+    repeat: int = 1
+    wake_model: Optional[str] = str(VOSK_EN_MODEL)     # None: aşama atlanır
+    stt_model: Optional[str] = str(VOSK_TR_MODEL)
+    stt_stream: bool = True
+
+
+# -----------------------------
+# Measurement helpers
+# -----------------------------
+def rss_mb(key: str = "VmRSS") -> Optional[float]:
+    """/proc/self/status memory line in MB (VmRSS: şu an, VmHWM: tepe)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(key + ":"):
+                    return round(int(line.split()[1]) / 1024.0, 1)
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_mb() -> float:
+    peak = rss_mb("VmHWM")
+    if peak is not None:
+        return peak
+    # /proc yok (macOS): ru_maxrss byte
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024.0 * 1024.0), 1)
+
+
+def percentile(sorted_vals: List[float], p: float) -> Optional[float]:
+    if not sorted_vals:
+        return None
+    k = min(len(sorted_vals) - 1, int(round(p / 100.0 * (len(sorted_vals) - 1))))
+    return sorted_vals[k]
+
+
+class _TimedStt:
+    """SttRecognizer proxy for StreamingStt: CPU of begin/feed/end only (segmenter hariç)."""
+
+    def __init__(self, stt: SttRecognizer):
+        self.stt = stt
+        self.cpu = 0.0
+
+    def _timed(self, fn, *a):
+        t0 = time.thread_time()
+        try:
+            return fn(*a)
+        finally:
+            self.cpu += time.thread_time() - t0
+
+    def begin(self):
+        return self._timed(self.stt.begin)
+
+    def feed(self, chunk: bytes):
+        return self._timed(self.stt.feed, chunk)
+
+    def end(self) -> dict:
+        return self._timed(self.stt.end)
+
+
+def load_frames(path: str, cfg: BenchCfg) -> List[bytes]:
+    src = FileSource(path, cfg.rate, cfg.frame_ms, realtime=False, pad_ms=cfg.pad_ms)
+    frames = []
+    try:
+        while True:
+            data = src.read()
+            if data is None:
+                return frames
+            frames.append(data)
+    finally:
+        src.close()
+
+
+def wav_files(paths: List[str]) -> List[str]:
+    out = []
+    for p in paths:
+        if os.path.isdir(p):
+            out += sorted(glob.glob(os.path.join(p, "*.wav")))
+        else:
+            out.append(p)
+    return out
+
+
+# -----------------------------
+# Bench
+# -----------------------------
+def bench_file(path: str, frames: List[bytes], acfg: AudioCfg, wake, stt) -> dict:
+    period = acfg.frame_ms / 1000.0
+    cpu = {s: 0.0 for s in STAGES}
+    lat: Dict[str, List[float]] = {"wake": [], "stt": [], "stt_stream": []}
+
+    vad = webrtcvad.Vad(acfg.vad_mode)
+    speech = 0
+    t0 = time.thread_time()
+    for f in frames:
+        speech += vad.is_speech(f, acfg.sample_rate)
+    cpu["vad"] = time.thread_time() - t0
+
+    seg = Segmenter(acfg, max_sec=acfg.listen_max_sec)
+    utts = []
+    t0 = time.thread_time()
+    for i, f in enumerate(frames):
+        utt = seg.push(f)
+        if utt is not None:
+            utts.append((i, utt))
+    cpu["segmenter"] = time.thread_time() - t0
+
+    segments = []
+    for i, utt in utts:
+        row = {"end_s": round((i + 1) * period, 2), "dur_s": round(len(utt) / (2.0 * acfg.sample_rate), 2)}
+        if wake is not None:
+            c0, w0 = time.thread_time(), time.perf_counter()
+            hit = wake.detect(utt)
+            lat["wake"].append(time.perf_counter() - w0)
+            cpu["wake"] += time.thread_time() - c0
+            row["wake"] = hit["heard"] if hit else None
+        if stt is not None:
+            c0, w0 = time.thread_time(), time.perf_counter()
+            res = stt.transcribe(utt)
+            lat["stt"].append(time.perf_counter() - w0)
+            cpu["stt"] += time.thread_time() - c0
+            row["text"] = res.get("text", "")
+        segments.append(row)
+
+    stream_texts = []
+    if stt is not None and acfg.stt_streaming:
+        timed = _TimedStt(stt)
+        streaming = StreamingStt(Segmenter(acfg, max_sec=acfg.listen_max_sec), timed)
+        for f in frames:
+            w0 = time.perf_counter()
+            res = streaming.push(f)
+            if res is not None:
+                lat["stt_stream"].append(time.perf_counter() - w0)
+                stream_texts.append(res.get("text", ""))
+        cpu["stt_stream"] = timed.cpu
+
+    audio_s = len(frames) * period
+    out = {
+        "file": os.path.relpath(path, ROOT) if path.startswith(ROOT) else path,
+        "audio_s": round(audio_s, 2),
+        "speech_frames": speech,
+        "segments": segments,
+        "cpu_s": cpu,
+        "lat": lat,
+    }
+    if stream_texts:
+        out["stream_texts"] = stream_texts
+    return out
+
+
+def _lat_summary(vals: List[float]) -> dict:
+    v = sorted(vals)
+
+    def ms(x):
+        return None if x is None else round(x * 1000.0, 1)
+
+    return {"n": len(v), "p50": ms(percentile(v, 50)), "p95": ms(percentile(v, 95)), "max": ms(v[-1] if v else None)}
+
+
+def run_bench(cfg: BenchCfg) -> dict:
+    acfg = AudioCfg(
+        arecord_device="",
+        sample_rate=cfg.rate,
+        frame_ms=cfg.frame_ms,
+        vad_mode=cfg.vad_mode,
+        stt_streaming=cfg.stt_stream,
+        wake_grammar=["robi", "roby", "robby", "rubi"],
+        wake_accept=["robi", "roby", "robby", "rubi"],
+    )
+    mem = {"start_mb": rss_mb()}
+
+    load_s = {}
+    wake = stt = None
+    if cfg.wake_model:
+        t0 = time.perf_counter()
+        wake = WakeRecognizer(open_model(cfg.wake_model, use_server=False), acfg)
+        load_s["wake"] = round(time.perf_counter() - t0, 2)
+    if cfg.stt_model:
+        t0 = time.perf_counter()
+        stt = SttRecognizer(open_model(cfg.stt_model, use_server=False), acfg)
+        load_s["stt"] = round(time.perf_counter() - t0, 2)
+    mem["models_mb"] = rss_mb()
+
+    files = []
+    for path in wav_files(cfg.paths):
+        try:
+            frames = load_frames(path, cfg)
+        except (OSError, AudioSourceError) as e:
+            print(f"[BENCH] ⚠️ skip {path}: {e}", file=sys.stderr)
+            continue
+        for _ in range(cfg.repeat):
+            files.append(bench_file(path, frames, acfg, wake, stt))
+    mem["end_mb"] = rss_mb()
+    mem["peak_mb"] = peak_rss_mb()
+
+    audio_s = sum(f["audio_s"] for f in files)
+    cpu = {s: sum(f["cpu_s"][s] for f in files) for s in STAGES}
+    lats = [f.pop("lat") for f in files]
+    lat = {k: [x for fl in lats for x in fl[k]] for k in ("wake", "stt", "stt_stream")}
+    # canlı pipeline: VAD'lı segmenter + wake + STT (stream ölçüldüyse o, RobiAudio varsayılanı)
+    cpu["pipeline"] = cpu["segmenter"] + cpu["wake"] + (cpu["stt_stream"] if cfg.stt_stream else cpu["stt"])
+
+    def rtf(c):
+        return round(c / audio_s, 4) if audio_s else None
+
+    for f in files:
+        f["cpu_s"] = {s: round(v, 4) for s, v in f["cpu_s"].items()}
+    return {
+        "cfg": asdict(cfg),
+        "host": {
+            "machine": platform.machine(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "platform": platform.platform(),
+        },
+        "model_load_s": load_s,
+        "audio_s": round(audio_s, 2),
+        "segments": sum(len(f["segments"]) for f in files),
+        "cpu_s": {s: round(v, 4) for s, v in cpu.items()},
+        "rtf": {s: rtf(v) for s, v in cpu.items()},
+        "latency_ms": {k: _lat_summary(v) for k, v in lat.items()},
+        "memory_mb": mem,
+        "files": files,
+    }
+
+
+def print_report(res: dict):
+    c = res["cfg"]
+    print(f"[BENCH] {len(res['files'])} runs, {res['audio_s']} s audio, {res['segments']} segments | "
+          f"{res['host']['machine']} ×{res['host']['cpus']} py{res['host']['python']} | "
+          f"frame={c['frame_ms']}ms vad={c['vad_mode']}")
+    if res["model_load_s"]:
+        print(f"[BENCH] model load s: {res['model_load_s']}")
+    for f in res["files"]:
+        print(f"[BENCH]   {f['file']}: {f['audio_s']} s, {len(f['segments'])} segments")
+        for s in f["segments"]:
+            extra = "".join(f" {k}={s[k]!r}" for k in ("wake", "text") if k in s)
+            print(f"[BENCH]     @{s['end_s']:6.2f}s {s['dur_s']:4.2f}s{extra}")
+    print("[BENCH] stage        cpu s      RTF")
+    for s in STAGES + ("pipeline",):
+        print(f"[BENCH]   {s:<10} {res['cpu_s'][s]:8.3f}  {res['rtf'][s]}")
+    for k, v in res["latency_ms"].items():
+        if v["n"]:
+            print(f"[BENCH] endpoint→{k} ms: n={v['n']} p50={v['p50']} p95={v['p95']} max={v['max']}")
+    m = res["memory_mb"]
+    print(f"[BENCH] memory MB: start={m['start_mb']} models={m['models_mb']} end={m['end_mb']} peak={m['peak_mb']}")
+
+
+def parse_args():
+    d = BenchCfg()
+    ap = argparse.ArgumentParser(description="ROBI offline audio pipeline benchmark")
+    ap.add_argument("paths", nargs="*", help="WAV files or directories (default: repo *.wav)")
+    ap.add_argument("--rate", type=int, default=d.rate)
+    ap.add_argument("--frame-ms", type=int, default=d.frame_ms, choices=[10, 20, 30])
+    ap.add_argument("--vad-mode", type=int, default=d.vad_mode, choices=[0, 1, 2, 3])
+    ap.add_argument("--pad-ms", type=int, default=d.pad_ms, help="trailing silence per file")
+    ap.add_argument("--repeat", type=int, default=d.repeat, help="runs per file")
+    ap.add_argument("--wake-model", default=d.wake_model)
+    ap.add_argument("--stt-model", default=d.stt_model)
+    ap.add_argument("--no-wake", action="store_true", help="skip WakeRecognizer")
+    ap.add_argument("--no-stt", action="store_true", help="skip SttRecognizer")
+    ap.add_argument("--stt-mode", choices=["both", "batch"], default="both",
+                    help="both: batch transcribe + StreamingStt; batch: transcribe only")
+    ap.add_argument("--json", action="store_true", help="JSON output")
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    cfg = BenchCfg(
+        paths=args.paths or sorted(glob.glob(os.path.join(ROOT, "*.wav"))),
+        rate=args.rate,
+        frame_ms=args.frame_ms,
+        vad_mode=args.vad_mode,
+        pad_ms=args.pad_ms,
+        repeat=max(1, args.repeat),
+        wake_model=None if args.no_wake else args.wake_model,
+        stt_model=None if args.no_stt else args.stt_model,
+        stt_stream=args.stt_mode == "both",
+    )
+    for name, path in (("wake", cfg.wake_model), ("stt", cfg.stt_model)):
+        if path and not os.path.isdir(path):
+            print(f"[BENCH] ❌ {name} model not found: {path} (--{name}-model / --no-{name})", file=sys.stderr)
+            return 2
+    res = run_bench(cfg)
+    if args.json:
+        print(json.dumps(res, indent=2, ensure_ascii=False))
+    else:
+        print_report(res)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -6,13 +6,20 @@ load_dotenv()
 
 from openai import OpenAI
 
-from robi_bus import BusClient
-from robi_speech import speak, speaking_now
+from robi_client import BusClient
+from robi_rpc import RpcClient, RpcError
+from robi_speech import release_mic, speak, speaking_now
 from robi_core import CoreAction, Event, EventType, RobiCore, State
 from robi_constants import BUS_SOCKET
+from robi_events import CoreState, Done, Listen, Timeout, TtsStart, Utterance, Wake, decode
+from robi_stateboard import slot_writer
 
 client = OpenAI()
 
+# Brain'in bus'tan dinlediği event'ler (geri kalanı bus'ta filtrelenir)
+# core.state / TTS_*: restart sonrası bus'ın retained replay'i için
+BUS_TOPICS = ["WAKE", "UTTERANCE", "DONE", "TIMEOUT", "core.state", "TTS_START", "TTS_END"]
+
 SYSTEM_PROMPT = (
     "Sen ROBİ adında bir ev robotusun. "
     "Kısa, doğal ve samimi cevaplar ver. "
@@ -21,9 +28,12 @@ SYSTEM_PROMPT = (
 
 class RobiBrain:
     def __init__(self):
-        self.bus = BusClient(BUS_SOCKET)
+        self.bus = BusClient(BUS_SOCKET, topics=BUS_TOPICS)
+        self.rpc = RpcClient(BUS_SOCKET)
         self.core = RobiCore()
         self._pending_reply = ""
+        self._published_state = None
+        self._state_slot = slot_writer("core.state")
 
         # 🧠 Conversational memory (v11 ruhu)
         self.messages = [
@@ -37,6 +47,47 @@ class RobiBrain:
         while speaking_now():
             time.sleep(0.05)
 
+    def _start_listen(self, mode: str = "once"):
+        """Audio'yu LISTENING'e al ve onayını bekle; cevap yoksa eski LISTEN event'i."""
+        try:
+            st = self.rpc.call("audio", "listen", {"mode": mode}, timeout=0.3)
+            print(f"[BRAIN][DEBUG] audio.listen ok -> {st}")
+        except RpcError as e:
+            print(f"[BRAIN][DEBUG] audio.listen failed ({e}) -> publish LISTEN ({mode})")
+            self.bus.publish(Listen(mode=mode).to_dict())
+
+    # -----------------------------
+    # Core state (bus'ta retained: yeniden başlayan process'ler senkron olur)
+    # -----------------------------
+    def _core_event(self, event: Event) -> CoreAction:
+        action = self.core.handle_event(event)
+        self._publish_state()
+        return action
+
+    def _publish_state(self):
+        st = self.core.state
+        if st is self._published_state:
+            return
+        self._published_state = st
+        self._state_slot.write(st.value, st.name.encode())
+        self.bus.publish(CoreState(state=st.name).to_dict())
+
+    def _on_retained(self, ev):
+        """Bus'ın SUB sonrası verdiği son değerler (önceki brain'den kalan durum)."""
+        cls = ev.__class__
+        if cls is CoreState:
+            st = State.__members__.get(ev.state)
+            # dinleme audio'da sürüyor → kaldığı yerden; THINKING/SPEAKING yarım kaldı → IDLE
+            if st in (State.LISTENING, State.AUTO_LISTEN):
+                self.core.state = st
+                if st == State.AUTO_LISTEN:
+                    self.core.auto_listen_started_at = time.time()
+            print(f"[BRAIN] ♻️ restored core state: {ev.state} -> {self.core.state.name}")
+            self._publish_state()
+        elif cls is TtsStart:
+            print("[BRAIN] ♻️ stale TTS_START -> releasing mic")
+            release_mic()
+
     # -----------------------------
     # Core → Real world
     # -----------------------------
@@ -49,6 +100,7 @@ class RobiBrain:
             speak("İhtiyacın olursa buradayım.")
             self._wait_tts_end()
             self.core.state = State.IDLE
+            self._publish_state()
             return
 
         if action == CoreAction.SAY_ACK:
@@ -57,14 +109,13 @@ class RobiBrain:
             self._wait_tts_end()
 
             # konuşma bitti bilgisini Core'a ver
-            action = self.core.handle_event(Event(EventType.SPEAK_DONE))
+            action = self._core_event(Event(EventType.SPEAK_DONE))
             self.apply_action(action)
             return
 
         if action == CoreAction.START_LISTEN:
             mode = "auto" if self.core.state == State.AUTO_LISTEN else "once"
-            print(f"[BRAIN][DEBUG] START_LISTEN -> publish LISTEN ({mode})")
-            self.bus.publish({"type": "LISTEN", "ts": time.time(), "mode": mode})
+            self._start_listen(mode)
             return
 
         if action == CoreAction.START_THINKING:
@@ -85,7 +136,7 @@ class RobiBrain:
 
             self.messages.append({"role": "assistant", "content": self._pending_reply})
 
-            action = self.core.handle_event(Event(EventType.RESPONSE_READY))
+            action = self._core_event(Event(EventType.RESPONSE_READY))
             self.apply_action(action)
             return
 
@@ -100,36 +151,44 @@ class RobiBrain:
             speak(reply)
             self._wait_tts_end()
 
-            action = self.core.handle_event(Event(EventType.SPEAK_DONE))
+            action = self._core_event(Event(EventType.SPEAK_DONE))
             self.apply_action(action)
             return
 
     # -----------------------------
     # Bus → Core
     # -----------------------------
-    def handle_bus_event(self, ev: dict):
+    def handle_bus_event(self, raw: dict):
+        # ingress: bir kez doğrula + typed nesneye çevir (geçersiz/bilinmeyen → None)
+        ev = decode(raw)
+        if ev is None:
+            return
+        if ev.retained:
+            self._on_retained(ev)
+            return
+
         core_event = None
-        typ = ev.get("type")
+        cls = ev.__class__
 
-        if typ == "WAKE":
+        if cls is Wake:
             core_event = Event(EventType.WAKE_WORD)
 
-        elif typ == "UTTERANCE":
+        elif cls is Utterance:
             core_event = Event(
                 EventType.AUDIO_TEXT,
-                payload={"text": ev.get("text", "")},
+                payload={"text": ev.text or ""},
             )
 
-        elif typ == "DONE":
+        elif cls is Done:
             core_event = Event(EventType.SPEAK_DONE)
 
-        elif typ == "TIMEOUT":
+        elif cls is Timeout:
             core_event = Event(EventType.TIMEOUT)
 
         if not core_event:
             return
 
-        action = self.core.handle_event(core_event)
+        action = self._core_event(core_event)
         self.apply_action(action, core_event.payload)
 
     # -----------------------------
@@ -137,10 +196,8 @@ class RobiBrain:
     # -----------------------------
     def run(self):
         while True:
-            ev = self.bus.recv(timeout=0.2)
-            if not ev:
-                continue
-            self.handle_bus_event(ev)
+            for ev in self.bus.recv_many(timeout=0.2):
+                self.handle_bus_event(ev)
 
 
 if __name__ == "__main__":
@@ -3,15 +3,28 @@
 
 import time
 
-from robi_bus import BusClient
+from robi_client import BusClient
+from robi_rpc import RpcClient, RpcError
 from robi_speech import speak, speaking_now
 from robi_core import CoreAction, Event, EventType, RobiCore
 from robi_constants import BUS_SOCKET
-from robi_events import make_event  # ileride kullanacağız
+from robi_events import Done, Listen, PersonDetected, Timeout, UnknownPerson, Utterance, Wake, decode
 from openai import OpenAI
 
 client = OpenAI()
 
+# Brain'in bus'tan dinlediği event'ler (geri kalanı bus'ta filtrelenir)
+# speech.heard yok: audio aynı cümleyi UTTERANCE olarak da basıyor, ikisi de
+# robi_events'te Utterance'a çözülüyor (iki kez cevaplamamak için tek topic)
+BUS_TOPICS = [
+    "WAKE",
+    "UTTERANCE",
+    "DONE",
+    "TIMEOUT",
+    "PERSON_DETECTED",
+    "UNKNOWN_PERSON",
+]
+
 SYSTEM_PROMPT = (
     "Sen ROBİ adında bir ev robotusun. "
     "Kısa, doğal ve samimi cevaplar ver. "
@@ -20,7 +33,8 @@ SYSTEM_PROMPT = (
 
 class RobiBrain:
     def __init__(self):
-        self.bus = BusClient(BUS_SOCKET)
+        self.bus = BusClient(BUS_SOCKET, topics=BUS_TOPICS)
+        self.rpc = RpcClient(BUS_SOCKET)
         self.core = RobiCore()
 
         # 🧠 Conversational memory (v11 ruhu)
@@ -38,51 +52,66 @@ class RobiBrain:
         while speaking_now():
             time.sleep(0.05)
 
+    def _start_listen(self):
+        """audio.listen RPC (onaylı); audio cevap vermezse eski LISTEN event'i."""
+        try:
+            self.rpc.call("audio", "listen", timeout=0.3)
+        except RpcError:
+            self.bus.publish(Listen().to_dict())
+
     # -----------------------------
     # Bus → Core mapping
     # -----------------------------
-    def map_bus_event_to_core(self, ev: dict):
-        if ev.get("type") == "speech.heard":
+    @staticmethod
+    def _producer_payload(ev, raw_ev) -> dict:
+        """
+        Everything the producer sent with the event: typed event sadece şemadaki
+        alanları tutar, core ise eskiden olduğu gibi payload'un tamamını görür.
+        """
+        p = raw_ev.get("payload") if raw_ev else None
+        if isinstance(p, dict):
+            out = dict(p)
+        else:
+            out = {k: v for k, v in (raw_ev or {}).items()
+                   if k not in ("type", "ts", "source", "payload", "_retained")}
+        out.update((f, getattr(ev, f)) for f in ev.fields)   # doğrulanmış alanlar
+        return out
+
+    def map_bus_event_to_core(self, ev, raw_ev=None):
+        """Typed event (robi_events.decode) → core Event; raw_ev: the bus dict it came from."""
+        cls = ev.__class__
+
+        if cls is Utterance:
             return Event(
-                EventType.SPEECH_HEARD,
-                payload={
-                    "text": ev.get("payload", {}).get("text", "")
-                }
+                EventType.AUDIO_TEXT,
+                payload={"text": ev.text or ""},
             )
 
-        typ = ev.get("type")
-
-        if typ == "DONE":
+        if cls is Done:
             return Event(EventType.SPEAK_DONE)
 
-        if typ == "WAKE":
+        if cls is Wake:
             return Event(
                 EventType.WAKE_WORD,
                 payload={
-                    "heard": ev.get("heard"),
-                    "confidence": ev.get("confidence"),
+                    "heard": ev.heard,
+                    "confidence": ev.confidence,
                 },
             )
 
-        if typ == "UTTERANCE":
-            return Event(
-                EventType.AUDIO_TEXT,
-                payload={"text": ev.get("text", "")},
-            )
-
-        if typ == "TIMEOUT":
+        if cls is Timeout:
             return Event(EventType.TIMEOUT)
 
-        if typ == "PERSON_DETECTED":
+        if cls is PersonDetected:
             return Event(
                 EventType.PERSON_DETECTED,
-                payload=ev.get("payload"),
+                payload=self._producer_payload(ev, raw_ev),
             )
 
-        if typ == "UNKNOWN_PERSON":
+        if cls is UnknownPerson:
             return Event(
                 EventType.UNKNOWN_PERSON,
-                payload=ev.get("payload"),
+                payload=self._producer_payload(ev, raw_ev),
             )
 
         # bilinmeyen event → core'a gitmez
@@ -101,7 +130,7 @@ class RobiBrain:
             # konuşma bitti: core'a haber ver
             self.core.handle_event(Event(EventType.SPEAK_DONE))
             # audio'ya dinle komutu
-            self.bus.publish({"type": "LISTEN", "ts": time.time()})
+            self._start_listen()
             return
 
         if action == CoreAction.ASK_IDENTITY:
@@ -109,11 +138,11 @@ class RobiBrain:
             self._wait_tts_end()
             # burada SPEAK_DONE YOK: çünkü isim (UTTERANCE) bekleyeceğiz
             # audio zaten LISTEN modundaysa sorun yok; değilse dinlemeyi başlat:
-            self.bus.publish({"type": "LISTEN", "ts": time.time()})
+            self._start_listen()
             return
 
         if action == CoreAction.START_LISTEN:
-            self.bus.publish({"type": "LISTEN", "ts": time.time()})
+            self._start_listen()
             return
 
         if action == CoreAction.RESPOND_TEXT:
@@ -147,7 +176,11 @@ class RobiBrain:
     # Event dispatch
     # -----------------------------
     def handle_bus_event(self, raw_ev: dict):
-        core_event = self.map_bus_event_to_core(raw_ev)
+        # ingress: legacy flat / envelope tek seferde doğrulanıp typed olur
+        ev = decode(raw_ev)
+        if ev is None:
+            return
+        core_event = self.map_bus_event_to_core(ev, raw_ev)
         if not core_event:
             return
 
@@ -160,10 +193,8 @@ class RobiBrain:
     def run(self):
         try:
             while True:
-                ev = self.bus.recv(timeout=0.2)
-                if not ev:
-                    continue
-                self.handle_bus_event(ev)
+                for ev in self.bus.recv_many(timeout=0.2):
+                    self.handle_bus_event(ev)
         except KeyboardInterrupt:
             pass
         except Exception as e:
@@ -0,0 +1,849 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+robi_bridge.py
+robi_bus ↔ TCP/UDP köprüsü (ESP32/ESP8266 çevre birimleri, ikinci Pi).
+
+TCP peer:
+  peer   → bridge: "PEER v1 name=esp-servo zlib=1 SERVO_* LED_SET\\n"  (topics: peer'e gidecek tipler)
+  bridge → peer:   "OK v1 zlib=1 <bridge'in kabul ettiği tipler>\\n"
+  sonra iki yönde batch frame'leri:
+      4 byte big-endian body uzunluğu | 1 byte flags | body
+      body = event'lerden oluşan JSON array, flags & 1 → body zlib'li
+
+UDP peer (bir datagram = bir batch): 1 byte flags | body
+  kayıt: {"type": "bridge.hello", "name": "esp-led", "topics": ["LED_*"], "zlib": false}
+  en az --udp-ttl saniyede bir bir şey yollamalı (ör. {"type": "bridge.ping"})
+
+- Peer başına topic filtresi (+ bridge'in --export / --import sınırları)
+- Küçük event'ler --batch-ms / --batch-bytes ile toplanır, kazandırırsa zlib'lenir
+- Store-and-forward: isimli peer koparsa event'leri (sınırlı) saklanır,
+  geri geldiğinde önce onlar gider
+- --connect host:port bu Pi'nin bus'ını başka bir bridge'e bağlar (ikinci Pi)
+
+Run:
+  python3 robi_bridge.py                                     # TCP 7700 + UDP 7701
+  python3 robi_bridge.py --export 'SERVO_*' --export LED_SET --import 'SENSOR_*'
+  python3 robi_bridge.py --connect 192.168.1.20:7700         # ikinci Pi
+  python3 robi_bridge.py --selftest                          # loopback testi
+"""
+
+from __future__ import annotations
+
+import argparse
+import errno
+import json
+import os
+import selectors
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Dict, List, Optional
+
+from robi_bus import BusConfig, LoopServer, Router
+from robi_client import BACKOFF_MAX, BACKOFF_MIN, BusClient
+from robi_constants import BRIDGE_TCP_PORT, BRIDGE_UDP_PORT, BUS_SOCKET
+from robi_wire import MAX_HEADER, make_header, parse_header
+
+FLAG_ZLIB = 0x01
+_HDR = struct.Struct(">IB")
+MAX_BATCH_BODY = 1 << 20   # açılmış hali dahil
+UDP_MAX = 1200             # datagram body hedefi (MTU altında kalsın)
+ZLIB_MIN = 256             # bundan küçük body sıkıştırılmaz
+MAX_HOPS = 4               # bridge zincirlerinde döngü koruması
+WBUF_MAX = 1 << 20         # TCP peer başına yazılamamış max veri
+TICK = 1.0
+
+
+# -----------------------------
+# Batch codec
+# -----------------------------
+def encode_event(ev: dict) -> bytes:
+    return json.dumps(ev, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode_batch(items: List[bytes], allow_zlib: bool) -> tuple:
+    """JSON-encoded events → (flags, body)."""
+    body = b"[" + b",".join(items) + b"]"
+    if allow_zlib and len(body) >= ZLIB_MIN:
+        z = zlib.compress(body, 6)
+        if len(z) < len(body):
+            return FLAG_ZLIB, z
+    return 0, body
+
+
+def decode_batch(flags: int, body: bytes) -> list:
+    """ValueError / zlib.error on a bad batch."""
+    if flags & FLAG_ZLIB:
+        d = zlib.decompressobj()
+        body = d.decompress(body, MAX_BATCH_BODY)
+        if d.unconsumed_tail:
+            raise ValueError("batch too large")
+    evs = json.loads(body)
+    return evs if isinstance(evs, list) else [evs]
+
+
+def tcp_frame(flags: int, body: bytes) -> bytes:
+    return _HDR.pack(len(body), flags) + body
+
+
+class BatchDecoder:
+    """TCP stream → [(flags, body)]. ValueError on an oversize frame."""
+
+    def __init__(self):
+        self.buf = bytearray()
+
+    def feed(self, chunk: bytes) -> list:
+        buf = self.buf
+        buf += chunk
+        out = []
+        pos = 0
+        n = len(buf)
+        while n - pos >= _HDR.size:
+            size, flags = _HDR.unpack_from(buf, pos)
+            if size > MAX_BATCH_BODY:
+                raise ValueError(f"batch too large: {size}")
+            end = pos + _HDR.size + size
+            if end > n:
+                break
+            out.append((flags, bytes(buf[pos + _HDR.size:end])))
+            pos = end
+        if pos:
+            del buf[:pos]
+        return out
+
+
+def matches(patterns, typ: Optional[str]) -> bool:
+    if typ is None:
+        return False
+    for p in patterns:
+        if p == "*" or p == typ or (p.endswith("*") and typ.startswith(p[:-1])):
+            return True
+    return False
+
+
+def parse_addr(s: str) -> tuple:
+    host, _, port = s.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+# -----------------------------
+# Peers
+# -----------------------------
+class Link:
+    """One remote: TCP peer, UDP peer or outgoing link to another bridge ("out")."""
+
+    def __init__(self, kind: str, name: Optional[str] = None, sock=None, addr=None):
+        self.kind = kind
+        self.name = name
+        self.sock = sock
+        self.addr = addr
+        self.topics: List[str] = []
+        self.zlib = False
+        self.up = False
+        self.connecting = False
+        self.dec = BatchDecoder()
+        self.rbuf = bytearray()    # hello / ack satırı
+        self.wbuf = bytearray()
+        self.items: List[bytes] = []   # batch'lenmeyi bekleyen event'ler
+        self.size = 0
+        self.flush_at: Optional[float] = None
+        self.last_seen = time.monotonic()
+        self.next_try = 0.0
+        self.backoff = BACKOFF_MIN
+        self.sent = 0
+        self.received = 0
+        self.frames = 0
+        self.dropped = 0
+
+    def label(self) -> str:
+        return self.name or (f"{self.addr[0]}:{self.addr[1]}" if self.addr else self.kind)
+
+
+class _Store:
+    """Events for a named peer that is away (store-and-forward)."""
+
+    def __init__(self, name: str, topics: List[str], max_items: int, max_age: float):
+        self.name = name
+        self.topics = topics
+        self.q = deque(maxlen=max_items)
+        self.max_age = max_age
+        self.dropped = 0
+
+    def put(self, item: bytes):
+        if len(self.q) == self.q.maxlen:
+            self.dropped += 1
+        self.q.append((time.monotonic(), item))
+
+    def drain(self) -> List[bytes]:
+        cutoff = time.monotonic() - self.max_age
+        items = [item for ts, item in self.q if ts >= cutoff]
+        self.q.clear()
+        return items
+
+
+# -----------------------------
+# Bridge
+# -----------------------------
+class Bridge:
+    def __init__(
+        self,
+        sock_path: str = BUS_SOCKET,
+        host: str = "0.0.0.0",
+        tcp_port: Optional[int] = BRIDGE_TCP_PORT,
+        udp_port: Optional[int] = BRIDGE_UDP_PORT,
+        export=("*",),
+        imports=("*",),
+        connect=(),
+        name: Optional[str] = None,
+        batch_ms: float = 20.0,
+        batch_bytes: int = UDP_MAX,
+        store_max: int = 500,
+        store_age: float = 300.0,
+        udp_ttl: float = 30.0,
+        debug: bool = False,
+    ):
+        self.id = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.export = list(export)
+        self.imports = list(imports)
+        self.batch_s = batch_ms / 1000.0
+        self.batch_bytes = batch_bytes
+        self.store_max = store_max
+        self.store_age = store_age
+        self.udp_ttl = udp_ttl
+        self.debug = debug
+        self.running = True
+
+        # bus tarafı: sadece dışarı verilebilecek tipler
+        self.bus = BusClient(sock_path, topics=self.export)
+        self._bus_fd = -1
+
+        self.router = Router()              # tip → Link / _Store
+        self.links = set()                  # ayakta olan + bağlanmaya çalışan
+        self.by_name: Dict[str, Link] = {}
+        self.stores: Dict[str, _Store] = {}
+        self.udp_links: Dict[tuple, Link] = {}
+        self.sel = selectors.DefaultSelector()
+
+        self.tcp = self.udp = None
+        self.tcp_port = self.udp_port = None
+        if tcp_port is not None:
+            self.tcp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.tcp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.tcp.bind((host, tcp_port))
+            self.tcp.listen(16)
+            self.tcp.setblocking(False)
+            self.tcp_port = self.tcp.getsockname()[1]
+            self.sel.register(self.tcp, selectors.EVENT_READ, "tcp")
+        if udp_port is not None:
+            self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.udp.bind((host, udp_port))
+            self.udp.setblocking(False)
+            self.udp_port = self.udp.getsockname()[1]
+            self.sel.register(self.udp, selectors.EVENT_READ, "udp")
+
+        self.outs = []
+        for target in connect:
+            addr = parse_addr(target)
+            link = Link("out", name=f"{addr[0]}:{addr[1]}", addr=addr)
+            self.outs.append(link)
+            self.links.add(link)
+
+    # ---- loop ----
+    def serve_forever(self):
+        print(f"[BRIDGE] 🌉 ROBI Bridge online: id={self.id} tcp={self.tcp_port} udp={self.udp_port} "
+              f"export={self.export} import={self.imports}")
+        next_tick = time.monotonic() + TICK
+        try:
+            while self.running:
+                self._check_bus()
+                for link in self.outs:
+                    if link.sock is None:
+                        self._dial(link)
+
+                now = time.monotonic()
+                timeout = max(0.0, next_tick - now)
+                for link in self.links:
+                    if link.flush_at is not None:
+                        timeout = min(timeout, max(0.0, link.flush_at - now))
+
+                for key, mask in self.sel.select(timeout):
+                    d = key.data
+                    if d == "tcp":
+                        self._accept()
+                    elif d == "udp":
+                        self._on_udp()
+                    elif d == "bus":
+                        self._on_bus()
+                    else:
+                        if mask & selectors.EVENT_READ and d.sock is not None:
+                            self._on_read(d)
+                        if mask & selectors.EVENT_WRITE and d.sock is not None:
+                            self._on_writable(d)
+
+                now = time.monotonic()
+                for link in list(self.links):
+                    if link.flush_at is not None and link.flush_at <= now:
+                        self._flush(link)
+                if now >= next_tick:
+                    next_tick = now + TICK
+                    self._expire_udp(now)
+        finally:
+            for link in list(self.links):
+                self._close(link)
+            for s in (self.tcp, self.udp):
+                if s is not None:
+                    s.close()
+            self.sel.close()
+            self.bus.close()
+            print("[BRIDGE] 🌉 ROBI Bridge offline")
+
+    def stop(self):
+        self.running = False
+
+    # ---- bus → peers ----
+    def _check_bus(self):
+        fd = self.bus.fileno()   # bağlı değilse backoff'lu yeniden bağlanma dener
+        if fd == self._bus_fd:
+            return
+        self._unregister_bus()
+        if fd != -1:
+            self.sel.register(fd, selectors.EVENT_READ, "bus")
+            self._bus_fd = fd
+
+    def _unregister_bus(self):
+        if self._bus_fd != -1:
+            try:
+                self.sel.unregister(self._bus_fd)
+            except (KeyError, ValueError):
+                pass
+            self._bus_fd = -1
+
+    def _on_bus(self):
+        for ev in self.bus.recv_many(timeout=0.0):
+            if not isinstance(ev, dict) or ev.get("_hops", 0) >= MAX_HOPS:
+                continue
+            targets = self.router.match(ev.get("type"))
+            if not targets:
+                continue
+            # bu bridge'in bus'a bastığı event kaynağına geri gitmesin
+            skip = ev.get("_peer") if ev.get("_bridge") == self.id else None
+            item = None
+            for t in targets:
+                if skip is not None and t.name == skip:
+                    continue
+                if item is None:
+                    item = encode_event(ev)
+                if isinstance(t, _Store):
+                    t.put(item)
+                else:
+                    self._enqueue(t, item)
+        if not self.bus.connected:
+            self._unregister_bus()
+
+    def _enqueue(self, link: Link, item: bytes):
+        link.items.append(item)
+        link.size += len(item) + 1
+        if link.size >= self.batch_bytes:
+            self._flush(link)
+        elif link.flush_at is None:
+            link.flush_at = time.monotonic() + self.batch_s
+
+    def _flush(self, link: Link):
+        items = link.items
+        link.items = []
+        link.size = 0
+        link.flush_at = None
+        if not items or not link.up:
+            return
+
+        if link.kind == "udp":
+            batch, size = [], 0
+            for item in items + [None]:
+                if batch and (item is None or size + len(item) + 1 > UDP_MAX):
+                    flags, body = encode_batch(batch, link.zlib)
+                    try:
+                        self.udp.sendto(bytes((flags,)) + body, link.addr)
+                        link.frames += 1
+                        link.sent += len(batch)
+                    except OSError:
+                        link.dropped += len(batch)
+                    batch, size = [], 0
+                if item is not None:
+                    batch.append(item)
+                    size += len(item) + 1
+            return
+
+        data = tcp_frame(*encode_batch(items, link.zlib))
+        if len(link.wbuf) + len(data) > WBUF_MAX:
+            link.dropped += len(items)
+            return
+        link.wbuf += data
+        link.frames += 1
+        link.sent += len(items)
+        self._write(link)
+
+    # ---- TCP ----
+    def _accept(self):
+        try:
+            conn, addr = self.tcp.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        conn.setblocking(False)
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        link = Link("tcp", sock=conn, addr=addr)
+        self.links.add(link)
+        self.sel.register(conn, selectors.EVENT_READ, link)
+
+    def _dial(self, link: Link):
+        now = time.monotonic()
+        if now < link.next_try:
+            return
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setblocking(False)
+        err = s.connect_ex(link.addr)
+        if err not in (0, errno.EINPROGRESS):
+            s.close()
+            self._retry_later(link)
+            return
+        link.sock = s
+        link.connecting = True
+        link.dec = BatchDecoder()
+        link.rbuf = bytearray()
+        link.wbuf = bytearray(make_header("PEER", 1, self.imports, name=self.id, zlib=1))
+        self.sel.register(s, selectors.EVENT_READ | selectors.EVENT_WRITE, link)
+
+    def _retry_later(self, link: Link):
+        link.next_try = time.monotonic() + link.backoff
+        link.backoff = min(BACKOFF_MAX, link.backoff * 2)
+
+    def _on_writable(self, link: Link):
+        if link.connecting:
+            err = link.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if err:
+                self._down(link)
+                return
+            link.connecting = False
+            link.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._write(link)
+
+    def _write(self, link: Link):
+        if link.sock is None or link.connecting:
+            return
+        while link.wbuf:
+            try:
+                n = link.sock.send(link.wbuf)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                self._down(link)
+                return
+            del link.wbuf[:n]
+        want = selectors.EVENT_READ | selectors.EVENT_WRITE if link.wbuf else selectors.EVENT_READ
+        try:
+            if self.sel.get_key(link.sock).events != want:
+                self.sel.modify(link.sock, want, link)
+        except (KeyError, ValueError):
+            pass
+
+    def _on_read(self, link: Link):
+        try:
+            chunk = link.sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            chunk = b""
+        if not chunk:
+            self._down(link)
+            return
+
+        if not link.up:
+            link.rbuf += chunk
+            nl = link.rbuf.find(b"\n")
+            if nl < 0:
+                if len(link.rbuf) > MAX_HEADER:
+                    self._down(link)
+                return
+            line, chunk = bytes(link.rbuf[:nl + 1]), bytes(link.rbuf[nl + 1:])
+            link.rbuf = bytearray()
+            if link.kind == "out":
+                h = parse_header(line, roles=("OK",))
+                if h is None:
+                    self._down(link)
+                    return
+                link.backoff = BACKOFF_MIN
+                self._up(link, link.name, h.topics, h.opts.get("zlib") == "1")
+            else:
+                h = parse_header(line, roles=("PEER",))
+                if h is None:
+                    self._down(link)
+                    return
+                link.wbuf += make_header("OK", 1, self.imports, zlib=1)
+                self._up(link, h.opts.get("name"), h.topics, h.opts.get("zlib") == "1")
+
+        try:
+            batches = [decode_batch(flags, body) for flags, body in link.dec.feed(chunk)]
+        except (ValueError, zlib.error):
+            self._down(link)
+            return
+        for evs in batches:
+            self._inbound(link, evs)
+
+    # ---- UDP ----
+    def _on_udp(self):
+        while True:
+            try:
+                data, addr = self.udp.recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            if len(data) < 2:
+                continue
+            try:
+                evs = decode_batch(data[0], data[1:])
+            except (ValueError, zlib.error):
+                continue
+
+            link = self.udp_links.get(addr)
+            rest = []
+            for ev in evs:
+                if isinstance(ev, dict) and ev.get("type") == "bridge.hello":
+                    if link is None:
+                        link = self.udp_links[addr] = Link("udp", addr=addr)
+                        self.links.add(link)
+                    topics = [t for t in ev.get("topics") or [] if isinstance(t, str)]
+                    self._up(link, ev.get("name"), topics, bool(ev.get("zlib")))
+                    self._enqueue(link, encode_event({"type": "bridge.welcome", "bridge": self.id}))
+                    self._flush(link)
+                else:
+                    rest.append(ev)
+            if link is not None:
+                link.last_seen = time.monotonic()
+            self._inbound(link, rest, addr)
+
+    def _expire_udp(self, now: float):
+        for link in list(self.udp_links.values()):
+            if now - link.last_seen > self.udp_ttl:
+                self._down(link)
+
+    # ---- peers → bus ----
+    def _inbound(self, link: Optional[Link], evs: list, addr=None):
+        peer = link.label() if link is not None else f"{addr[0]}:{addr[1]}"
+        out = []
+        for ev in evs:
+            if not isinstance(ev, dict):
+                continue
+            typ = ev.get("type")
+            if not isinstance(typ, str) or typ.startswith("bridge."):
+                continue
+            if not matches(self.imports, typ):
+                continue
+            try:
+                hops = int(ev.get("_hops", 0)) + 1
+            except (TypeError, ValueError):
+                continue
+            if hops > MAX_HOPS:
+                continue
+            ev["_hops"] = hops
+            ev["_bridge"] = self.id
+            ev["_peer"] = peer
+            ev.setdefault("ts", time.time())
+            out.append(ev)
+        if link is not None:
+            link.received += len(out)
+        if out:
+            self.bus.publish_many(out)
+
+    # ---- peer lifecycle ----
+    def _up(self, link: Link, name: Optional[str], topics: List[str], use_zlib: bool):
+        self.router.remove(link)
+        link.up = True
+        link.name = name or link.name
+        link.topics = list(topics)
+        link.zlib = use_zlib
+
+        if link.name:
+            old = self.by_name.get(link.name)
+            if old is not None and old is not link:
+                self._down(old, store=False)   # aynı isimle yeniden bağlandı
+            self.by_name[link.name] = link
+            store = self.stores.pop(link.name, None)
+            if store is not None:
+                self.router.remove(store)
+                backlog = store.drain()
+                if backlog:
+                    print(f"[BRIDGE] 📦 {link.name}: forwarding {len(backlog)} stored events")
+                for item in backlog:
+                    self._enqueue(link, item)
+        if link.topics:
+            self.router.add(link, link.topics)
+
+        print(f"[BRIDGE] 🔌 {link.kind} peer up: {link.label()} topics={link.topics} zlib={link.zlib}")
+        if link.items:
+            self._flush(link)
+        self._write(link)
+
+    def _down(self, link: Link, store: bool = True):
+        was_up = link.up
+        self._close(link)
+        self.router.remove(link)
+        if link.name and self.by_name.get(link.name) is link:
+            del self.by_name[link.name]
+            if store and link.topics and self.store_max > 0:
+                st = _Store(link.name, link.topics, self.store_max, self.store_age)
+                for item in link.items:
+                    st.put(item)
+                self.stores[link.name] = st
+                self.router.add(st, st.topics)
+        link.items = []
+        link.size = 0
+        link.flush_at = None
+        link.up = False
+
+        if link.kind == "udp":
+            self.udp_links.pop(link.addr, None)
+        if link.kind == "out":
+            self._retry_later(link)
+        else:
+            self.links.discard(link)
+        if was_up:
+            print(f"[BRIDGE] 🔌 {link.kind} peer down: {link.label()} "
+                  f"sent={link.sent} frames={link.frames} received={link.received} dropped={link.dropped}")
+
+    def _close(self, link: Link):
+        s = link.sock
+        if s is None:
+            return
+        link.sock = None
+        link.connecting = False
+        try:
+            self.sel.unregister(s)
+        except (KeyError, ValueError):
+            pass
+        try:
+            s.close()
+        except OSError:
+            pass
+
+
+# -----------------------------
+# Loopback self-test
+# -----------------------------
+class _TcpPeer:
+    def __init__(self, port: int, name: str, topics: List[str]):
+        self.s = socket.create_connection(("127.0.0.1", port), timeout=2.0)
+        self.s.sendall(make_header("PEER", 1, topics, name=name, zlib=1))
+        self.dec = BatchDecoder()
+        line = b""
+        while not line.endswith(b"\n"):
+            line += self.s.recv(1)
+        self.ack = parse_header(line, roles=("OK",))
+        self.frames = 0
+        self.zlib_frames = 0
+
+    def send(self, evs: list):
+        self.s.sendall(tcp_frame(*encode_batch([encode_event(e) for e in evs], True)))
+
+    def recv(self, idle: float = 0.3) -> list:
+        out = []
+        self.s.settimeout(idle)
+        try:
+            while True:
+                chunk = self.s.recv(65536)
+                if not chunk:
+                    break
+                for flags, body in self.dec.feed(chunk):
+                    self.frames += 1
+                    self.zlib_frames += bool(flags & FLAG_ZLIB)
+                    out += decode_batch(flags, body)
+        except socket.timeout:
+            pass
+        return out
+
+    def close(self):
+        self.s.close()
+
+
+class _UdpPeer:
+    def __init__(self, port: int, name: str, topics: List[str]):
+        self.addr = ("127.0.0.1", port)
+        self.s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.s.bind(("127.0.0.1", 0))
+        self.send([{"type": "bridge.hello", "name": name, "topics": topics, "zlib": False}])
+
+    def send(self, evs: list):
+        self.s.sendto(b"\x00" + json.dumps(evs).encode("utf-8"), self.addr)
+
+    def recv(self, idle: float = 0.3) -> tuple:
+        out, datagrams = [], 0
+        self.s.settimeout(idle)
+        try:
+            while True:
+                data, _ = self.s.recvfrom(65535)
+                datagrams += 1
+                out += decode_batch(data[0], data[1:])
+        except socket.timeout:
+            pass
+        return out, datagrams
+
+
+def _start_bus(sock_path: str):
+    srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    srv.bind(sock_path)
+    srv.listen(16)
+    threading.Thread(target=LoopServer(srv, BusConfig()).serve_forever, daemon=True).start()
+
+
+def _drain(bus: BusClient, idle: float = 0.4) -> list:
+    out = []
+    while True:
+        evs = bus.recv_many(timeout=idle)
+        if not evs:
+            return out
+        out += evs
+
+
+def selftest() -> bool:
+    tmp = tempfile.mkdtemp(prefix="robi_bridge_")
+    sock1 = os.path.join(tmp, "bus1.sock")
+    sock2 = os.path.join(tmp, "bus2.sock")
+    _start_bus(sock1)
+    _start_bus(sock2)
+
+    br = Bridge(sock1, host="127.0.0.1", tcp_port=0, udp_port=0, name="pi1",
+                export=["SERVO_*", "LED_*", "SENSOR_*"], imports=["SENSOR_*"], udp_ttl=2.0)
+    threading.Thread(target=br.serve_forever, daemon=True).start()
+    bus = BusClient(sock1, topics=["*"])
+    time.sleep(0.3)
+
+    ok_all = []
+
+    def check(what: str, ok: bool, detail: str = ""):
+        ok_all.append(ok)
+        print(f"[BRIDGE][TEST] {'✅' if ok else '❌'} {what} {detail}")
+
+    a = _TcpPeer(br.tcp_port, "esp-a", ["SERVO_*", "SENSOR_*"])
+    check("tcp hello/ack", a.ack is not None and a.ack.topics == ["SENSOR_*"])
+    u = _UdpPeer(br.udp_port, "esp-b", ["LED_*", "SENSOR_*"])
+    got, _ = u.recv()
+    check("udp hello/welcome", any(e.get("type") == "bridge.welcome" for e in got))
+
+    # 1) filtre + batch + zlib
+    bus.publish_many([{"type": "SERVO_MOVE", "i": i, "angle": 90} for i in range(200)])
+    bus.publish_many([{"type": "LED_SET", "i": i} for i in range(20)])
+    bus.publish_many([{"type": "PRIVATE_NOTE", "i": i} for i in range(20)])
+    evs = a.recv()
+    types = {e["type"] for e in evs}
+    check("tcp topic filter", len(evs) == 200 and types == {"SERVO_MOVE"}, f"got={len(evs)} types={types}")
+    check("tcp batching", a.frames <= 20, f"frames={a.frames} for {len(evs)} events")
+    check("tcp zlib", a.zlib_frames > 0, f"zlib_frames={a.zlib_frames}")
+    evs, dgrams = u.recv()
+    check("udp topic filter + batching", len(evs) == 20 and dgrams <= 3, f"got={len(evs)} datagrams={dgrams}")
+    _drain(bus)
+
+    # 2) peer → bus (import filtresi) + echo yok
+    a.send([{"type": "SENSOR_TEMP", "c": 21.5}, {"type": "SECRET_CMD"}])
+    seen = _drain(bus)
+    temps = [e for e in seen if e.get("type") == "SENSOR_TEMP"]
+    check("tcp inbound", len(temps) == 1 and temps[0].get("_peer") == "esp-a", str(temps))
+    check("import filter", not any(e.get("type") == "SECRET_CMD" for e in seen))
+    check("no echo to sender", not any(e.get("type") == "SENSOR_TEMP" for e in a.recv()))
+    evs, _ = u.recv()
+    check("fan-out to other peer", any(e.get("type") == "SENSOR_TEMP" for e in evs))
+
+    u.send([{"type": "SENSOR_HUM", "rh": 40}])
+    seen = _drain(bus)
+    check("udp inbound", any(e.get("type") == "SENSOR_HUM" and e.get("_peer") == "esp-b" for e in seen))
+
+    # 3) store-and-forward
+    a.close()
+    time.sleep(0.2)
+    bus.publish_many([{"type": "SERVO_MOVE", "i": 1000 + i} for i in range(10)])
+    time.sleep(0.3)
+    a = _TcpPeer(br.tcp_port, "esp-a", ["SERVO_*", "SENSOR_*"])
+    evs = a.recv()
+    check("store-and-forward", [e.get("i") for e in evs] == list(range(1000, 1010)), f"got={len(evs)}")
+    a.close()
+
+    # 4) ikinci Pi: bus2 ↔ bridge2 → bridge1
+    br2 = Bridge(sock2, tcp_port=None, udp_port=None, name="pi2",
+                 connect=[f"127.0.0.1:{br.tcp_port}"])
+    threading.Thread(target=br2.serve_forever, daemon=True).start()
+    bus2 = BusClient(sock2, topics=["*"])
+    time.sleep(0.5)
+    bus2.publish({"type": "SENSOR_DOOR", "open": True})
+    seen1 = _drain(bus)
+    check("pi2 → pi1", any(e.get("type") == "SENSOR_DOOR" and e.get("_hops") == 1 for e in seen1))
+    seen2 = _drain(bus2)
+    doors = [e for e in seen2 if e.get("type") == "SENSOR_DOOR"]
+    check("no loop back to pi2", len(doors) == 1, f"copies={len(doors)}")
+    bus.publish({"type": "SENSOR_WINDOW", "open": False})
+    seen2 = _drain(bus2)
+    check("pi1 → pi2", any(e.get("type") == "SENSOR_WINDOW" for e in seen2))
+
+    # 5) UDP peer sessizleşirse düşer, event'leri saklanır
+    time.sleep(3.2)
+    check("udp ttl expiry", "esp-b" in br.stores and "esp-b" not in br.by_name)
+
+    br.stop()
+    br2.stop()
+    ok = all(ok_all)
+    print(f"[BRIDGE][TEST] {'PASS' if ok else 'FAIL'} ({sum(ok_all)}/{len(ok_all)})")
+    return ok
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="ROBI bus TCP/UDP bridge")
+    ap.add_argument("--socket", default=BUS_SOCKET, help="bus socket path")
+    ap.add_argument("--host", default="0.0.0.0", help="listen address")
+    ap.add_argument("--tcp-port", type=int, default=BRIDGE_TCP_PORT, help="TCP port (-1: kapalı)")
+    ap.add_argument("--udp-port", type=int, default=BRIDGE_UDP_PORT, help="UDP port (-1: kapalı)")
+    ap.add_argument("--export", action="append", default=None, metavar="TYPE",
+                    help="peer'lere gidebilecek tipler ('X*' prefix; varsayılan hepsi)")
+    ap.add_argument("--import", dest="imports", action="append", default=None, metavar="TYPE",
+                    help="peer'lerden bus'a kabul edilecek tipler (varsayılan hepsi)")
+    ap.add_argument("--connect", action="append", default=[], metavar="HOST:PORT",
+                    help="başka bir bridge'e bağlan (ikinci Pi); tekrarlanabilir")
+    ap.add_argument("--name", default=None, help="bridge kimliği (varsayılan host-pid)")
+    ap.add_argument("--batch-ms", type=float, default=20.0, help="batch bekleme süresi")
+    ap.add_argument("--batch-bytes", type=int, default=UDP_MAX, help="bu boyutta batch hemen gider")
+    ap.add_argument("--store-max", type=int, default=500, help="kopan peer başına saklanan max event")
+    ap.add_argument("--store-age", type=float, default=300.0, help="saklanan event'in max yaşı (sn)")
+    ap.add_argument("--udp-ttl", type=float, default=30.0, help="UDP peer bu kadar sessizse düşer")
+    ap.add_argument("--selftest", action="store_true", help="loopback testi çalıştır ve çık")
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.selftest:
+        sys.exit(0 if selftest() else 1)
+    br = Bridge(
+        args.socket,
+        host=args.host,
+        tcp_port=None if args.tcp_port < 0 else args.tcp_port,
+        udp_port=None if args.udp_port < 0 else args.udp_port,
+        export=args.export or ["*"],
+        imports=args.imports or ["*"],
+        connect=args.connect,
+        name=args.name,
+        batch_ms=args.batch_ms,
+        batch_bytes=args.batch_bytes,
+        store_max=args.store_max,
+        store_age=args.store_age,
+        udp_ttl=args.udp_ttl,
+    )
+    try:
+        br.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,52 +1,129 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import argparse
+import heapq
+import itertools
+import json
 import os
+import selectors
+import socket
 import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import List, Optional
+
 from robi_constants import BUS_SOCKET
+from robi_wire import (
+    MAX_HEADER,
+    FrameDecoder,
+    Header,
+    LineDecoder,
+    Message,
+    is_control,
+    make_ack,
+    parse_header,
+    pick_codec,
+    wants,
+)
+
+# Eski import yolu: "from robi_bus import BusClient"
+from robi_client import BusClient, query_stats  # noqa: F401
 
-subscribers = set()
 sub_lock = threading.Lock()
+peers = set()       # thread modu: açık bağlantılar (stats için), sub_lock ile
 
-# --- BusClient (brain/audio kullanacak) ---
-import socket, json
 
-class BusClient:
-    def __init__(self, sock_path: str):
-        self.sock_path = sock_path
-        self.pub = self._connect("PUB")
-        self.sub = self._connect("SUB")
-        self._buf = b""
+# -----------------------------
+# Topic routing
+# -----------------------------
+class Router:
+    """
+    Event type → interested subscribers.
 
-    def _connect(self, role: str):
-        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        s.connect(self.sock_path)
-        s.sendall((role + "\n").encode())
-        return s
+    Topics come from the SUB header: "LISTEN" (exact), "speech.*" / "TTS_*"
+    (prefix), "*" or no topics (everything). A lookup costs one dict hit per
+    distinct prefix length, and the result is cached per type, so fan-out
+    scales with interested subscribers, not with all of them.
+    """
 
-    def publish(self, ev: dict):
-        self.pub.sendall((json.dumps(ev, ensure_ascii=False) + "\n").encode())
+    CACHE_MAX = 1024
 
-    def recv(self, timeout: float = 0.2):
-        self.sub.settimeout(timeout)
-        try:
-            chunk = self.sub.recv(4096)
-            if not chunk:
-                return None
-            self._buf += chunk
-        except socket.timeout:
-            return None
-        except BlockingIOError:
-            return None
+    def __init__(self):
+        self.everything = set()
+        self.exact = {}
+        self.prefix = {}
+        self._topics = {}
+        self._plens = ()
+        self._cache = {}
 
-        if b"\n" not in self._buf:
-            return None
+    @property
+    def filtered(self) -> bool:
+        return bool(self.exact or self.prefix)
+
+    def add(self, sub, topics=None):
+        topics = list(topics or ["*"])
+        self._topics[sub] = topics
+        for t in topics:
+            if t == "*":
+                self.everything.add(sub)
+            elif t.endswith("*"):
+                self.prefix.setdefault(t[:-1], set()).add(sub)
+            else:
+                self.exact.setdefault(t, set()).add(sub)
+        self._changed()
+
+    def remove(self, sub):
+        topics = self._topics.pop(sub, None)
+        if topics is None:
+            return
+        for t in topics:
+            if t == "*":
+                self.everything.discard(sub)
+                continue
+            table, key = (self.prefix, t[:-1]) if t.endswith("*") else (self.exact, t)
+            subs = table.get(key)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del table[key]
+        self._changed()
+
+    def __len__(self):
+        return len(self._topics)
+
+    def _changed(self):
+        self._plens = tuple(sorted({len(p) for p in self.prefix}))
+        self._cache.clear()
+
+    def match(self, typ) -> tuple:
+        r = self._cache.get(typ)
+        if r is not None:
+            return r
+        s = set(self.everything)
+        if typ is not None:
+            s.update(self.exact.get(typ, ()))
+            for n in self._plens:
+                if n > len(typ):
+                    break
+                subs = self.prefix.get(typ[:n])
+                if subs:
+                    s.update(subs)
+        if len(self._cache) >= self.CACHE_MAX:
+            self._cache.clear()
+        r = self._cache[typ] = tuple(s)
+        return r
+
+    def route(self, msg: Message) -> tuple:
+        # filtre yoksa mesajı decode etmeye gerek yok
+        if not self.filtered:
+            return self.match(None)
+        return self.match(msg.type)
+
+
+router = Router()   # thread modu aboneleri (Subscriber nesneleri)
 
-        line, self._buf = self._buf.split(b"\n", 1)
-        try:
-            return json.loads(line.decode("utf-8", errors="ignore"))
-        except Exception:
-            return None
 
 def safe_close(conn):
     try:
@@ -58,84 +135,992 @@ def safe_close(conn):
     except Exception:
         pass
 
-def broadcast(line: bytes):
-    dead = []
-    with sub_lock:
-        for s in list(subscribers):
+# -----------------------------
+# Stats (sayaçlar + gecikme histogramı)
+# -----------------------------
+SAMPLE_EVERY = 16      # decode gerektiren ölçümler bu kadar mesajda bir
+HIST_BUCKETS = 32      # bucket i: gecikme < 2**i µs
+
+
+class BusStats:
+    """
+    Bus-wide counters. Cheap on the hot path: per-type counts use the type
+    only if routing already decoded it (otherwise every SAMPLE_EVERY-th
+    message is decoded and weighted), and ts → delivery latency is sampled
+    per subscriber at the same rate. In thread mode updates are unlocked,
+    so an occasional increment may be lost.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.msgs_in = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.types = {}
+        self.hist = [0] * HIST_BUCKETS
+        self._undecoded = 0
+        self._prev = (self.started, 0, {})
+
+    def on_message(self, msg: Message):
+        self.msgs_in += 1
+        t = msg.peek_type()
+        w = 1
+        if t is None:
+            self._undecoded += 1
+            if self._undecoded % SAMPLE_EVERY:
+                return
+            t = msg.type or "?"
+            w = SAMPLE_EVERY
+        self.types[t] = self.types.get(t, 0) + w
+
+    def sample_latency(self, msg: Message):
+        try:
+            ev = msg.ev
+            if ev.get("_retained"):
+                return   # replay: ts eski, gecikme değil
+            lat = time.time() - float(ev.get("ts"))
+        except Exception:
+            return
+        us = int(lat * 1e6) if lat > 0 else 0
+        self.hist[min(us.bit_length(), HIST_BUCKETS - 1)] += 1
+
+    def latency(self) -> dict:
+        hist = list(self.hist)
+        n = sum(hist)
+        out = {"samples": n}
+        if not n:
+            return out
+
+        def upper_ms(i):
+            return round((1 << i) / 1000.0, 3)
+
+        for name, p in (("p50", 0.50), ("p90", 0.90), ("p99", 0.99)):
+            acc = 0
+            for i, c in enumerate(hist):
+                acc += c
+                if acc >= p * n:
+                    out[name] = upper_ms(i)
+                    break
+        out["max"] = upper_ms(max(i for i, c in enumerate(hist) if c))
+        out["hist"] = {f"<{upper_ms(i)}ms": c for i, c in enumerate(hist) if c}
+        return out
+
+    def rates(self, advance: bool = False) -> dict:
+        """msg/s since the previous advance (or since start)."""
+        now = time.time()
+        t0, n0, types0 = self._prev
+        dt = max(1e-6, now - t0)
+        types = dict(self.types)
+        r = {
+            "window": round(dt, 1),
+            "msgs_in": round((self.msgs_in - n0) / dt, 1),
+            "types": {
+                t: round((n - types0.get(t, 0)) / dt, 1)
+                for t, n in types.items() if n != types0.get(t, 0)
+            },
+        }
+        if advance:
+            self._prev = (now, self.msgs_in, types)
+        return r
+
+    def snapshot(self, conns, mode: str) -> dict:
+        return {
+            "mode": mode,
+            "uptime": round(time.time() - self.started, 1),
+            "msgs_in": self.msgs_in,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "types": dict(self.types),
+            "rates": self.rates(),
+            "latency_ms": self.latency(),
+            "conns": [c.info() for c in conns],
+        }
+
+    def summary(self, conns) -> str:
+        r = self.rates(advance=True)
+        lat = self.latency()
+        subs = [c for c in conns if c.role == "SUB"]
+        depth = max((c.depth() for c in subs), default=0)
+        drops = sum(c.dropped for c in subs)
+        top = sorted(r["types"].items(), key=lambda kv: -kv[1])[:5]
+        return (
+            f"[BUS][STATS] conns={len(conns)} (sub={len(subs)}) in={r['msgs_in']}/s "
+            f"bytes in/out={self.bytes_in}/{self.bytes_out} qmax={depth} drops={drops} "
+            f"lat p50<{lat.get('p50', '-')}ms p99<{lat.get('p99', '-')}ms "
+            f"top: " + (", ".join(f"{t}={v}/s" for t, v in top) or "-")
+        )
+
+
+stats = BusStats()
+
+
+# -----------------------------
+# Coalescing (yüksek frekanslı state event'leri)
+# -----------------------------
+# Coalescing sadece bus kuyruğunda bekleyen event'lere işler; kernel socket
+# buffer'ı büyükse yavaş abonenin birikmesi orada kalır. Kurallı abonelerde
+# buffer küçültülür ki birikme kuyrukta olsun.
+COALESCE_SNDBUF = 16 * 1024
+
+@dataclass
+class CoalesceRule:
+    kind: str               # "latest" / "rate"
+    interval: float = 0.0   # latest: min aralık (pencere), rate: 1/hz
+
+
+def parse_coalesce(spec: str):
+    """
+    "FACE_VOTE=latest"      kuyrukta bekleyen eski değerin yerine yenisi
+    "motion*=latest:0.2"    + tipi en fazla 0.2 s'de bir ilet (son değer)
+    "SOUND_RMS=rate:5"      abone başına max 5/s, fazlası atılır
+    → (pattern, CoalesceRule). ValueError on a bad spec.
+    """
+    pattern, sep, policy = spec.partition("=")
+    kind, _, arg = policy.partition(":")
+    if not sep or not pattern or kind not in ("latest", "rate"):
+        raise ValueError(f"bad coalesce rule: {spec!r}")
+    if kind == "rate":
+        hz = float(arg)
+        if hz <= 0:
+            raise ValueError(f"bad coalesce rate: {spec!r}")
+        return pattern, CoalesceRule("rate", 1.0 / hz)
+    return pattern, CoalesceRule("latest", float(arg) if arg else 0.0)
+
+
+class Coalescing:
+    """Type → CoalesceRule ("X" exact, "X*" prefix; longest prefix wins)."""
+
+    def __init__(self, specs=()):
+        self.exact = {}
+        self.prefix = {}
+        self._cache = {}
+        for spec in specs:
+            pattern, rule = parse_coalesce(spec)
+            if pattern.endswith("*"):
+                self.prefix[pattern[:-1]] = rule
+            else:
+                self.exact[pattern] = rule
+
+    def __bool__(self):
+        return bool(self.exact or self.prefix)
+
+    def match(self, typ) -> Optional[CoalesceRule]:
+        try:
+            return self._cache[typ]
+        except KeyError:
+            pass
+        rule = None
+        if typ is not None:
+            rule = self.exact.get(typ)
+            if rule is None:
+                best = -1
+                for p, r in self.prefix.items():
+                    if len(p) > best and typ.startswith(p):
+                        rule, best = r, len(p)
+        if len(self._cache) >= Router.CACHE_MAX:
+            self._cache.clear()
+        self._cache[typ] = rule
+        return rule
+
+
+# -----------------------------
+# Retained last values (yeniden başlayan aboneler için)
+# -----------------------------
+def parse_retain(spec: str):
+    """
+    "core.state"              tipin son değeri
+    "presence.*"              prefix: eşleşen her tipin ayrı son değeri
+    "tts=TTS_START,TTS_END"   grup: listedeki tiplerden sadece en sonuncusu
+    → (group or None, [patterns]). ValueError on a bad spec.
+    """
+    group, sep, types = spec.partition("=")
+    if not sep:
+        group, types = None, spec
+    patterns = [t for t in types.split(",") if t]
+    if not patterns or (sep and not group):
+        raise ValueError(f"bad retain rule: {spec!r}")
+    return group, patterns
+
+
+class Retained:
+    """
+    Last value per retained type (or group), replayed to a new subscriber
+    right after its SUB handshake so a restarted process syncs at once.
+    Only messages whose raw bytes mention a retained name are decoded.
+    Replayed copies carry "_retained": true.
+    """
+
+    def __init__(self, specs=()):
+        self.exact = {}      # type -> key
+        self.prefix = {}     # prefix -> None (key = type)
+        self.values = {}     # key -> Message (son güncellenen en sonda)
+        self._cache = {}
+        for spec in specs:
+            group, patterns = parse_retain(spec)
+            for p in patterns:
+                if p.endswith("*"):
+                    self.prefix[p[:-1]] = group
+                else:
+                    self.exact[p] = group or p
+        self._needles = [n.encode("utf-8") for n in list(self.exact) + list(self.prefix)]
+
+    def __bool__(self):
+        return bool(self.exact or self.prefix)
+
+    def key(self, typ) -> Optional[str]:
+        try:
+            return self._cache[typ]
+        except KeyError:
+            pass
+        k = None
+        if typ is not None:
+            k = self.exact.get(typ)
+            if k is None:
+                for p, group in self.prefix.items():
+                    if typ.startswith(p):
+                        k = group or typ
+                        break
+        if len(self._cache) >= Router.CACHE_MAX:
+            self._cache.clear()
+        self._cache[typ] = k
+        return k
+
+    def update(self, msg: Message):
+        if not msg.mentions(self._needles):
+            return
+        k = self.key(msg.type)
+        if k is not None:
+            self.values.pop(k, None)
+            self.values[k] = msg
+
+    def replay(self, h: Header) -> List[Message]:
+        """Retained values this subscriber wants, oldest first ([] with retain=off)."""
+        if h.opts.get("retain") == "off":
+            return []
+        out = []
+        for msg in self.values.values():
+            typ = msg.type
+            if typ is not None and wants(h.topics, typ):
+                out.append(Message(ev=dict(msg.ev, _retained=True)))
+        return out
+
+
+# -----------------------------
+# Connections / subscriber outbound queues
+# -----------------------------
+OVERFLOW_POLICIES = ("drop-oldest", "drop-newest", "disconnect")
+
+# Tek seferde encode edilip socket'e verilen miktar. Küçük tutulur: sonradan
+# gelen kontrol event'i en fazla bu kadar bulk verinin arkasında kalır.
+TAKE_LIMIT = 16 * 1024
+
+
+@dataclass
+class BusConfig:
+    queue_size: int = 256              # abone başına bekleyen max event
+    overflow: str = "drop-oldest"      # OVERFLOW_POLICIES
+    stats_interval: float = 0.0        # >0: bu kadar saniyede bir stats satırı
+    coalesce: List[str] = field(default_factory=list)   # parse_coalesce spec'leri
+    control: frozenset = frozenset()   # robi_wire.CONTROL_TYPES'a ek kontrol tipleri
+    retain: List[str] = field(default_factory=list)     # parse_retain spec'leri
+    _rules: Optional[Coalescing] = None
+    _retained: Optional[Retained] = None
+
+    def rules(self) -> Optional[Coalescing]:
+        if self._rules is None:
+            self._rules = Coalescing(self.coalesce)
+        return self._rules or None
+
+    def retained(self) -> Optional[Retained]:
+        """Shared last-value store of this server (None: nothing retained)."""
+        if self._retained is None:
+            self._retained = Retained(self.retain)
+        return self._retained or None
+
+
+config = BusConfig()   # thread modu ayarları (main() doldurur)
+retained: Optional[Retained] = None   # thread modu: config.retained(), main() kurar
+
+
+class Peer:
+    """Per-connection counters (any role)."""
+
+    __slots__ = ("sock", "role", "name", "origin", "since", "msgs_in", "bytes_in", "bytes_out")
+
+    def __init__(self, sock: socket.socket, role=None):
+        self.sock = sock
+        self.role = role
+        self.name = f"fd{sock.fileno()}"
+        self.origin = None   # PUB "origin=" / SUB "noecho=": aynı process'in event'i geri gelmez
+        self.since = time.time()
+        self.msgs_in = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def identify(self, h: Header):
+        self.role = h.role
+        self.name = h.opts.get("name", self.name)
+        self.origin = h.opts.get("noecho" if h.role == "SUB" else "origin")
+
+    def info(self) -> dict:
+        return {
+            "name": self.name,
+            "role": self.role,
+            "age": round(time.time() - self.since, 1),
+            "msgs_in": self.msgs_in,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+
+class Subscriber(Peer):
+    """
+    Outbound side of one SUB connection: a bounded queue with an overflow
+    policy, so a subscriber that stops reading only hurts itself.
+
+    Coalesced ("latest") types sit in the queue as a placeholder (the type
+    string) holding the queue position of the first pending value; the value
+    itself lives in `held` and is replaced by newer ones until it is sent.
+    With a window, a type that was sent less than `interval` ago waits in
+    `due` until release() puts it back in the queue.
+
+    Control events (robi_wire.is_control) go to a separate high lane `hq`
+    that is always drained first; bulk overflow never drops them.
+    """
+
+    __slots__ = ("codec", "q", "hq", "maxlen", "policy", "dropped", "sent",
+                 "rules", "held", "last", "due", "coalesced", "control")
+
+    def __init__(self, sock: socket.socket, role=None):
+        super().__init__(sock, role)
+        self.codec = None
+        self.q = deque()
+        self.hq = deque()   # yüksek öncelik (kontrol event'leri)
+        self.maxlen = config.queue_size
+        self.policy = config.overflow
+        self.dropped = 0
+        self.sent = 0
+        self.rules: Optional[Coalescing] = None
+        self.held = {}      # type -> en son Message (latest)
+        self.last = {}      # type -> son iletim/kabul (monotonic)
+        self.due = {}       # type -> pencere bitişi (monotonic)
+        self.coalesced = 0
+        self.control = config.control   # configure(): sahip sunucunun kontrol seti
+
+    def configure(self, h: Header, cfg: BusConfig):
+        """
+        Header opsiyonları sunucu varsayılanını ezer: queue=.., overflow=..,
+        coalesce=TYPE=latest,TYPE2=rate:5 (ekler) / coalesce=off (kapatır).
+        """
+        self.control = cfg.control
+        try:
+            self.maxlen = max(1, int(h.opts.get("queue", cfg.queue_size)))
+        except ValueError:
+            self.maxlen = cfg.queue_size
+        policy = h.opts.get("overflow", cfg.overflow)
+        self.policy = policy if policy in OVERFLOW_POLICIES else cfg.overflow
+
+        spec = h.opts.get("coalesce")
+        if spec is None:
+            self.rules = cfg.rules()
+        elif spec == "off":
+            self.rules = None
+        else:
+            try:
+                self.rules = Coalescing(cfg.coalesce + spec.split(",")) or None
+            except ValueError as e:
+                print(f"[BUS] ⚠️ {self.name}: {e} (server rules used)")
+                self.rules = cfg.rules()
+        if self.rules is not None:
             try:
-                s.sendall(line)
-            except Exception:
-                dead.append(s)
-        for s in dead:
-            subscribers.discard(s)
-            safe_close(s)
+                self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, COALESCE_SNDBUF)
+            except OSError:
+                pass
+
+    def depth(self) -> int:
+        return len(self.q) + len(self.hq)
+
+    def offer(self, msg: Message, hi: bool = False) -> bool:
+        """Queue msg (hi: control lane). False → policy is "disconnect" and the queue is full."""
+        item = msg
+        if self.rules is not None:
+            typ = msg.type
+            rule = self.rules.match(typ)
+            if rule is not None:
+                if rule.kind == "rate":
+                    now = time.monotonic()
+                    if now < self.last.get(typ, 0.0) + rule.interval:
+                        self.coalesced += 1
+                        return True
+                    self.last[typ] = now
+                elif typ in self.held:
+                    self.held[typ] = msg
+                    self.coalesced += 1
+                    return True
+                else:
+                    item = typ
+
+        q = self.hq if hi else self.q
+        if len(q) >= self.maxlen:
+            if self.policy == "drop-newest":
+                self.dropped += 1
+                return True
+            if self.policy == "disconnect":
+                self.dropped += 1
+                return False
+            old = q.popleft()
+            if old.__class__ is str:
+                self.held.pop(old, None)
+            self.dropped += 1
+        q.append(item)
+        if item is not msg:
+            self.held[item] = msg
+        return True
+
+    def _coalesced(self, typ: str, now: float) -> Optional[Message]:
+        """Placeholder → held value, or None if typ must wait for its window."""
+        rule = self.rules.match(typ) if self.rules is not None else None
+        if rule is not None and rule.interval:
+            ready_at = self.last.get(typ, 0.0) + rule.interval
+            if now < ready_at:
+                self.due[typ] = ready_at
+                return None
+            self.last[typ] = now
+        return self.held.pop(typ, None)
+
+    def next_due(self) -> Optional[float]:
+        return min(self.due.values()) if self.due else None
+
+    def release(self, now: float):
+        """Windows that ended → their placeholders go back to the queue."""
+        for typ, at in list(self.due.items()):
+            if at <= now:
+                del self.due[typ]
+                (self.hq if is_control(typ, self.control) else self.q).append(typ)
+
+    def take(self, limit: int = TAKE_LIMIT) -> bytes:
+        """Pop queued events (control lane first) and encode them, up to about limit bytes."""
+        codec = self.codec
+        out = []
+        size = 0
+        sent = self.sent
+        now = time.monotonic() if self.held else 0.0
+        for q in (self.hq, self.q):
+            while q and size < limit:
+                msg = q.popleft()
+                if msg.__class__ is str:
+                    msg = self._coalesced(msg, now)
+                    if msg is None:
+                        continue
+                try:
+                    data = msg.encoded(codec)
+                except Exception:
+                    # bozuk payload bu abonenin formatına çevrilemiyor → atla
+                    continue
+                out.append(data)
+                size += len(data)
+                sent += 1
+                if not sent % SAMPLE_EVERY:
+                    stats.sample_latency(msg)
+        self.sent = sent
+        return b"".join(out)
+
+    def info(self) -> dict:
+        d = super().info()
+        d.update(sent=self.sent, dropped=self.dropped, queue=self.depth(),
+                 queue_max=self.maxlen, policy=self.policy, coalesced=self.coalesced)
+        return d
+
+
+def _report_drops(sub: Subscriber):
+    if sub.dropped:
+        print(f"[BUS] ⚠️ subscriber closed, dropped={sub.dropped} sent={sub.sent} policy={sub.policy}")
+
+
+def _stats_reply(conns, mode: str) -> bytes:
+    return (json.dumps(stats.snapshot(conns, mode), ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _accept_header(first: bytes):
+    """
+    First line → (header, codec, ack, legacy_msg).
+    codec None: v1 JSON lines. legacy_msg: first line was not a header.
+    """
+    h = parse_header(first)
+    if h is None:
+        # Not a role header → treat as first message from publisher
+        return Header("PUB"), None, b"", Message(line=first)
+    codec = pick_codec(h.opts.get("codec")) if h.version >= 2 else None
+    ack = make_ack(2, codec) if codec else b""
+    return h, codec, ack, None
+
+
+def _messages(dec, codec, chunk: bytes):
+    if codec is None:
+        return [Message(line=line) for line in dec.feed(chunk) if line.strip()]
+    return [Message.from_frame(body, codec) for body in dec.feed(chunk)]
+
+
+# -----------------------------
+# Thread-per-connection server (eski mod)
+# -----------------------------
+class _ThreadSub(Subscriber):
+    """Subscriber with its own writer thread (thread modu)."""
+
+    __slots__ = ("cond", "closed")
+
+    def __init__(self, sock: socket.socket):
+        super().__init__(sock, "SUB")
+        self.cond = threading.Condition()
+        self.closed = False
+
+    def push(self, msg: Message, hi: bool = False):
+        with self.cond:
+            if self.closed:
+                return
+            ok = self.offer(msg, hi)
+            self.cond.notify()
+        if not ok:
+            self.close()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except Exception:
+            pass
+
+    def writer(self):
+        try:
+            while True:
+                with self.cond:
+                    while True:
+                        if self.due:
+                            self.release(time.monotonic())
+                        if self.q or self.hq or self.closed:
+                            break
+                        due = self.next_due()
+                        self.cond.wait(None if due is None else max(0.0, due - time.monotonic()))
+                    if self.closed:
+                        return
+                    data = self.take()
+                if data:
+                    self.sock.sendall(data)
+                    self.bytes_out += len(data)
+                    stats.bytes_out += len(data)
+        except OSError:
+            pass
+        finally:
+            self.close()
+
+
+def broadcast(msg: Message, origin: Optional[str] = None):
+    with sub_lock:
+        targets = router.route(msg)
+        stats.on_message(msg)
+        if retained is not None:
+            retained.update(msg)
+    if not targets:
+        return
+    hi = is_control(msg.type, config.control)
+    # sadece kuyruğa atılır; yazma her abonenin kendi thread'inde
+    for s in targets:
+        if origin is not None and s.origin == origin:
+            continue   # yayıncı process'e local teslim edildi
+        s.push(msg, hi)
 
 def handle_client(conn: socket.socket):
-    role = "pub"
+    sub = None
+    peer = Peer(conn)
     try:
-        # First line can be "SUB\n" or "PUB\n"
+        # First line can be "SUB\n" / "PUB\n" (v1) or "SUB v2 codec=..\n" (v2)
         first = b""
-        while b"\n" not in first and len(first) < 64:
-            chunk = conn.recv(64)
+        while b"\n" not in first and len(first) < MAX_HEADER:
+            chunk = conn.recv(256)
             if not chunk:
                 return
             first += chunk
+        # loop modu ile aynı: başlık da dahil okunan her bayt sayılır
+        peer.bytes_in += len(first)
+        stats.bytes_in += len(first)
 
-        if first.startswith(b"SUB"):
-            role = "sub"
-        elif first.startswith(b"PUB"):
-            role = "pub"
-        else:
-            # Not a role header → treat as first message from publisher
-            role = "pub"
-            broadcast(first)
+        line, sep, rest = first.partition(b"\n")
+        h, codec, ack, legacy = _accept_header(line + sep)
+        if h.role == "STATS":
+            with sub_lock:
+                conns = list(peers)
+            conn.sendall(_stats_reply(conns, "thread"))
+            return
+        if ack:
+            conn.sendall(ack)
 
-        if role == "sub":
+        if h.role == "SUB":
+            sub = _ThreadSub(conn)
+            sub.bytes_in = peer.bytes_in
+            peer = sub
+            sub.identify(h)
+            sub.codec = codec
+            sub.configure(h, config)
+            threading.Thread(target=sub.writer, daemon=True).start()
             with sub_lock:
-                subscribers.add(conn)
+                router.add(sub, h.topics)
+                peers.add(sub)
+                # kayıt ile aynı kilitte: arada yayılan event kaçmaz / eskisi sonra gelmez
+                if retained is not None:
+                    for msg in retained.replay(h):
+                        sub.push(msg, is_control(msg.type, config.control))
             # Keep socket open
             while True:
                 chunk = conn.recv(1024)
                 if not chunk:
                     break
+                sub.bytes_in += len(chunk)
+                stats.bytes_in += len(chunk)
             return
 
         # publisher
-        buf = b""
+        peer.identify(h)
+        with sub_lock:
+            peers.add(peer)
+        if legacy is not None:
+            peer.msgs_in += 1
+            broadcast(legacy)
+        dec = FrameDecoder() if codec else LineDecoder()
+        chunk = rest
         while True:
-            chunk = conn.recv(4096)
+            for msg in _messages(dec, codec, chunk):
+                peer.msgs_in += 1
+                broadcast(msg, peer.origin)
+            chunk = conn.recv(65536)
             if not chunk:
                 break
-            buf += chunk
-            while b"\n" in buf:
-                line, buf = buf.split(b"\n", 1)
-                if line.strip():
-                    broadcast(line + b"\n")
-
-    except OSError:
-        # client died
+            peer.bytes_in += len(chunk)
+            stats.bytes_in += len(chunk)
+
+    except (OSError, ValueError):
+        # client died / protocol error
         pass
     finally:
-        if role == "sub":
-            with sub_lock:
-                subscribers.discard(conn)
+        with sub_lock:
+            peers.discard(peer)
+            if sub is not None:
+                router.remove(sub)
+        if sub is not None:
+            sub.close()
+            _report_drops(sub)
         safe_close(conn)
 
+
+def _stats_dumper(interval: float):
+    while True:
+        time.sleep(interval)
+        with sub_lock:
+            conns = list(peers)
+        print(stats.summary(conns), flush=True)
+
+
+def serve_threaded(srv: socket.socket):
+    if config.stats_interval > 0:
+        threading.Thread(target=_stats_dumper, args=(config.stats_interval,), daemon=True).start()
+    while True:
+        conn, _ = srv.accept()
+        threading.Thread(target=handle_client, args=(conn,), daemon=True).start()
+
+
+# -----------------------------
+# Event-loop server (tek thread, selectors)
+# -----------------------------
+class _Conn(Subscriber):
+    __slots__ = ("dec", "rbuf", "wbuf", "armed")
+
+    def __init__(self, sock: socket.socket):
+        super().__init__(sock)    # role None: header bekleniyor
+        self.dec = None
+        self.rbuf = bytearray()   # sadece header okunurken kullanılır
+        self.wbuf = bytearray()   # socket'e yazılamamış, encode edilmiş kısım
+        self.armed = None         # kurulu en yakın coalesce timer'ı
+
+    def info(self) -> dict:
+        d = super().info()
+        if self.role != "SUB":
+            for k in ("sent", "dropped", "queue", "queue_max", "policy", "coalesced"):
+                d.pop(k, None)
+        else:
+            d["wbuf"] = len(self.wbuf)
+        return d
+
+
+class LoopServer:
+    """
+    Tüm bağlantıları tek bir selectors döngüsünden servis eder.
+    Wire format ve PUB/SUB handshake thread modundakiyle birebir aynı.
+    """
+
+    def __init__(self, srv: socket.socket, cfg: BusConfig):
+        self.srv = srv
+        self.cfg = cfg
+        self.sel = selectors.DefaultSelector()
+        self.router = Router()
+        self.retained = cfg.retained()
+        self.timers = []                  # (due, seq, conn): coalesce pencereleri
+        self._seq = itertools.count()
+
+    def conns(self) -> list:
+        return [
+            key.data for key in self.sel.get_map().values()
+            if key.data is not None and key.data.role in ("PUB", "SUB")
+        ]
+
+    def serve_forever(self):
+        self.srv.setblocking(False)
+        self.sel.register(self.srv, selectors.EVENT_READ, None)
+        interval = self.cfg.stats_interval
+        next_dump = time.monotonic() + interval if interval > 0 else None
+        try:
+            while True:
+                timeout = None
+                if next_dump is not None:
+                    timeout = next_dump - time.monotonic()
+                    if timeout <= 0:
+                        print(stats.summary(self.conns()), flush=True)
+                        next_dump += interval
+                        timeout = max(0.0, next_dump - time.monotonic())
+                if self.timers:
+                    t = max(0.0, self.timers[0][0] - time.monotonic())
+                    timeout = t if timeout is None else min(timeout, t)
+                for key, mask in self.sel.select(timeout):
+                    c = key.data
+                    if c is None:
+                        self._accept()
+                        continue
+                    if mask & selectors.EVENT_READ:
+                        self._on_read(c)
+                    if mask & selectors.EVENT_WRITE and c.sock.fileno() != -1:
+                        self._flush(c)
+                if self.timers:
+                    self._run_timers()
+        finally:
+            for key in list(self.sel.get_map().values()):
+                if key.data is not None:
+                    safe_close(key.data.sock)
+            self.sel.close()
+
+    def _accept(self):
+        try:
+            conn, _ = self.srv.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        conn.setblocking(False)
+        self.sel.register(conn, selectors.EVENT_READ, _Conn(conn))
+
+    def _drop(self, c: _Conn):
+        if c.sock.fileno() == -1:
+            return
+        self.router.remove(c)
+        try:
+            self.sel.unregister(c.sock)
+        except (KeyError, ValueError):
+            pass
+        safe_close(c.sock)
+        if c.role == "SUB":
+            _report_drops(c)
+
+    def _on_read(self, c: _Conn):
+        try:
+            chunk = c.sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            chunk = b""
+        if not chunk:
+            self._drop(c)
+            return
+        c.bytes_in += len(chunk)
+        stats.bytes_in += len(chunk)
+
+        if c.role == "SUB":
+            # Subscriber'dan gelen veri yok sayılır (sadece EOF takibi)
+            return
+
+        if c.role is None:
+            c.rbuf += chunk
+            nl = c.rbuf.find(b"\n")
+            if nl < 0 and len(c.rbuf) < MAX_HEADER:
+                return
+            end = nl + 1 if nl >= 0 else len(c.rbuf)
+            first, chunk = bytes(c.rbuf[:end]), bytes(c.rbuf[end:])
+            c.rbuf = bytearray()
+
+            h, c.codec, ack, legacy = _accept_header(first)
+            c.identify(h)
+            if c.role == "STATS":
+                self._answer_stats(c)
+                return
+            if ack:
+                c.wbuf += ack
+                self._flush(c)
+            if legacy is not None:
+                c.msgs_in += 1
+                self._broadcast(legacy)
+            if c.role == "SUB":
+                c.configure(h, self.cfg)
+                self.router.add(c, h.topics)
+                if self.retained is not None:
+                    for msg in self.retained.replay(h):
+                        c.offer(msg, is_control(msg.type, self.cfg.control))
+                    self._flush(c)
+                return
+            c.dec = FrameDecoder() if c.codec else LineDecoder()
+
+        # publisher: tamamlanan mesajları yay, yarım kalan decoder'da kalır
+        try:
+            msgs = _messages(c.dec, c.codec, chunk)
+        except ValueError:
+            self._drop(c)
+            return
+        c.msgs_in += len(msgs)
+        for msg in msgs:
+            self._broadcast(msg, c.origin)
+
+    def _answer_stats(self, c: _Conn):
+        # küçük, tek seferlik cevap: bloklayarak yaz ve kapat
+        try:
+            c.sock.settimeout(1.0)
+            c.sock.sendall(_stats_reply(self.conns(), "loop"))
+        except OSError:
+            pass
+        self._drop(c)
+
+    def _broadcast(self, msg: Message, origin: Optional[str] = None):
+        targets = self.router.route(msg)
+        stats.on_message(msg)
+        if self.retained is not None:
+            self.retained.update(msg)
+        if not targets:
+            return
+        hi = is_control(msg.type, self.cfg.control)
+        for c in targets:
+            if origin is not None and c.origin == origin:
+                continue   # yayıncı process'e local teslim edildi
+            if not c.offer(msg, hi):
+                self._drop(c)
+                continue
+            if not c.wbuf:
+                self._flush(c)
+
+    def _run_timers(self):
+        now = time.monotonic()
+        timers = self.timers
+        while timers and timers[0][0] <= now:
+            _, _, c = heapq.heappop(timers)
+            if c.sock.fileno() == -1:
+                continue
+            c.armed = None
+            c.release(now)
+            if c.depth() and not c.wbuf:
+                self._flush(c)
+            else:
+                self._arm(c)
+
+    def _arm(self, c: _Conn):
+        due = c.next_due()
+        if due is not None and (c.armed is None or due < c.armed):
+            c.armed = due
+            heapq.heappush(self.timers, (due, next(self._seq), c))
+
+    def _flush(self, c: _Conn):
+        """Kuyruktan encode et, socket'in aldığı kadar yaz, kalanı için EVENT_WRITE bekle."""
+        while True:
+            if not c.wbuf:
+                if not (c.q or c.hq):
+                    break
+                c.wbuf += c.take()
+            try:
+                n = c.sock.send(c.wbuf)
+            except (BlockingIOError, InterruptedError):
+                n = 0
+            except OSError:
+                self._drop(c)
+                return
+            del c.wbuf[:n]
+            c.bytes_out += n
+            stats.bytes_out += n
+            if c.wbuf:
+                break
+
+        if c.due:
+            self._arm(c)
+
+        want = selectors.EVENT_READ | selectors.EVENT_WRITE if (c.wbuf or c.q or c.hq) else selectors.EVENT_READ
+        key = self.sel.get_key(c.sock)
+        if key.events != want:
+            self.sel.modify(c.sock, want, c)
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="ROBI event bus")
+    ap.add_argument("--socket", default=BUS_SOCKET, help="AF_UNIX socket path")
+    ap.add_argument(
+        "--mode",
+        choices=["loop", "thread"],
+        default="loop",
+        help="loop: tek thread selectors döngüsü, thread: bağlantı başına thread (eski)",
+    )
+    ap.add_argument("--queue-size", type=int, default=BusConfig.queue_size,
+                    help="abone başına max bekleyen event")
+    ap.add_argument("--overflow", choices=OVERFLOW_POLICIES, default=BusConfig.overflow,
+                    help="kuyruk dolunca: en eskiyi at / yeniyi at / aboneyi kopar")
+    ap.add_argument("--coalesce", action="append", default=[], metavar="TYPE=POLICY",
+                    help="tip başına birleştirme: TYPE=latest, TYPE=latest:<sn>, TYPE=rate:<hz> "
+                         "(TYPE 'X*' prefix olabilir; tekrarlanabilir)")
+    ap.add_argument("--control", action="append", default=[], metavar="TYPE",
+                    help="yüksek öncelikli (kontrol) sayılacak ek event tipi; tekrarlanabilir")
+    ap.add_argument("--retain", action="append", default=[], metavar="SPEC",
+                    help="son değeri saklanıp yeni aboneye SUB'dan hemen sonra verilecek tip: "
+                         "TYPE, 'X*' ya da GROUP=TYPE1,TYPE2 (gruptan sadece en son); tekrarlanabilir")
+    ap.add_argument("--stats-interval", type=float, default=BusConfig.stats_interval,
+                    help="N saniyede bir stats satırı yazdır (0: kapalı)")
+    ap.add_argument("--stats", action="store_true",
+                    help="çalışan bus'tan stats al, JSON yazdır ve çık")
+    return ap.parse_args()
+
+
 def main():
-    if os.path.exists(BUS_SOCKET):
-        os.remove(BUS_SOCKET)
+    args = parse_args()
+    sock_path = args.socket
+    if args.stats:
+        print(json.dumps(query_stats(sock_path), indent=2, ensure_ascii=False))
+        return
+    config.queue_size = max(1, args.queue_size)
+    config.overflow = args.overflow
+    config.stats_interval = args.stats_interval
+    config.coalesce = list(args.coalesce)
+    config.control = frozenset(args.control)
+    config.retain = list(args.retain)
+    global retained
+    try:
+        config.rules()
+        retained = config.retained()
+    except ValueError as e:
+        raise SystemExit(f"[BUS][ERR] {e}")
+
+    if os.path.exists(sock_path):
+        os.remove(sock_path)
 
     srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-    srv.bind(BUS_SOCKET)
-    os.chmod(BUS_SOCKET, 0o666)
+    srv.bind(sock_path)
+    os.chmod(sock_path, 0o666)
     srv.listen(32)
 
-    print("[BUS] 🚌 ROBI Bus online:", BUS_SOCKET)
+    print(f"[BUS] 🚌 ROBI Bus online: {sock_path} (mode={args.mode})")
 
     try:
-        while True:
-            conn, _ = srv.accept()
-            threading.Thread(target=handle_client, args=(conn,), daemon=True).start()
+        if args.mode == "loop":
+            LoopServer(srv, config).serve_forever()
+        else:
+            serve_threaded(srv)
     except KeyboardInterrupt:
         pass
     except Exception as e:
@@ -143,7 +1128,7 @@ def main():
     finally:
         safe_close(srv)
         try:
-            os.remove(BUS_SOCKET)
+            os.remove(sock_path)
         except Exception:
             pass
         print("[BUS] 🚌 ROBI Bus offline")
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+robi_bus_bench.py
+robi_bus throughput / latency benchmark.
+
+Starts robi_bus.py on a temp socket, runs N publisher and M subscriber
+processes through robi_client, and reports msgs/s, end-to-end latency
+percentiles and CPU time per process.
+
+Examples:
+  python3 robi_bus_bench.py                              # 1 pub, 4 sub, loop, v2
+  python3 robi_bus_bench.py --mode thread --version 1    # eski sunucu + JSON lines
+  python3 robi_bus_bench.py --pubs 2 --subs 8 --size 1024 --rate 500 --duration 5
+  python3 robi_bus_bench.py --bus-arg=--queue-size=65536  # kayıpsız max throughput
+  python3 robi_bus_bench.py --json > bench.json          # commit'ler / Pi vs x86 karşılaştırma
+
+Flood (kontrol event gecikmesi bulk trafik altında):
+  python3 robi_bus_bench.py --flood --work-us 50          # TTS_START (kontrol lane) 50 Hz
+  python3 robi_bus_bench.py --flood --work-us 50 --ctl-type bench.ctl   # aynısı, önceliksiz
+
+Local (aynı process'te publish + subscribe; bus üzerinden vs BusClient(local=True)):
+  python3 robi_bus_bench.py --local --subs 1 --rate 1000 --duration 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import List, Optional
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from robi_client import BusClient, get_publisher  # noqa: E402
+
+
+@dataclass
+class BenchCfg:
+    mode: str = "loop"
+    version: int = 2
+    pubs: int = 1
+    subs: int = 4
+    size: int = 128          # payload bytes (pad alanı)
+    rate: float = 0.0        # publisher başına msg/s, 0 = olabildiğince hızlı
+    count: int = 5000        # publisher başına mesaj
+    warmup: float = 0.3
+    flood: bool = False      # + kontrol publisher'ı, kontrol gecikmesi ayrı ölçülür
+    ctl_type: str = "TTS_START"
+    ctl_rate: float = 50.0   # kontrol event/s
+    work_us: float = 0.0     # abonenin bulk event başına "işleme" süresi
+    local: bool = False      # abone(ler) publisher ile aynı process'te
+
+
+# -----------------------------
+# CPU accounting
+# -----------------------------
+def proc_cpu(pid: int) -> Optional[float]:
+    """user+sys CPU seconds of pid from /proc (Linux)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def proc_threads(pid: int) -> Optional[int]:
+    try:
+        return len(os.listdir(f"/proc/{pid}/task"))
+    except OSError:
+        return None
+
+
+def percentile(sorted_vals: List[float], p: float) -> Optional[float]:
+    if not sorted_vals:
+        return None
+    k = min(len(sorted_vals) - 1, int(round(p / 100.0 * (len(sorted_vals) - 1))))
+    return sorted_vals[k]
+
+
+# -----------------------------
+# Workers
+# -----------------------------
+def _publish_loop(pub, cfg: BenchCfg, pid: int):
+    pad = "x" * cfg.size
+    interval = 1.0 / cfg.rate if cfg.rate > 0 else 0.0
+    next_at = time.time()
+    for i in range(cfg.count):
+        pub.publish({"type": "bench", "p": pid, "i": i, "t": time.time(), "pad": pad})
+        if interval:
+            next_at += interval
+            delay = next_at - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        elif i % 256 == 255:
+            # max hız: client buffer'ı taşırmadan bus'ın kaldırabildiği kadar
+            pub.flush(10.0)
+    pub.flush(10.0)
+
+
+def _publisher(sock_path: str, cfg: BenchCfg, pid: int, start_at: float, out):
+    pub = get_publisher(sock_path, cfg.version)
+    while time.time() < start_at:
+        time.sleep(0.001)
+
+    cpu0 = time.process_time()
+    t0 = time.time()
+    _publish_loop(pub, cfg, pid)
+    out.put({"role": "pub", "id": pid, "cpu": time.process_time() - cpu0,
+             "elapsed": time.time() - t0, "sent": pub.sent, "dropped": pub.dropped})
+
+
+def _control_publisher(sock_path: str, cfg: BenchCfg, start_at: float, stop, out):
+    pub = get_publisher(sock_path, cfg.version)
+    interval = 1.0 / cfg.ctl_rate
+    while time.time() < start_at:
+        time.sleep(0.001)
+    n = 0
+    next_at = time.time()
+    while not stop.is_set():
+        pub.publish({"type": cfg.ctl_type, "i": n, "t": time.time()})
+        n += 1
+        next_at += interval
+        delay = next_at - time.time()
+        if delay > 0:
+            time.sleep(delay)
+    pub.flush(5.0)
+    out.put({"role": "ctl", "sent": n})
+
+
+def _work(us: float):
+    # yavaş tüketici (ör. LLM/IO bekleyen brain): CPU yakmadan bekler,
+    # tek çekirdekli makinede de bus/publisher'ları aç bırakmaz
+    time.sleep(us / 1e6)
+
+
+def _subscriber(sock_path: str, cfg: BenchCfg, sid: int, expect: int, ready, out):
+    topics = ["bench", cfg.ctl_type] if cfg.flood else ["bench"]
+    bus = BusClient(sock_path, cfg.version, topics=topics)
+    ready.set()
+    lat = []
+    ctl = []
+    cpu0 = time.process_time()
+    first = last = None
+    idle_deadline = None
+    while len(lat) < expect:
+        # flood: küçük batch'ler → kontrol event'i en fazla bir batch bekler
+        evs = bus.recv_many(timeout=0.5, limit=16 if cfg.flood else None)
+        now = time.time()
+        if not evs:
+            if idle_deadline is None:
+                idle_deadline = now + 3.0
+            elif now > idle_deadline:
+                break
+            continue
+        idle_deadline = None
+        if first is None:
+            first = now
+        last = now
+        for ev in evs:
+            if cfg.flood:
+                # gecikme: event'in işlendiği an (kuyruk sırası dahil)
+                t = time.time()
+                if ev["type"] != "bench":
+                    ctl.append(t - ev["t"])
+                    continue
+                lat.append(t - ev["t"])
+                if cfg.work_us:
+                    _work(cfg.work_us)
+            else:
+                lat.append(now - ev["t"])
+    out.put({"role": "sub", "id": sid, "cpu": time.process_time() - cpu0,
+             "received": len(lat), "lat": lat, "ctl": ctl,
+             "elapsed": (last - first) if first is not None else 0.0})
+
+
+def _cohosted(sock_path: str, cfg: BenchCfg, local: bool, out):
+    """Publisher + cfg.subs subscriber threads in one process (co-hosted services)."""
+    subs = [BusClient(sock_path, cfg.version, topics=["bench"], local=local) for _ in range(cfg.subs)]
+    lats = [[] for _ in subs]
+
+    def consume(bus, lat):
+        idle_deadline = None
+        while len(lat) < cfg.count:
+            evs = bus.recv_many(timeout=0.5)
+            now = time.time()
+            if not evs:
+                if idle_deadline is None:
+                    idle_deadline = now + 3.0
+                elif now > idle_deadline:
+                    return
+                continue
+            idle_deadline = None
+            lat += [now - ev["t"] for ev in evs]
+
+    threads = [threading.Thread(target=consume, args=(b, lat), daemon=True) for b, lat in zip(subs, lats)]
+    for t in threads:
+        t.start()
+    pub = get_publisher(sock_path, cfg.version)
+    time.sleep(cfg.warmup)
+
+    cpu0 = time.process_time()
+    t0 = time.time()
+    _publish_loop(pub, cfg, 0)
+    for t in threads:
+        t.join(30.0)
+    out.put({"cpu": time.process_time() - cpu0, "elapsed": time.time() - t0,
+             "sent": pub.sent, "lat": [x for lat in lats for x in lat]})
+
+
+def run_local_bench(cfg: BenchCfg, bus_args: Optional[List[str]] = None) -> dict:
+    """Same co-hosted workload twice: through the bus, then with local dispatch."""
+    tmp = tempfile.mkdtemp(prefix="robi_bench_")
+    sock_path = os.path.join(tmp, "bus.sock")
+    bus = start_bus(sock_path, cfg.mode, bus_args)
+    res = {"cfg": asdict(cfg),
+           "host": {"machine": platform.machine(), "python": platform.python_version()}}
+    try:
+        for name, local in (("via_bus", False), ("local", True)):
+            out = mp.Queue()
+            p = mp.Process(target=_cohosted, args=(sock_path, cfg, local, out))
+            bus_cpu0 = proc_cpu(bus.pid)
+            p.start()
+            r = out.get(timeout=120)
+            p.join(5.0)
+            bus_cpu = proc_cpu(bus.pid)
+            lat = sorted(r.pop("lat"))
+            res[name] = {
+                "delivered": len(lat),
+                "expected": cfg.count * cfg.subs,
+                "msgs_per_s": round(len(lat) / max(r["elapsed"], 1e-9), 1),
+                "latency_ms": {k: (None if v is None else round(v * 1000.0, 3)) for k, v in (
+                    ("p50", percentile(lat, 50)), ("p99", percentile(lat, 99)),
+                    ("max", lat[-1] if lat else None))},
+                "cpu_s": {
+                    "process": round(r["cpu"], 3),
+                    "bus": None if bus_cpu is None or bus_cpu0 is None else round(bus_cpu - bus_cpu0, 3),
+                },
+            }
+    finally:
+        bus.terminate()
+        bus.wait()
+        try:
+            os.remove(sock_path)
+            os.rmdir(tmp)
+        except OSError:
+            pass
+    return res
+
+
+def print_local_report(res: dict):
+    c = res["cfg"]
+    print(f"[BENCH] local: mode={c['mode']} subs={c['subs']} (same process) "
+          f"size={c['size']}B rate={c['rate'] or 'max'} count={c['count']}")
+    for name in ("via_bus", "local"):
+        r = res[name]
+        lat = r["latency_ms"]
+        cpu = r["cpu_s"]
+        print(f"[BENCH] {name:8s} delivered {r['delivered']}/{r['expected']}  {r['msgs_per_s']} msg/s  "
+              f"latency ms p50={lat['p50']} p99={lat['p99']} max={lat['max']}  "
+              f"cpu s process={cpu['process']} bus={cpu['bus']}")
+
+
+# -----------------------------
+# Runner
+# -----------------------------
+def start_bus(sock_path: str, mode: str, extra: Optional[List[str]] = None) -> subprocess.Popen:
+    p = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "robi_bus.py"), "--socket", sock_path, "--mode", mode]
+        + list(extra or []),
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 5.0
+    while not os.path.exists(sock_path):
+        if time.time() > deadline or p.poll() is not None:
+            raise RuntimeError("robi_bus did not start")
+        time.sleep(0.02)
+    return p
+
+
+def run_bench(cfg: BenchCfg, bus_args: Optional[List[str]] = None) -> dict:
+    tmp = tempfile.mkdtemp(prefix="robi_bench_")
+    sock_path = os.path.join(tmp, "bus.sock")
+    bus = start_bus(sock_path, cfg.mode, bus_args)
+    out = mp.Queue()
+    procs = []
+    try:
+        expect = cfg.pubs * cfg.count
+        readies = []
+        for sid in range(cfg.subs):
+            ready = mp.Event()
+            readies.append(ready)
+            procs.append(mp.Process(target=_subscriber, args=(sock_path, cfg, sid, expect, ready, out)))
+        for p in procs:
+            p.start()
+        for r in readies:
+            r.wait(5.0)
+
+        bus_cpu0 = proc_cpu(bus.pid)
+        start_at = time.time() + cfg.warmup
+        pubs = [
+            mp.Process(target=_publisher, args=(sock_path, cfg, pid, start_at, out))
+            for pid in range(cfg.pubs)
+        ]
+        for p in pubs:
+            p.start()
+        procs += pubs
+
+        stop = mp.Event()
+        ctl_proc = None
+        if cfg.flood:
+            ctl_proc = mp.Process(target=_control_publisher, args=(sock_path, cfg, start_at, stop, out))
+            ctl_proc.start()
+
+        results = []
+        bus_threads = proc_threads(bus.pid)
+        deadline = time.time() + 120
+        while len(results) < len(procs) and time.time() < deadline:
+            try:
+                results.append(out.get(timeout=0.05))
+            except Exception:
+                pass
+            if sum(r["role"] == "pub" for r in results) == cfg.pubs:
+                stop.set()   # bulk bitti: kontrol publisher'ı da dursun
+            bus_threads = max(bus_threads or 0, proc_threads(bus.pid) or 0)
+        bus_cpu = proc_cpu(bus.pid)
+        stop.set()
+        if ctl_proc is not None:
+            try:
+                results.append(out.get(timeout=5.0))
+            except Exception:
+                pass
+            procs.append(ctl_proc)
+        for p in procs:
+            p.join(5.0)
+    finally:
+        bus.terminate()
+        bus.wait()
+        try:
+            os.remove(sock_path)
+            os.rmdir(tmp)
+        except OSError:
+            pass
+
+    subs = [r for r in results if r["role"] == "sub"]
+    pubs = [r for r in results if r["role"] == "pub"]
+    lat = sorted(x for r in subs for x in r.pop("lat"))
+    ctl = sorted(x for r in subs for x in r.pop("ctl"))
+    ctl_sent = sum(r["sent"] for r in results if r["role"] == "ctl")
+    received = sum(r["received"] for r in subs)
+    elapsed = max([r["elapsed"] for r in subs] + [r["elapsed"] for r in pubs] + [1e-9])
+
+    def ms(v):
+        return None if v is None else round(v * 1000.0, 3)
+
+    res = {
+        "cfg": asdict(cfg),
+        "host": {"machine": platform.machine(), "python": platform.python_version()},
+        "published": sum(r["sent"] for r in pubs),
+        "client_dropped": sum(r["dropped"] for r in pubs),
+        "delivered": received,
+        "expected": cfg.pubs * cfg.count * cfg.subs,
+        "msgs_per_s": round(received / elapsed, 1),
+        "latency_ms": {
+            "p50": ms(percentile(lat, 50)),
+            "p95": ms(percentile(lat, 95)),
+            "p99": ms(percentile(lat, 99)),
+            "max": ms(lat[-1] if lat else None),
+        },
+        "cpu_s": {
+            "bus": None if bus_cpu is None or bus_cpu0 is None else round(bus_cpu - bus_cpu0, 3),
+            "pubs": [round(r["cpu"], 3) for r in pubs],
+            "subs": [round(r["cpu"], 3) for r in subs],
+        },
+        "bus_threads": bus_threads,
+    }
+    if cfg.flood:
+        res["control"] = {
+            "type": cfg.ctl_type,
+            "sent": ctl_sent,
+            "delivered": len(ctl),
+            "expected": ctl_sent * cfg.subs,
+            "latency_ms": {
+                "p50": ms(percentile(ctl, 50)),
+                "p95": ms(percentile(ctl, 95)),
+                "p99": ms(percentile(ctl, 99)),
+                "max": ms(ctl[-1] if ctl else None),
+            },
+        }
+    return res
+
+
+def print_report(res: dict):
+    c = res["cfg"]
+    lat = res["latency_ms"]
+    cpu = res["cpu_s"]
+    print(f"[BENCH] mode={c['mode']} v{c['version']} pubs={c['pubs']} subs={c['subs']} "
+          f"size={c['size']}B rate={c['rate'] or 'max'} count={c['count']}")
+    print(f"[BENCH] published {res['published']} (client dropped {res['client_dropped']}), "
+          f"delivered {res['delivered']}/{res['expected']}  {res['msgs_per_s']} msg/s")
+    print(f"[BENCH] latency ms p50={lat['p50']} p95={lat['p95']} p99={lat['p99']} max={lat['max']}")
+    print(f"[BENCH] cpu s bus={cpu['bus']} (threads={res['bus_threads']}) "
+          f"pubs={cpu['pubs']} subs={cpu['subs']}")
+    ctl = res.get("control")
+    if ctl:
+        cl = ctl["latency_ms"]
+        print(f"[BENCH] control {ctl['type']} @ {c['ctl_rate']}/s work={c['work_us']}us: "
+              f"delivered {ctl['delivered']}/{ctl['expected']}  "
+              f"latency ms p50={cl['p50']} p95={cl['p95']} p99={cl['p99']} max={cl['max']}")
+
+
+def parse_args():
+    d = BenchCfg()
+    ap = argparse.ArgumentParser(description="ROBI bus benchmark")
+    ap.add_argument("--mode", choices=["loop", "thread"], default=d.mode)
+    ap.add_argument("--version", type=int, choices=[1, 2], default=d.version, help="wire format")
+    ap.add_argument("--pubs", type=int, default=d.pubs)
+    ap.add_argument("--subs", type=int, default=d.subs)
+    ap.add_argument("--size", type=int, default=d.size, help="payload bytes")
+    ap.add_argument("--rate", type=float, default=d.rate, help="msg/s per publisher (0 = max)")
+    ap.add_argument("--count", type=int, default=None, help="messages per publisher")
+    ap.add_argument("--duration", type=float, default=None, help="seconds (with --rate, sets --count)")
+    ap.add_argument("--flood", action="store_true", help="bulk flood + kontrol event gecikmesi")
+    ap.add_argument("--ctl-type", default=d.ctl_type, help="kontrol event tipi (flood)")
+    ap.add_argument("--ctl-rate", type=float, default=d.ctl_rate, help="kontrol event/s (flood)")
+    ap.add_argument("--work-us", type=float, default=d.work_us,
+                    help="abonenin bulk event başına işleme süresi, µs (flood)")
+    ap.add_argument("--local", action="store_true",
+                    help="aynı process'te pub+sub: bus üzerinden vs local dispatch")
+    ap.add_argument("--bus-arg", action="append", default=[], help="extra robi_bus.py argument")
+    ap.add_argument("--json", action="store_true", help="JSON output")
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    count = args.count
+    if count is None:
+        count = int(args.rate * args.duration) if (args.rate and args.duration) else BenchCfg.count
+    cfg = BenchCfg(mode=args.mode, version=args.version, pubs=args.pubs, subs=args.subs,
+                   size=args.size, rate=args.rate, count=count, flood=args.flood,
+                   ctl_type=args.ctl_type, ctl_rate=args.ctl_rate, work_us=args.work_us,
+                   local=args.local)
+    res = run_local_bench(cfg, args.bus_arg) if cfg.local else run_bench(cfg, args.bus_arg)
+    if args.json:
+        print(json.dumps(res, indent=2))
+    elif cfg.local:
+        print_local_report(res)
+    else:
+        print_report(res)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,596 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+robi_client.py
+Tek bus client kütüphanesi (brain / audio / speech / wake / perception).
+
+- Publisher: process başına socket yolu başına TEK bağlantı (pool).
+  publish() hiç bloklamaz: event outbound buffer'a girer, gönderici thread
+  yollar. Bus yoksa/yeniden başlıyorsa buffer'da bekler (sınırlı).
+- BusClient: kendi SUB bağlantısı (topic filtreli) + pool'daki publisher.
+  Bağlantı koparsa backoff ile yeniden bağlanır ve aynı topic'lere
+  yeniden abone olur.
+- Kontrol event'leri (robi_wire.is_control: TTS_*, LISTEN, WAKE, rpc.* ...)
+  iki yönde de ayrı bir yüksek öncelik kuyruğundan önce gider / önce döner.
+- BusClient(local=True): aynı process'te publish edilen event'ler bu aboneye
+  doğrudan (aynı dict, encode/socket yok) verilir; bus'a yine gider, bus
+  sadece bu aboneye geri yollamaz (SUB "noecho=<origin>").
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import select
+import socket
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+from robi_constants import BUS_SOCKET
+from robi_wire import (
+    FrameDecoder,
+    LineDecoder,
+    client_handshake,
+    decode_body,
+    encode_frame,
+    encode_line,
+    is_control,
+    make_header,
+    wants,
+)
+
+BACKOFF_MIN = 0.1
+BACKOFF_MAX = 5.0
+
+# Tek recv()/recv_many() turunda socket'ten okunacak max byte. Flood altında
+# batch'i sınırlar: sonradan gelen kontrol event'i en fazla bir batch bekler.
+FILL_MAX = 64 * 1024
+
+
+def client_name() -> str:
+    """Bus stats'ında bağlantıyı tanımak için (header opt "name=")."""
+    return f"{os.path.basename(sys.argv[0] or '') or 'python'}:{os.getpid()}"
+
+
+_origin = (None, None)
+
+
+def origin_id() -> str:
+    """Process kimliği (header opt "origin=" / "noecho="); fork sonrası yenilenir."""
+    global _origin
+    pid, token = _origin
+    if pid != os.getpid():
+        pid = os.getpid()
+        token = f"{pid}-{uuid.uuid4().hex[:8]}"
+        _origin = (pid, token)
+    return token
+
+
+def _connect(sock_path: str, role: str, version: int, topics=None, **opts):
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    if version >= 2:
+        opts.setdefault("name", client_name())
+    try:
+        s.connect(sock_path)
+        codec, leftover = client_handshake(s, role, version, topics, **opts)
+    except Exception:
+        s.close()
+        raise
+    return s, codec, leftover
+
+
+def _is_control(ev) -> bool:
+    return isinstance(ev, dict) and is_control(ev.get("type"))
+
+
+def _close(s: Optional[socket.socket]):
+    if s is None:
+        return
+    try:
+        s.close()
+    except Exception:
+        pass
+
+
+def query_stats(sock_path: str = BUS_SOCKET, timeout: float = 1.0) -> dict:
+    """One-shot bus statistics (STATS header → one JSON line)."""
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.settimeout(timeout)
+    try:
+        s.connect(sock_path)
+        s.sendall(make_header("STATS"))
+        data = b""
+        while b"\n" not in data:
+            chunk = s.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    finally:
+        _close(s)
+    return json.loads(data)
+
+
+# -----------------------------
+# In-process loopback (local=True aboneler)
+# -----------------------------
+class LocalHub:
+    """
+    Local subscribers of one bus socket in this process. publish() hands
+    them the original event object (no copy: treat it as read-only).
+    """
+
+    def __init__(self):
+        self.subs: List["BusClient"] = []
+        self._lock = threading.Lock()
+
+    def add(self, client: "BusClient"):
+        with self._lock:
+            self.subs = self.subs + [client]
+
+    def remove(self, client: "BusClient"):
+        with self._lock:
+            self.subs = [c for c in self.subs if c is not client]
+
+    def dispatch(self, ev: dict):
+        typ = ev.get("type") if isinstance(ev, dict) else None
+        for c in self.subs:     # kopya liste: kilitsiz okunur
+            if typ is not None and wants(c.topics, typ):
+                c._deliver_local(ev)
+
+
+_hubs: Dict[str, LocalHub] = {}
+
+
+def _hub(sock_path: str) -> LocalHub:
+    with _pool_lock:
+        hub = _hubs.get(sock_path)
+        if hub is None:
+            hub = _hubs[sock_path] = LocalHub()
+        return hub
+
+
+# -----------------------------
+# Publisher (pooled, non-blocking)
+# -----------------------------
+class Publisher:
+    """
+    One PUB connection with an outbound buffer and a sender thread.
+    Use get_publisher() instead of creating these directly.
+    """
+
+    def __init__(self, sock_path: str, version: int = 2, max_pending: int = 1024,
+                 max_control: Optional[int] = None):
+        self.sock_path = sock_path
+        self.version = version
+        self.max_pending = max_pending
+        # kontrol lane'i kendi (daha büyük) limitine kadar hiç atılmaz
+        self.max_control = max_control if max_control is not None else max_pending * 4
+        self.dropped = 0            # toplam atılan (bulk + kontrol)
+        self.dropped_control = 0    # bunlardan kontrol event'leri
+        self.sent = 0
+        self.connected = False
+
+        self._q = deque()
+        self._hq = deque()        # kontrol event'leri: önce gönderilir
+        self._cond = threading.Condition()
+        self._closing = False
+        self._sending = 0
+        self._sock: Optional[socket.socket] = None
+        self._codec: Optional[str] = None
+        self._backoff = BACKOFF_MIN
+
+        self._thread = threading.Thread(target=self._run, name="robi-bus-pub", daemon=True)
+        self._thread.start()
+
+    # ---- API ----
+    def _put(self, ev: dict):
+        if _is_control(ev):
+            hq = self._hq
+            if len(hq) + len(self._q) >= self.max_pending and self._q:
+                # tampon dolu: yeri önce bulk bırakır (en eski bulk event)
+                self._q.popleft()
+                self.dropped += 1
+            elif len(hq) >= self.max_control:
+                hq.popleft()
+                self.dropped += 1
+                self.dropped_control += 1
+            hq.append(ev)
+            return
+        if len(self._q) + len(self._hq) >= self.max_pending:
+            if not self._q:
+                self.dropped += 1   # tampon tamamen kontrol event'i: yeni bulk atılır
+                return
+            self._q.popleft()
+            self.dropped += 1
+        self._q.append(ev)
+
+    def publish(self, ev: dict):
+        hub = _hubs.get(self.sock_path) if self.version >= 2 else None
+        if hub is not None and hub.subs:
+            hub.dispatch(ev)
+        with self._cond:
+            self._put(ev)
+            self._cond.notify()
+
+    def publish_many(self, evs: Iterable[dict]):
+        """Batch: events go out in one write."""
+        hub = _hubs.get(self.sock_path) if self.version >= 2 else None
+        if hub is not None and hub.subs:
+            evs = list(evs)
+            for ev in evs:
+                hub.dispatch(ev)
+        with self._cond:
+            for ev in evs:
+                self._put(ev)
+            self._cond.notify()
+
+    def flush(self, timeout: float = 1.0) -> bool:
+        """Wait until the outbound buffer is on the wire (True) or timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._q or self._hq or self._sending:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return False
+                self._cond.wait(left)
+        return True
+
+    def close(self):
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+
+    # ---- sender thread ----
+    def _ensure(self) -> bool:
+        if self._sock is not None:
+            return True
+        try:
+            opts = {"origin": origin_id()} if self.version >= 2 else {}
+            self._sock, self._codec, _ = _connect(self.sock_path, "PUB", self.version, **opts)
+        except OSError:
+            self.connected = False
+            return False
+        self.connected = True
+        self._backoff = BACKOFF_MIN
+        return True
+
+    def _encode(self, batch) -> List[bytes]:
+        codec = self._codec
+        out = []
+        for ev in batch:
+            try:
+                out.append(encode_frame(ev, codec) if codec else encode_line(ev))
+            except Exception as e:
+                print("[BUS][CLIENT] ⚠️ unencodable event dropped:", e)
+                out.append(None)
+        return out
+
+    def _write(self, frames: List[Optional[bytes]]) -> int:
+        """
+        Write frames in order; returns how many leading entries are done
+        (len(frames): all). A frame cut off by a socket error counts as not
+        sent: the bus drops a partial frame with the connection.
+        """
+        buf = memoryview(b"".join(f for f in frames if f))
+        pos = 0
+        try:
+            while pos < len(buf):
+                pos += self._sock.send(buf[pos:])
+        except OSError:
+            pass
+        done = 0
+        for f in frames:
+            n = len(f) if f else 0
+            if n > pos:
+                break
+            pos -= n
+            done += 1
+        return done
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._q and not self._hq and not self._closing:
+                    self._cond.wait()
+                if self._closing and not self._q and not self._hq:
+                    break
+                batch = list(self._hq)
+                batch += self._q
+                self._hq.clear()
+                self._q.clear()
+                self._sending = len(batch)
+
+            while True:
+                if self._ensure():
+                    # codec bağlantıya göre değişebilir: her socket için yeniden encode
+                    done = self._write(self._encode(batch))
+                    self.sent += done
+                    if done == len(batch):
+                        break
+                    # tam yazılan frame'ler tekrar gönderilmez (kontrol event'i iki kez gitmesin);
+                    # kalanlar yeni bağlantıda, yarım kalan frame baştan
+                    batch = batch[done:]
+                    _close(self._sock)
+                    self._sock = None
+                    self.connected = False
+                    continue
+                # bus yok: backoff bekle, bu arada gelenler kuyrukta birikir
+                with self._cond:
+                    if self._closing:
+                        break
+                    self._cond.wait(self._backoff)
+                self._backoff = min(BACKOFF_MAX, self._backoff * 2)
+
+            with self._cond:
+                self._sending = 0
+                self._cond.notify_all()
+
+        _close(self._sock)
+        self._sock = None
+
+
+_pool: Dict[tuple, Publisher] = {}
+_pool_lock = threading.Lock()
+
+
+def get_publisher(sock_path: str = BUS_SOCKET, version: int = 2) -> Publisher:
+    """Process-wide shared publisher for sock_path."""
+    key = (sock_path, version)
+    with _pool_lock:
+        pub = _pool.get(key)
+        if pub is None:
+            pub = _pool[key] = Publisher(sock_path, version)
+        return pub
+
+
+# -----------------------------
+# BusClient (SUB + pooled PUB)
+# -----------------------------
+class BusClient:
+    """
+    Subscription with buffered, non-blocking drain plus the shared publisher.
+
+    recv()/recv_many() hand out already-buffered events first, control events
+    ahead of the rest. If the bus goes
+    away the SUB side reconnects with backoff and re-sends the same topics.
+    fileno() is the current SUB socket; it changes after a reconnect
+    (see `generation`), so select() users should re-register when it does.
+
+    local=True: events published in this process arrive as the original
+    object without touching the socket (the bus skips them for this SUB).
+    Only recv()/recv_many() wait on local events too, so select() users
+    should keep the default.
+    """
+
+    def __init__(self, sock_path: str = BUS_SOCKET, version: int = 2, topics=None,
+                 max_pending: int = 4096, local: bool = False, **opts):
+        self.sock_path = sock_path
+        self.version = version
+        self.topics = list(topics or [])
+        self.opts = opts          # SUB header opsiyonları (queue=, overflow=, coalesce=)
+        self.max_pending = max_pending
+        self.dropped = 0          # okunmadan taşan bulk event'ler (en eskiler)
+        self.closed = False
+        self.generation = 0
+
+        self.pub = get_publisher(sock_path, version)
+        self.sub: Optional[socket.socket] = None
+        self._sub_codec: Optional[str] = None
+        self._dec = LineDecoder()
+        self._pending = deque()
+        self._hi = deque()        # alınmış kontrol event'leri (önce döner)
+        self._backoff = BACKOFF_MIN
+        self._next_try = 0.0
+
+        self.local = local and version >= 2
+        self._inbox = deque()     # local publish → owner thread (_fill'de alınır)
+        self._wake_r = self._wake_w = -1
+        if self.local:
+            self.opts.setdefault("noecho", origin_id())
+            self._wake_r, self._wake_w = os.pipe()
+            os.set_blocking(self._wake_r, False)
+            os.set_blocking(self._wake_w, False)
+            _hub(sock_path).add(self)
+
+        self._reconnect()
+
+    # ---- connection ----
+    def _reconnect(self) -> bool:
+        now = time.monotonic()
+        if now < self._next_try:
+            return False
+        try:
+            self.sub, self._sub_codec, leftover = _connect(
+                self.sock_path, "SUB", self.version, self.topics, **self.opts
+            )
+        except OSError:
+            self.sub = None
+            self._next_try = now + self._backoff
+            self._backoff = min(BACKOFF_MAX, self._backoff * 2)
+            return False
+        self._backoff = BACKOFF_MIN
+        self.generation += 1
+        self._dec = FrameDecoder() if self._sub_codec else LineDecoder()
+        self._feed(leftover)
+        return True
+
+    def _lost(self):
+        _close(self.sub)
+        self.sub = None
+        self._next_try = time.monotonic() + self._backoff
+
+    @property
+    def connected(self) -> bool:
+        return self.sub is not None
+
+    # ---- receive ----
+    def _accept(self, ev):
+        if _is_control(ev):
+            self._hi.append(ev)
+            return
+        if len(self._pending) >= self.max_pending:
+            self._pending.popleft()
+            self.dropped += 1
+        self._pending.append(ev)
+
+    def _feed(self, chunk: bytes):
+        codec = self._sub_codec
+        for item in self._dec.feed(chunk):
+            try:
+                if codec is None:
+                    ev = json.loads(item.decode("utf-8", errors="ignore"))
+                else:
+                    ev = decode_body(item, codec)
+            except Exception:
+                continue
+            self._accept(ev)
+
+    def _deliver_local(self, ev: dict):
+        """Called from the publishing thread (LocalHub.dispatch)."""
+        inbox = self._inbox
+        if len(inbox) >= self.max_pending:
+            self.dropped += 1
+            return
+        inbox.append(ev)
+        if len(inbox) == 1:
+            # owner recv'de bekliyor olabilir: uyandır
+            try:
+                os.write(self._wake_w, b"\0")
+            except (BlockingIOError, OSError):
+                pass
+
+    def _take_local(self):
+        inbox = self._inbox
+        if not inbox:
+            return
+        try:
+            os.read(self._wake_r, 4096)
+        except (BlockingIOError, OSError):
+            pass
+        while inbox:
+            self._accept(inbox.popleft())
+
+    def _wait(self, timeout: Optional[float]) -> bool:
+        """local: socket or wake pipe readable within timeout (True → socket may have data)."""
+        if self._inbox:
+            return True
+        try:
+            r, _, _ = select.select([self.sub, self._wake_r], [], [], timeout)
+        except (OSError, ValueError):
+            return True
+        return bool(r)
+
+    def _fill(self, timeout: Optional[float]):
+        """
+        Wait up to timeout (None: forever) for data, then take everything
+        the socket already has without blocking again.
+        """
+        if self.closed:
+            return
+        if self.local:
+            self._take_local()
+            if self._hi or self._pending:
+                timeout = 0.0
+        if self.sub is None and not self._reconnect():
+            # bağlı değiliz: CPU yakmadan bir sonraki denemeye kadar bekle
+            wait = max(0.0, self._next_try - time.monotonic())
+            if timeout is not None:
+                wait = min(wait, timeout)
+            if wait:
+                if self.local:
+                    select.select([self._wake_r], [], [], wait)
+                    self._take_local()
+                else:
+                    time.sleep(wait)
+            return
+
+        if self.local and timeout != 0.0:
+            self._wait(timeout)
+            self._take_local()
+            timeout = 0.0
+        self.sub.settimeout(timeout)
+        got = 0
+        try:
+            while got < FILL_MAX:
+                chunk = self.sub.recv(65536)
+                if not chunk:
+                    self._lost()
+                    return
+                got += len(chunk)
+                self._feed(chunk)
+                self.sub.settimeout(0.0)
+        except (socket.timeout, BlockingIOError, InterruptedError):
+            pass
+        except (OSError, ValueError):
+            # bağlantı koptu / bozuk frame: yeniden bağlan
+            self._lost()
+
+    def fileno(self) -> int:
+        if self.sub is None:
+            self._reconnect()
+        return self.sub.fileno() if self.sub is not None else -1
+
+    def pending(self) -> int:
+        return len(self._hi) + len(self._pending) + len(self._inbox)
+
+    def recv(self, timeout: Optional[float] = 0.2):
+        """
+        One event, control first. While bulk events are buffered the socket is
+        still peeked (non-blocking), so a control event that just arrived
+        overtakes them.
+        """
+        if not self._hi:
+            self._fill(0.0 if self._pending else timeout)
+        if self._hi:
+            return self._hi.popleft()
+        if not self._pending:
+            return None
+        return self._pending.popleft()
+
+    def recv_many(self, timeout: Optional[float] = 0.2, limit: Optional[int] = None) -> list:
+        """
+        Events available now, control events first (waits up to timeout only
+        if there are none). limit caps the bulk events returned; the rest stay
+        buffered, which bounds how long a later control event waits.
+        """
+        self._fill(0.0 if (self._hi or self._pending) else timeout)
+        out = list(self._hi)
+        self._hi.clear()
+        pending = self._pending
+        if limit is None or len(pending) <= limit:
+            out += pending
+            pending.clear()
+        else:
+            out += [pending.popleft() for _ in range(limit)]
+        return out
+
+    def __iter__(self):
+        """Blocking iterator (survives bus restarts); ends on close()."""
+        while not self.closed:
+            ev = self.recv(timeout=None)
+            if ev is not None:
+                yield ev
+
+    # ---- publish ----
+    def publish(self, ev: dict):
+        self.pub.publish(ev)
+
+    def publish_many(self, evs: Iterable[dict]):
+        self.pub.publish_many(evs)
+
+    def close(self):
+        self.closed = True
+        _close(self.sub)
+        self.sub = None
+        if self.local:
+            _hub(self.sock_path).remove(self)
+            for fd in (self._wake_r, self._wake_w):
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+            self._wake_r = self._wake_w = -1
@@ -4,6 +4,12 @@ ROOT_DIR = Path(__file__).resolve().parent
 
 # IPC
 BUS_SOCKET = "/tmp/robi_bus.sock"
+JOURNAL_DIR = "/tmp/robi_journal"   # robi_journal.py segmentleri
+BRIDGE_TCP_PORT = 7700              # robi_bridge.py (ESP32 / ikinci Pi)
+BRIDGE_UDP_PORT = 7701              # robi_bridge.py hafif UDP modu (ESP8266)
+STATEBOARD_PATH = "/dev/shm/robi_board"   # robi_stateboard.py telemetri slot'ları
+MIC_RING_PATH = "/dev/shm/robi_mic"       # robi_mic.py PCM ring (tek capture owner)
+MODELS_SOCKET = "/tmp/robi_models.sock"   # robi_models.py Vosk model server
 
 # Models
 MODELS_DIR = ROOT_DIR / "models"
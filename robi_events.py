@@ -1,5 +1,25 @@
+"""
+robi_events.py
+Event schema registry: typed, slots-based event classes compiled per type.
+
+Bus'ta iki şekil dolaşıyor:
+  flat (legacy):  {"type": "UTTERANCE", "text": "...", "confidence": 0.8, "ts": ...}
+  envelope:       {"type": "speech.heard", "source": "audio", "payload": {"text": ...}, "ts": ...}
+
+register() her tip için __slots__'lu bir sınıf derler; decode() ikisini de
+ingress'te bir kez doğrular ve aynı typed nesneye çevirir (alias'lar dahil),
+hot loop'lar dict .get() yerine attribute okur. to_dict() legacy flat şekli
+üretir (mevcut tüketiciler aynen okur), to_envelope() make_event şeklini.
+
+    ev = decode(raw)                 # None: bilinmeyen / geçersiz (stats'ta sayılır)
+    if ev.__class__ is Utterance:
+        handle(ev.text)
+    bus.publish(Listen(mode="once").to_dict())
+"""
+
 import time
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Tuple
+
 
 def make_event(
     type: str,
@@ -13,3 +33,238 @@ def make_event(
         "payload": payload or {},
         "ts": ts if ts is not None else time.time(),
     }
+
+
+# -----------------------------
+# Registry
+# -----------------------------
+class SchemaError(ValueError):
+    pass
+
+
+class EventBase:
+    """Common part of every compiled event class."""
+
+    __slots__ = ("ts", "source", "retained")
+    type: str = ""
+    fields: Tuple[str, ...] = ()
+
+    def __repr__(self):
+        args = ", ".join(f"{f}={getattr(self, f)!r}" for f in self.fields)
+        return f"{self.__class__.__name__}({args})"
+
+    def __eq__(self, other):
+        return (
+            other.__class__ is self.__class__
+            and all(getattr(self, f) == getattr(other, f) for f in self.fields + ("ts", "source"))
+        )
+
+    def to_envelope(self) -> Dict[str, Any]:
+        return make_event(self.type, self.source or "", {f: getattr(self, f) for f in self.fields}, self.ts)
+
+
+REGISTRY: Dict[str, type] = {}          # type / alias → sınıf
+stats = {"decoded": 0, "unknown": 0, "invalid": 0}
+
+_MISSING = object()
+
+# float alanlar int de kabul eder (JSON 1 vs 1.0); bool hiçbir sayı alanına girmez.
+# object: tip kontrolü yok (id gibi int/str olabilen alanlar)
+_CHECKS = {
+    object: None,
+    str: "v.__class__ is not str",
+    int: "v.__class__ is not int",
+    float: "v.__class__ is not float and v.__class__ is not int and not isinstance(v, float)",
+    bool: "v.__class__ is not bool",
+    list: "v.__class__ is not list",
+    dict: "v.__class__ is not dict",
+}
+
+
+def _class_name(type_name: str) -> str:
+    parts = type_name.replace(".", "_").split("_")
+    return "".join(p[:1].upper() + p[1:].lower() for p in parts if p)
+
+
+def register(type_name: str, aliases=(), **fields):
+    """
+    fields: name=(pytype, default). default _MISSING → zorunlu alan.
+    pytype one of object/str/int/float/bool/list/dict; None değeri her alanda geçerli.
+    Returns the compiled class (also stored in REGISTRY under type and aliases).
+    """
+    names = tuple(fields)
+    for name, (pytype, _) in fields.items():
+        if pytype not in _CHECKS:
+            raise TypeError(f"{type_name}.{name}: unsupported field type {pytype!r}")
+        if name in ("type", "ts", "source", "payload", "retained"):
+            raise TypeError(f"{type_name}.{name}: reserved field name")
+
+    ns: Dict[str, Any] = {"_M": _MISSING, "SchemaError": SchemaError, "time": time.time}
+    defaults = {f"_d_{n}": d for n, (_, d) in fields.items()}
+    ns.update(defaults)
+
+    # __init__ (güvenilen iç kullanım: doğrulama yok)
+    params = ", ".join(f"{n}=_d_{n}" if d is not _MISSING else n for n, (_, d) in fields.items())
+    sig = ", ".join(p for p in (params, "ts=None", "source=None", "retained=False") if p)
+    body = [f"    self.{n} = {n}" for n in names]
+    body += ["    self.ts = time() if ts is None else ts",
+             "    self.source = source",
+             "    self.retained = retained"]
+    src = [f"def __init__(self, {sig}):"] + body
+
+    # to_dict: legacy flat şekil
+    src += ["def to_dict(self):",
+            f"    d = {{'type': {type_name!r}, 'ts': self.ts}}",
+            "    if self.source is not None:",
+            "        d['source'] = self.source"]
+    src += [f"    d[{n!r}] = self.{n}" for n in names]
+    src += ["    return d"]
+
+    # decode: flat + envelope ("payload" içindekiler), doğrulamalı
+    src += ["def decode(d):",
+            "    p = d.get('payload')",
+            "    if p.__class__ is not dict:",
+            "        p = None",
+            "    try:",
+            "        ts = float(d.get('ts') or 0.0) or time()",
+            "    except (TypeError, ValueError):",
+            "        raise SchemaError('ts')"]
+    args = []
+    for n, (pytype, default) in fields.items():
+        src += [f"    v = d.get({n!r}, _M)",
+                "    if v is _M and p is not None:",
+                f"        v = p.get({n!r}, _M)",
+                "    if v is _M:"]
+        if default is _MISSING:
+            src += [f"        raise SchemaError({type_name + ': missing ' + n!r})"]
+        else:
+            src += [f"        v = _d_{n}"]
+        if _CHECKS[pytype] is not None:
+            src += [f"    elif v is not None and {_CHECKS[pytype]}:",
+                    f"        raise SchemaError({type_name + ': bad ' + n!r})"]
+        if pytype is float:
+            src += ["    elif v is not None and v.__class__ is not float:",
+                    "        v = float(v)"]
+        src += [f"    _{n} = v"]
+        args.append(f"_{n}")
+    args += ["ts", "d.get('source')", "d.get('_retained') is True"]
+    src += [f"    return cls({', '.join(args)})"]
+
+    cls = type(_class_name(type_name), (EventBase,), {"__slots__": names, "type": type_name, "fields": names})
+    ns["cls"] = cls
+    exec("\n".join(src), ns)
+    cls.__init__ = ns["__init__"]
+    cls.to_dict = ns["to_dict"]
+    cls.decode = staticmethod(ns["decode"])
+
+    for t in (type_name,) + tuple(aliases):
+        REGISTRY[t] = cls
+    return cls
+
+
+def decode(ev: Any, strict: bool = False) -> Optional[EventBase]:
+    """
+    Bus dict → typed event (legacy flat, envelope or alias). Unknown types and
+    invalid events return None (strict: raise SchemaError) and are counted.
+    """
+    if ev.__class__ is not dict:
+        stats["invalid"] += 1
+        if strict:
+            raise SchemaError("event is not a dict")
+        return None
+    cls = REGISTRY.get(ev.get("type"))
+    if cls is None:
+        stats["unknown"] += 1
+        if strict:
+            raise SchemaError(f"unknown event type {ev.get('type')!r}")
+        return None
+    try:
+        out = cls.decode(ev)
+    except SchemaError:
+        stats["invalid"] += 1
+        if strict:
+            raise
+        return None
+    stats["decoded"] += 1
+    return out
+
+
+def encode(ev: EventBase) -> Dict[str, Any]:
+    return ev.to_dict()
+
+
+# -----------------------------
+# Schemas
+# -----------------------------
+# audio
+Wake = register("WAKE", heard=(str, ""), confidence=(float, None))
+Utterance = register("UTTERANCE", aliases=("speech.heard",),
+                     text=(str, ""), confidence=(float, None), words=(list, None), lang=(str, None),
+                     endpoint_ms=(float, None))
+UtterancePartial = register("UTTERANCE_PARTIAL", text=(str, ""))
+Timeout = register("TIMEOUT")
+# brain → audio
+Listen = register("LISTEN", mode=(str, None))
+Done = register("DONE")
+# speech
+TtsStart = register("TTS_START")
+TtsEnd = register("TTS_END", reason=(str, None))
+# perception
+PersonDetected = register("PERSON_DETECTED", id=(object, None))
+UnknownFace = register("UNKNOWN_FACE")
+UnknownPerson = register("UNKNOWN_PERSON", id=(object, None))
+FaceConfirmed = register("FACE_CONFIRMED", name=(str, None), hits=(int, None), confidence=(float, None))
+# brain
+CoreState = register("core.state", state=(str, None))
+
+
+# -----------------------------
+# Bench: typed decode vs dict .get()
+# -----------------------------
+def _bench(n: int = 200000):
+    raw = [
+        {"type": "UTTERANCE", "text": "merhaba", "confidence": 0.9, "words": [], "ts": time.time()},
+        {"type": "speech.heard", "source": "audio", "payload": {"text": "merhaba", "lang": "tr"}, "ts": time.time()},
+        {"type": "WAKE", "heard": "robi", "confidence": 1, "ts": time.time()},
+    ]
+
+    def dict_path(ev):
+        typ = ev.get("type")
+        if typ == "speech.heard":
+            return (ev.get("payload") or {}).get("text", "")
+        if typ == "UTTERANCE":
+            return ev.get("text", "")
+        if typ == "WAKE":
+            return ev.get("heard")
+
+    def typed_path(ev):
+        cls = ev.__class__
+        if cls is Utterance:
+            return ev.text
+        if cls is Wake:
+            return ev.heard
+
+    t0 = time.perf_counter()
+    for i in range(n):
+        dict_path(raw[i % 3])
+    t_dict = (time.perf_counter() - t0) / n
+    t0 = time.perf_counter()
+    for i in range(n):
+        decode(raw[i % 3])
+    t_dec = (time.perf_counter() - t0) / n
+    typed = [decode(r) for r in raw]
+    t0 = time.perf_counter()
+    for i in range(n):
+        typed_path(typed[i % 3])
+    t_typed = (time.perf_counter() - t0) / n
+    t0 = time.perf_counter()
+    for i in range(n):
+        typed[i % 3].to_dict()
+    t_enc = (time.perf_counter() - t0) / n
+    print(f"[EVENTS][BENCH] dict .get() dispatch {t_dict * 1e6:.2f} us | "
+          f"decode once {t_dec * 1e6:.2f} us, typed dispatch {t_typed * 1e6:.2f} us | "
+          f"to_dict {t_enc * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    _bench()
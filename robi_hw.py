@@ -9,6 +9,8 @@ from luma.core.interface.serial import spi, noop
 from luma.led_matrix.device import max7219
 from PIL import Image
 
+from robi_stateboard import slot_writer
+
 GPIO_ENABLED = True
 
 # ------------------------------
@@ -75,6 +77,7 @@ FACE_LISTENING = [
 
 current_state = "idle"
 anim_stop = False
+_face_slot = slot_writer("hw.face")   # aktif animasyon (state board)
 
 # ------------------------------
 # ANIMATIONS
@@ -218,6 +221,7 @@ def set_face(state):
 
     current_state = state
     anim_stop = False
+    _face_slot.write(state.encode())
     threading.Thread(target=_run_animation, args=(state,), daemon=True).start()
 
 
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+robi_journal.py
+Bus'tan beslenen, append-only event journal (/tmp/robi_events.jsonl yerine).
+
+- Tek, uzun ömürlü writer (bus'a "*" abone)
+- Segment rotation: boyut / yaş limiti, en eski segmentler silinir
+- Segment başına seyrek timestamp index (.idx) → zamana göre hızlı seek
+- Tail reader inotify ile uyanır (yoksa kısa poll'a düşer)
+
+Segment: <dir>/robi-<start_ms>.jsonl, her satır bir event (+ "_ts" journal zamanı)
+Index:   <dir>/robi-<start_ms>.idx, kayıt başına 16 byte: (max_ts float64, offset uint64)
+         max_ts = offset'ten önceki event'lerin en büyük "_ts"'i (read() ile aynı alan;
+         producer saati geri/ileri gitse de monoton). Segment kapanırken son kayıt
+         (max_ts, size) yazılır.
+
+Run:
+  python3 robi_journal.py                 # writer
+  python3 robi_journal.py --tail          # yeni event'leri yazdır
+  python3 robi_journal.py --since -60     # son 60 saniye
+"""
+
+from __future__ import annotations
+
+import argparse
+import bisect
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import time
+from typing import Iterator, List, Optional
+
+from robi_client import BusClient
+from robi_constants import BUS_SOCKET, JOURNAL_DIR
+
+SEGMENT_MAX_BYTES = 8 * 1024 * 1024
+SEGMENT_MAX_AGE = 3600.0
+MAX_SEGMENTS = 24
+INDEX_EVERY_BYTES = 16 * 1024
+
+_IDX = struct.Struct("<dQ")
+
+
+def _segment_start(name: str) -> Optional[int]:
+    if not (name.startswith("robi-") and name.endswith(".jsonl")):
+        return None
+    try:
+        return int(name[5:-6])
+    except ValueError:
+        return None
+
+
+def list_segments(path: str) -> List[str]:
+    """Segment dosyaları, eskiden yeniye."""
+    try:
+        names = os.listdir(path)
+    except FileNotFoundError:
+        return []
+    segs = sorted((s, n) for n in names if (s := _segment_start(n)) is not None)
+    return [os.path.join(path, n) for _, n in segs]
+
+
+def _index_path(seg: str) -> str:
+    return seg[:-6] + ".idx"
+
+
+# -----------------------------
+# Writer
+# -----------------------------
+class JournalWriter:
+    def __init__(
+        self,
+        path: str = JOURNAL_DIR,
+        max_bytes: int = SEGMENT_MAX_BYTES,
+        max_age: float = SEGMENT_MAX_AGE,
+        max_segments: int = MAX_SEGMENTS,
+        index_every: int = INDEX_EVERY_BYTES,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.max_segments = max_segments
+        self.index_every = index_every
+
+        self._f = None
+        self._idx = None
+        self._opened_at = 0.0
+        self._size = 0
+        self._last_indexed = -index_every
+        self._max_ts = 0.0
+
+        os.makedirs(path, exist_ok=True)
+
+    def _open(self, ts: float):
+        self.close()
+        seg = os.path.join(self.path, f"robi-{int(ts * 1000)}.jsonl")
+        self._f = open(seg, "ab")
+        self._idx = open(_index_path(seg), "ab")
+        self._opened_at = ts
+        self._size = self._f.tell()
+        self._last_indexed = -self.index_every
+        # var olan segmente ekleniyorsa önceki _ts'ler bilinmiyor: o kısım hiç atlanmasın
+        self._max_ts = 0.0 if self._size == 0 else float("inf")
+        self._prune()
+
+    def _prune(self):
+        segs = list_segments(self.path)
+        for seg in segs[:-self.max_segments] if len(segs) > self.max_segments else []:
+            for p in (seg, _index_path(seg)):
+                try:
+                    os.remove(p)
+                except FileNotFoundError:
+                    pass
+
+    def write(self, ev: dict, ts: Optional[float] = None):
+        ts = time.time() if ts is None else ts
+        if (
+            self._f is None
+            or self._size >= self.max_bytes
+            or ts - self._opened_at >= self.max_age
+        ):
+            self._open(ts)
+
+        if "_ts" not in ev:
+            ev = dict(ev, _ts=ts)
+        line = (json.dumps(ev, ensure_ascii=False) + "\n").encode("utf-8")
+
+        if self._size - self._last_indexed >= self.index_every:
+            self._idx.write(_IDX.pack(self._max_ts, self._size))
+            self._last_indexed = self._size
+
+        self._f.write(line)
+        self._size += len(line)
+        ets = ev["_ts"]
+        if isinstance(ets, (int, float)) and ets > self._max_ts:
+            self._max_ts = float(ets)
+
+    def flush(self):
+        if self._f is not None:
+            self._f.flush()
+            self._idx.flush()
+
+    def close(self):
+        if self._idx is not None and self._size > self._last_indexed:
+            try:
+                self._idx.write(_IDX.pack(self._max_ts, self._size))
+            except Exception:
+                pass
+        for f in (self._f, self._idx):
+            if f is not None:
+                try:
+                    f.close()
+                except Exception:
+                    pass
+        self._f = self._idx = None
+
+
+# -----------------------------
+# Change notification (inotify, poll fallback)
+# -----------------------------
+IN_MODIFY = 0x002
+IN_CREATE = 0x100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+
+class _Inotify:
+    def __init__(self, path: str):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, path.encode(), IN_MODIFY | IN_CREATE) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+
+    def wait(self, timeout: float):
+        r, _, _ = select.select([self.fd], [], [], timeout)
+        if r:
+            try:
+                while os.read(self.fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _Poll:
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+
+    def wait(self, timeout: float):
+        time.sleep(min(timeout, self.interval))
+
+    def close(self):
+        pass
+
+
+# -----------------------------
+# Reader
+# -----------------------------
+class JournalReader:
+    def __init__(self, path: str = JOURNAL_DIR):
+        self.path = path
+
+    def _seek_offset(self, seg: str, ts: float) -> int:
+        """Öncesindeki tüm event'ler _ts < ts olan son index kaydının offset'i (yoksa 0)."""
+        try:
+            with open(_index_path(seg), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return 0
+        n = len(data) // _IDX.size
+        stamps = [_IDX.unpack_from(data, i * _IDX.size)[0] for i in range(n)]
+        i = bisect.bisect_left(stamps, ts) - 1
+        return _IDX.unpack_from(data, i * _IDX.size)[1] if i >= 0 else 0
+
+    @staticmethod
+    def _lines(f) -> Iterator[dict]:
+        for line in f:
+            if not line.endswith(b"\n"):
+                # yarım satır (writer henüz yazıyor) → sonraki okumada
+                f.seek(-len(line), os.SEEK_CUR)
+                return
+            try:
+                yield json.loads(line)
+            except Exception:
+                continue
+
+    def read(self, since: float = 0.0) -> Iterator[dict]:
+        """Journal'daki _ts >= since olan event'ler (tarihsel, bloklamaz)."""
+        # segment adı writer saatidir, _ts producer'ın: her segment kendi index'iyle atlanır
+        for seg in list_segments(self.path):
+            with open(seg, "rb") as f:
+                if since:
+                    f.seek(self._seek_offset(seg, since))
+                for ev in self._lines(f):
+                    ts = ev.get("_ts", 0.0) if isinstance(ev, dict) else None
+                    # sayısal olmayan _ts (bozuk producer) index'e de girmez: atlanır
+                    if isinstance(ts, (int, float)) and ts >= since:
+                        yield ev
+
+    def tail(self, from_start: bool = False, idle_timeout: Optional[float] = None) -> Iterator[dict]:
+        """
+        Follow the newest segment (and any segment created later).
+        Wakes on inotify instead of a sleep loop. idle_timeout ends the
+        iterator after that many seconds without new data.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        try:
+            waiter = _Inotify(self.path)
+        except (OSError, AttributeError):
+            waiter = _Poll()
+
+        f = None
+        seg = None
+        try:
+            idle_since = time.monotonic()
+            while True:
+                segs = list_segments(self.path)
+                if segs and segs[-1] != seg:
+                    if f is not None:
+                        # eski segmentin kalanını bitir
+                        yield from self._lines(f)
+                        f.close()
+                    opening_first = seg is None
+                    seg = segs[-1]
+                    f = open(seg, "rb")
+                    if opening_first and not from_start:
+                        f.seek(0, os.SEEK_END)
+
+                got = False
+                if f is not None:
+                    for ev in self._lines(f):
+                        got = True
+                        yield ev
+                if got:
+                    idle_since = time.monotonic()
+                    continue
+
+                if idle_timeout is not None and time.monotonic() - idle_since >= idle_timeout:
+                    return
+                waiter.wait(1.0 if idle_timeout is None else min(1.0, idle_timeout))
+        finally:
+            if f is not None:
+                f.close()
+            waiter.close()
+
+
+# -----------------------------
+# Bus → journal
+# -----------------------------
+def run_writer(path: str, sock_path: str):
+    w = JournalWriter(path)
+    # journal her event'i bir kez kaydeder: coalescing kuralları ve retained replay uygulanmasın
+    bus = BusClient(sock_path, topics=["*"], coalesce="off", retain="off")
+    print(f"[JOURNAL] 📝 ROBI Journal online: {path}")
+    try:
+        while True:
+            evs = bus.recv_many(timeout=1.0)
+            if not evs:
+                continue
+            now = time.time()
+            for ev in evs:
+                if isinstance(ev, dict):
+                    w.write(ev, now)
+            w.flush()
+    finally:
+        w.close()
+        print("[JOURNAL] 📝 ROBI Journal offline")
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="ROBI event journal")
+    ap.add_argument("--dir", default=JOURNAL_DIR, help="journal directory")
+    ap.add_argument("--socket", default=BUS_SOCKET, help="bus socket path")
+    ap.add_argument("--tail", action="store_true", help="follow new events and print them")
+    ap.add_argument("--since", type=float, default=None,
+                    help="print events since unix ts (negative: seconds ago)")
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        if args.since is not None:
+            since = time.time() + args.since if args.since < 0 else args.since
+            for ev in JournalReader(args.dir).read(since):
+                print(json.dumps(ev, ensure_ascii=False))
+            return
+        if args.tail:
+            for ev in JournalReader(args.dir).tail():
+                print(json.dumps(ev, ensure_ascii=False), flush=True)
+            return
+        run_writer(args.dir, args.socket)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+robi_mic.py
+Single mic capture owner + shared-memory PCM ring under /dev/shm.
+
+Cihazı tek bir process (bu script) açar: arecord'dan gelen 16 kHz S16_LE
+frame'leri doğrudan ring'e readinto() eder. robi_audio, robi_wake ve
+robi_perception kendi arecord'larını açmak yerine ring'e bağlanır; her
+okuyucu kendi pozisyonunda, kopyasız (read-only memoryview) okur.
+TTS sırasında cihaz bırakılmaz: mic lock'u gören okuyucu frame'leri atar.
+
+Layout (little-endian):
+  header  64 B   magic "RMIC", version, rate, channels, frame_bytes, nframes
+                 @24: head u64 (yazılan frame sayısı) | last ts f64 | writer pid i32
+  slot    nframes × (seq u64 | ts f64 | pcm frame_bytes)
+
+Yazar slot seq'ini 0 yapar → pcm + ts → seq = frame no + 1 → head'i ilerletir.
+Okuyan slot seq'i kendi pozisyonuyla eşleşmiyorsa geride kalmıştır (overrun):
+ring'in sonuna atlar ve atladığı frame'leri `dropped`'a sayar.
+
+Kullanım:
+  python3 robi_mic.py --device plughw:CARD=sndrpigooglevoi,DEV=0   # capture owner
+  python3 robi_mic.py --watch                                     # okuyucu olarak izle
+  python3 robi_mic.py --source file:test.wav --loop                # HAT yok: dosyadan besle
+
+  r = attach()                    # MicReader (capture owner'ı bekler)
+  pcm = r.read(timeout=0.1)       # memoryview (kopyasız) ya da None
+  pcm = r.read_bytes(timeout=0.1) # tampona koyacaksan: kopya, overrun kontrollü
+"""
+
+from __future__ import annotations
+
+import argparse
+import mmap
+import os
+import struct
+import subprocess
+import time
+from typing import Optional
+
+from robi_constants import MIC_RING_PATH
+
+MAGIC = b"RMIC"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIII")      # magic, version, rate, channels, frame_bytes, nframes
+_HEAD = struct.Struct("<Qdi")           # head, last ts, writer pid
+HEAD_OFF = 24
+HEADER_SIZE = 64
+SLOT_HDR = struct.Struct("<Qd")         # seq (frame no + 1, 0: yazılıyor), ts
+_SEQ = struct.Struct("<Q")
+
+DEFAULT_DEVICE = "plughw:CARD=sndrpigooglevoi,DEV=0"
+DEFAULT_SECONDS = 4.0
+STALE_SEC = 1.0     # bu kadar yeni frame yoksa capture owner ölü/yeniden başlıyor sayılır
+
+
+class MicRingError(Exception):
+    pass
+
+
+def _layout(rate: int, channels: int, frame_ms: int, seconds: float):
+    frame_bytes = int(rate * frame_ms / 1000) * 2 * channels
+    nframes = max(8, int(seconds * 1000 / frame_ms))
+    return frame_bytes, nframes
+
+
+# -----------------------------
+# Write side (capture owner)
+# -----------------------------
+class MicWriter:
+    """The only writer of the ring. Frames are committed in order."""
+
+    def __init__(self, path: str = MIC_RING_PATH, rate: int = 16000, channels: int = 1,
+                 frame_ms: int = 20, seconds: float = DEFAULT_SECONDS):
+        self.path = path
+        self.rate = rate
+        self.frame_bytes, self.nframes = _layout(rate, channels, frame_ms, seconds)
+        self.slot_size = SLOT_HDR.size + self.frame_bytes
+        size = HEADER_SIZE + self.nframes * self.slot_size
+        want = HEADER.pack(MAGIC, VERSION, rate, channels, self.frame_bytes, self.nframes)
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            if os.fstat(fd).st_size != size or os.pread(fd, HEADER.size, 0) != want:
+                # layout değişti: yeni inode, eski okuyucular STALE_SEC sonra yeniden bağlanır
+                os.close(fd)
+                os.unlink(path)
+                fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o666)
+                os.ftruncate(fd, size)
+                os.pwrite(fd, want, 0)
+            self.mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        # aynı layout: head kaldığı yerden devam eder (okuyucuların pozisyonu geçerli kalır)
+        self.head = _HEAD.unpack_from(self.mm, HEAD_OFF)[0]
+        self._mv = memoryview(self.mm)
+
+    def _slot(self, n: int) -> int:
+        return HEADER_SIZE + (n % self.nframes) * self.slot_size
+
+    def begin(self) -> memoryview:
+        """Writable view of the next frame's pcm (fill it, then commit())."""
+        off = self._slot(self.head)
+        _SEQ.pack_into(self.mm, off, 0)
+        p = off + SLOT_HDR.size
+        return self._mv[p:p + self.frame_bytes]
+
+    def commit(self, ts: Optional[float] = None):
+        ts = time.time() if ts is None else ts
+        n = self.head
+        SLOT_HDR.pack_into(self.mm, self._slot(n), n + 1, ts)
+        self.head = n + 1
+        _HEAD.pack_into(self.mm, HEAD_OFF, self.head, ts, os.getpid())
+
+    def write(self, pcm, ts: Optional[float] = None):
+        self.begin()[:] = pcm
+        self.commit(ts)
+
+    def close(self):
+        self._mv.release()
+        self.mm.close()
+
+
+def read_full(f, view: memoryview) -> bool:
+    """readinto until the view is full (pipe reads can be short). False: EOF."""
+    got = 0
+    n = len(view)
+    while got < n:
+        k = f.readinto(view[got:])
+        if not k:
+            return False
+        got += k
+    return True
+
+
+def capture(writer: MicWriter, device: str, channels: int = 1, debug: bool = False):
+    """arecord → ring, forever. arecord ölürse (cihaz hatası) yeniden açılır."""
+    cmd = [
+        "arecord",
+        "-D", device,
+        "-f", "S16_LE",
+        "-r", str(writer.rate),
+        "-c", str(channels),
+        "-t", "raw",
+        "--buffer-size=32768",
+    ]
+    if debug:
+        print("[MIC] 🎙️ arecord:", " ".join(cmd))
+    while True:
+        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0)
+        try:
+            while read_full(p.stdout, writer.begin()):
+                writer.commit()
+        finally:
+            try:
+                p.terminate()
+                p.wait(timeout=1.0)
+            except Exception:
+                pass
+        print(f"[MIC] ⚠️ arecord exited (rc={p.returncode}), restarting")
+        time.sleep(1.0)
+
+
+def feed(writer: MicWriter, src):
+    """robi_sources.AudioSource → ring (HAT'siz makinede dosya / sentetik ses ile test)."""
+    while True:
+        if src.readinto(writer.begin(), timeout=1.0):
+            writer.commit(src.ts)
+        elif src.eof:
+            return
+
+
+# -----------------------------
+# Read side (consumers)
+# -----------------------------
+class MicReader:
+    """
+    One consumer's cursor into the ring (read-only mapping). Starts at the
+    live edge. Not thread-safe; every consumer thread attaches its own reader.
+    """
+
+    def __init__(self, path: str = MIC_RING_PATH):
+        self.path = path
+        self.dropped = 0        # overrun ile atlanan frame'ler
+        self.seq = -1           # son okunan frame numarası
+        self.ts = 0.0           # son okunan frame'in capture zamanı
+        self._open()
+
+    def _open(self):
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            st = os.fstat(fd)
+            if st.st_size < HEADER_SIZE:
+                raise MicRingError(f"{self.path}: not a mic ring")
+            mm = mmap.mmap(fd, st.st_size, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        magic, version, self.rate, self.channels, self.frame_bytes, self.nframes = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION:
+            mm.close()
+            raise MicRingError(f"{self.path}: not a v{VERSION} mic ring")
+        self.ino = st.st_ino
+        self.mm = mm
+        self._mv = memoryview(mm)
+        self.slot_size = SLOT_HDR.size + self.frame_bytes
+        self.period = self.frame_bytes / (2 * self.channels * self.rate)
+        self.pos = _HEAD.unpack_from(mm, HEAD_OFF)[0]
+        self._progress = time.time()
+
+    def _reopen_if_replaced(self):
+        try:
+            replaced = os.stat(self.path).st_ino != self.ino
+        except OSError:
+            return
+        if replaced:
+            print("[MIC] ♻️ ring replaced by a new capture owner, reattaching")
+            self.close()
+            self._open()
+
+    def _slot(self, n: int) -> int:
+        return HEADER_SIZE + (n % self.nframes) * self.slot_size
+
+    def pending(self) -> int:
+        return _HEAD.unpack_from(self.mm, HEAD_OFF)[0] - self.pos
+
+    def alive(self, max_age: float = STALE_SEC) -> bool:
+        return time.time() - _HEAD.unpack_from(self.mm, HEAD_OFF)[1] < max_age
+
+    def skip(self):
+        """Jump to the live edge (frames in between are discarded, not counted as dropped)."""
+        self.pos = _HEAD.unpack_from(self.mm, HEAD_OFF)[0]
+
+    def read(self, timeout: Optional[float] = None) -> Optional[memoryview]:
+        """
+        Next frame as a read-only view into the ring (no copy), or None on
+        timeout. The view stays valid until the writer laps it (~seconds);
+        use valid() / read_bytes() if the frame is kept longer.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            mm = self.mm
+            head, last_ts, _ = _HEAD.unpack_from(mm, HEAD_OFF)
+            pos = self.pos
+            if head > pos:
+                if head - pos >= self.nframes:
+                    # overrun: yazar bizi geçti, ring'in güvenli kısmına atla
+                    new = head - self.nframes + 1 + self.nframes // 8
+                    self.dropped += new - pos
+                    self.pos = pos = new
+                off = self._slot(pos)
+                seq, ts = SLOT_HDR.unpack_from(mm, off)
+                if seq != pos + 1:
+                    # okurken üzerine yazıldı: overrun gibi davran
+                    self.pos = pos + 1
+                    self.dropped += 1
+                    continue
+                self.seq = pos
+                self.ts = ts
+                self.pos = pos + 1
+                self._progress = time.time()
+                p = off + SLOT_HDR.size
+                return self._mv[p:p + self.frame_bytes]
+
+            now = time.time()
+            if now - self._progress > STALE_SEC:
+                self._reopen_if_replaced()
+                self._progress = now
+            if deadline is not None:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return None
+            else:
+                left = self.period
+            # sıradaki frame'in beklenen zamanına kadar uyu
+            time.sleep(min(left, max(0.001, last_ts + self.period - now)))
+
+    def valid(self) -> bool:
+        """The last frame returned by read() has not been overwritten yet."""
+        return _SEQ.unpack_from(self.mm, self._slot(self.seq))[0] == self.seq + 1
+
+    def read_bytes(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        while True:
+            view = self.read(timeout)
+            if view is None:
+                return None
+            data = bytes(view)
+            if self.valid():
+                return data
+            self.dropped += 1
+
+    def close(self):
+        self._mv.release()
+        try:
+            self.mm.close()
+        except BufferError:
+            pass    # tüketici hâlâ bir frame view'ı tutuyor: mapping GC ile kapanır
+
+
+def attach(path: str = MIC_RING_PATH, timeout: float = 10.0) -> MicReader:
+    """MicReader, waiting up to timeout for the capture owner to create the ring."""
+    deadline = time.monotonic() + timeout
+    warned = False
+    while True:
+        try:
+            return MicReader(path)
+        except (OSError, MicRingError) as e:
+            if time.monotonic() >= deadline:
+                raise MicRingError(f"mic ring unavailable ({e}); is robi_mic.py running?") from e
+            if not warned:
+                print(f"[MIC] ⏳ waiting for capture owner ({path})")
+                warned = True
+            time.sleep(0.2)
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def watch(path: str, every: float = 1.0):
+    r = attach(path)
+    print(f"[MIC] 👂 {path}: {r.rate} Hz, {r.frame_bytes} B/frame, {r.nframes} frames "
+          f"({r.nframes * r.period:.1f} s)")
+    n = 0
+    peak = 0
+    t0 = time.time()
+    while True:
+        view = r.read(timeout=1.0)
+        if view is None:
+            print("[MIC] ⚠️ no frames (capture owner down?)")
+            continue
+        n += 1
+        s = view.cast("h")
+        peak = max(peak, max(s), -min(s))
+        s.release()
+        now = time.time()
+        if now - t0 >= every:
+            print(f"[MIC] fps={n / (now - t0):5.1f} lag={(now - r.ts) * 1000:5.1f} ms "
+                  f"peak={peak / 32768.0:.3f} pending={r.pending()} dropped={r.dropped}")
+            n = 0
+            peak = 0
+            t0 = now
+
+
+def main():
+    ap = argparse.ArgumentParser(description="ROBI mic capture owner (shared-memory PCM ring)")
+    ap.add_argument("--device", default=DEFAULT_DEVICE, help="arecord -D device")
+    ap.add_argument("--source", default=None,
+                    help="robi_sources spec instead of arecord, replayed in real time (file:test.wav, synth:noise ...)")
+    ap.add_argument("--loop", action="store_true", help="loop --source files")
+    ap.add_argument("--path", default=MIC_RING_PATH)
+    ap.add_argument("--rate", type=int, default=16000)
+    ap.add_argument("--frame-ms", type=int, default=20, choices=[10, 20, 30])
+    ap.add_argument("--seconds", type=float, default=DEFAULT_SECONDS, help="ring kapasitesi")
+    ap.add_argument("--watch", action="store_true", help="capture yapma, ring'i okuyucu olarak izle")
+    ap.add_argument("--debug", action="store_true")
+    args = ap.parse_args()
+
+    try:
+        if args.watch:
+            watch(args.path)
+            return
+        w = MicWriter(args.path, rate=args.rate, frame_ms=args.frame_ms, seconds=args.seconds)
+        print(f"[MIC] 🎙️ ROBI Mic online: {args.source or args.device} -> {args.path} "
+              f"({w.nframes} × {w.frame_bytes} B, {args.seconds:.1f} s)")
+        if args.source:
+            from robi_sources import AudioSourceError, open_source
+            try:
+                src = open_source(args.source, args.rate, args.frame_ms, loop=args.loop)
+            except AudioSourceError as e:
+                raise MicRingError(str(e)) from e
+            with src:
+                feed(w, src)
+            return
+        capture(w, args.device, debug=args.debug)
+    except KeyboardInterrupt:
+        pass
+    except (OSError, MicRingError) as e:
+        print("[MIC][ERR]", e)
+        raise SystemExit(1)
+    finally:
+        print("[MIC] 🎙️ ROBI Mic offline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+robi_models.py
+Shared Vosk model server: every model is loaded once, clients get recognizer
+sessions over a local Unix socket.
+
+robi_audio (wake + STT worker) ve robi_wake her biri modeli kendisi yüklerse
+her process saniyeler ve yüzlerce MB harcıyor. Bu servis modelleri bir kez
+yükler; her bağlantı = bir KaldiRecognizer session'ı (grammar ya da serbest).
+Session'lar ayrı thread'lerde çalışır (vosk decode sırasında GIL'i bırakır →
+Pi'nin diğer çekirdekleri).
+
+Protokol (bağlantı başına):
+  client → server: JSON satırı  {"op": "session", "model": "<path>", "rate": 16000, "grammar": [...] | null}
+                                {"op": "load", "model": "<path>"}   (sadece yükle / kontrol et)
+                                {"op": "stats"}
+  server → client: "OK\\n" | "ERR <mesaj>\\n"   (stats: JSON satırı)
+  sonra session istekleri: 1 byte op | 4 byte big-endian uzunluk | payload
+      A pcm  → "0"/"1"  (AcceptWaveform)      P → PartialResult JSON
+      R      → Result JSON                    F → FinalResult JSON
+      X      → (cevap yok) Reset              W "0"/"1" → (cevap yok) SetWords
+  cevaplar: 4 byte big-endian uzunluk | body
+
+Client tarafı KaldiRecognizer ile aynı arayüz:
+  model = open_model(VOSK_TR_MODEL)          # server varsa RemoteModel, yoksa yerel vosk Model
+  rec = make_recognizer(model, 16000)         # RemoteRecognizer ya da KaldiRecognizer
+
+Run:
+  python3 robi_models.py --preload models/vosk-model-small-en-us-0.15 --preload models/vosk-model-small-tr-0.3
+  python3 robi_models.py --stats
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from typing import Dict, List, Optional
+
+from robi_constants import MODELS_DIR, MODELS_SOCKET
+
+# -----------------------------
+# Optional vosk (client process'lerinde gerekmez)
+# -----------------------------
+try:
+    from vosk import KaldiRecognizer, Model, SetLogLevel  # type: ignore
+except Exception:
+    KaldiRecognizer = Model = SetLogLevel = None  # type: ignore
+
+_REQ = struct.Struct(">cI")
+_LEN = struct.Struct(">I")
+MAX_REQ = 1 << 22           # tek istekte en fazla ~2 dk 16 kHz PCM
+MAX_HELLO = 64 * 1024
+
+
+class ModelServerError(Exception):
+    pass
+
+
+class SessionLost(ModelServerError):
+    """Server session dropped mid-utterance; decoder state is gone, caller restarts it."""
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("model server connection closed")
+        buf += chunk
+    return bytes(buf)
+
+
+def _recv_line(sock: socket.socket) -> bytes:
+    buf = bytearray()
+    while not buf.endswith(b"\n"):
+        chunk = sock.recv(1)
+        if not chunk:
+            raise ConnectionError("model server connection closed")
+        buf += chunk
+        if len(buf) > MAX_HELLO:
+            raise ModelServerError("line too long")
+    return bytes(buf[:-1])
+
+
+# -----------------------------
+# Server
+# -----------------------------
+class ModelServer:
+    def __init__(self, sock_path: str = MODELS_SOCKET, allow_dirs: Optional[List[str]] = None):
+        if Model is None:
+            raise ModelServerError("vosk is not installed")
+        self.sock_path = sock_path
+        self.allow_dirs = [os.path.realpath(d) for d in (allow_dirs or [str(MODELS_DIR)])]
+        self.models: Dict[str, object] = {}
+        self.load_s: Dict[str, float] = {}
+        self.sessions: Dict[str, int] = {}      # model → açık session
+        self.total_sessions = 0
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+    # ---- models ----
+    def _resolve(self, path: str) -> str:
+        real = os.path.realpath(path)
+        if real not in self.models and not any(real == d or real.startswith(d + os.sep) for d in self.allow_dirs):
+            raise ModelServerError(f"model outside allowed dirs: {path}")
+        if not os.path.isdir(real):
+            raise ModelServerError(f"no such model: {path}")
+        return real
+
+    def get_model(self, path: str):
+        real = self._resolve(path)
+        m = self.models.get(real)
+        if m is not None:
+            return real, m
+        with self._lock:
+            ll = self._load_locks.setdefault(real, threading.Lock())
+        with ll:    # aynı modeli iki client aynı anda isterse tek yükleme
+            m = self.models.get(real)
+            if m is None:
+                t0 = time.time()
+                m = Model(real)
+                self.load_s[real] = time.time() - t0
+                self.models[real] = m
+                print(f"[MODELS] 📦 loaded {real} in {self.load_s[real]:.1f}s")
+        return real, m
+
+    def preload(self, path: str):
+        self.allow_dirs.append(os.path.realpath(path))
+        self.get_model(path)
+
+    def stats(self) -> dict:
+        return {
+            "models": {p: {"load_s": round(self.load_s.get(p, 0.0), 2), "sessions": self.sessions.get(p, 0)}
+                       for p in self.models},
+            "total_sessions": self.total_sessions,
+            "rss_mb": _rss_mb(),
+        }
+
+    # ---- sessions ----
+    def serve_forever(self):
+        try:
+            os.unlink(self.sock_path)
+        except FileNotFoundError:
+            pass
+        srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        srv.bind(self.sock_path)
+        os.chmod(self.sock_path, 0o666)
+        srv.listen(16)
+        print(f"[MODELS] 🧠 ROBI model server online: {self.sock_path}")
+        try:
+            while True:
+                conn, _ = srv.accept()
+                threading.Thread(target=self._serve, args=(conn,), name="model-session", daemon=True).start()
+        finally:
+            srv.close()
+            try:
+                os.unlink(self.sock_path)
+            except OSError:
+                pass
+
+    def _serve(self, conn: socket.socket):
+        model_key = None    # sadece session sayacı artırıldıktan sonra set edilir
+        try:
+            try:
+                hello = json.loads(_recv_line(conn))
+                op = hello.get("op")
+                if op == "stats":
+                    conn.sendall(json.dumps(self.stats()).encode() + b"\n")
+                    return
+                key, model = self.get_model(str(hello.get("model")))
+                if op == "load":
+                    conn.sendall(b"OK\n")
+                    return
+                if op != "session":
+                    raise ModelServerError(f"unknown op {op!r}")
+                rate = float(hello.get("rate") or 16000)
+                grammar = hello.get("grammar")
+                if grammar is not None:
+                    rec = KaldiRecognizer(model, rate, json.dumps(grammar, ensure_ascii=False))
+                else:
+                    rec = KaldiRecognizer(model, rate)
+            except (ConnectionError, OSError):
+                raise
+            except Exception as e:
+                # vosk Model/KaldiRecognizer hataları düz Exception: client bağlantı kopması değil ERR görsün
+                conn.sendall(f"ERR {e}\n".encode())
+                return
+            with self._lock:
+                self.sessions[key] = self.sessions.get(key, 0) + 1
+                self.total_sessions += 1
+            model_key = key
+            conn.sendall(b"OK\n")
+            self._session_loop(conn, rec)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            if model_key is not None:
+                with self._lock:
+                    self.sessions[model_key] -= 1
+            conn.close()
+
+    @staticmethod
+    def _session_loop(conn: socket.socket, rec):
+        def reply(body: bytes):
+            conn.sendall(_LEN.pack(len(body)) + body)
+
+        while True:
+            op, n = _REQ.unpack(_recv_exact(conn, _REQ.size))
+            if n > MAX_REQ:
+                raise ConnectionError(f"request too large: {n}")
+            data = _recv_exact(conn, n) if n else b""
+            if op == b"A":
+                reply(b"1" if rec.AcceptWaveform(data) else b"0")
+            elif op == b"P":
+                reply(rec.PartialResult().encode())
+            elif op == b"R":
+                reply(rec.Result().encode())
+            elif op == b"F":
+                reply(rec.FinalResult().encode())
+            elif op == b"X":
+                rec.Reset()
+            elif op == b"W":
+                rec.SetWords(data == b"1")
+            else:
+                raise ConnectionError(f"unknown request {op!r}")
+
+
+def _rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024.0, 1)
+    except OSError:
+        pass
+    return None
+
+
+# -----------------------------
+# Client
+# -----------------------------
+def _hello(sock_path: str, msg: dict, timeout: Optional[float] = None) -> socket.socket:
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.settimeout(timeout)
+        s.connect(sock_path)
+        s.sendall(json.dumps(msg, ensure_ascii=False).encode("utf-8") + b"\n")
+        line = _recv_line(s).decode("utf-8", errors="replace")
+        if line != "OK":
+            raise ModelServerError(line[4:] if line.startswith("ERR ") else line)
+        s.settimeout(None)
+        return s
+    except Exception:
+        s.close()
+        raise
+
+
+def query_stats(sock_path: str = MODELS_SOCKET, timeout: float = 0.5) -> dict:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(sock_path)
+        s.sendall(b'{"op": "stats"}\n')
+        return json.loads(_recv_line(s))
+
+
+class RemoteModel:
+    """Handle for a model hosted by robi_models (no local memory)."""
+
+    def __init__(self, path: str, sock_path: str = MODELS_SOCKET):
+        self.path = os.path.realpath(str(path))
+        self.sock_path = sock_path
+        # sunucu modeli şimdi yüklesin / hatayı şimdi versin (ilk yükleme saniyeler sürebilir)
+        _hello(sock_path, {"op": "load", "model": self.path}).close()
+
+    def __repr__(self):
+        return f"RemoteModel({self.path!r})"
+
+
+class RemoteRecognizer:
+    """KaldiRecognizer-compatible session on the model server."""
+
+    def __init__(self, model: RemoteModel, rate: float, grammar: Optional[str] = None):
+        self.model = model
+        self.rate = rate
+        self.grammar = json.loads(grammar) if grammar else None
+        self._words = False
+        self._dirty = False     # son Reset/Result'tan beri ses beslendi (server'da decoder state var)
+        self.reconnects = 0
+        self._connect()
+
+    def _connect(self):
+        self.sock = _hello(self.model.sock_path, {
+            "op": "session",
+            "model": self.model.path,
+            "rate": self.rate,
+            "grammar": self.grammar,
+        })
+        if self._words:
+            self._send(b"W", b"1")
+
+    def _send(self, op: bytes, data: bytes = b""):
+        self.sock.sendall(_REQ.pack(op, len(data)) + data)
+
+    def _call(self, op: bytes, data: bytes = b"") -> bytes:
+        for attempt in (0, 1):
+            try:
+                self._send(op, data)
+                (n,) = _LEN.unpack(_recv_exact(self.sock, _LEN.size))
+                return _recv_exact(self.sock, n)
+            except (ConnectionError, OSError):
+                if attempt:
+                    raise
+                # server yeniden başladı: yeni session (decoder state'i kaybolur = Reset)
+                self.reconnects += 1
+                self.sock.close()
+                self._connect()
+                if self._dirty:
+                    # yarım utterance yeni session'da sessizce devam etmesin (kısalmış transcript)
+                    self._dirty = False
+                    raise SessionLost("model server session lost mid-utterance")
+        raise AssertionError("unreachable")
+
+    def AcceptWaveform(self, data) -> bool:
+        ok = self._call(b"A", bytes(data)) == b"1"
+        self._dirty = True
+        return ok
+
+    def PartialResult(self) -> str:
+        return self._call(b"P").decode("utf-8")
+
+    def Result(self) -> str:
+        out = self._call(b"R").decode("utf-8")
+        self._dirty = False
+        return out
+
+    def FinalResult(self) -> str:
+        out = self._call(b"F").decode("utf-8")
+        self._dirty = False
+        return out
+
+    def Reset(self):
+        self._dirty = False
+        try:
+            self._send(b"X")
+        except OSError:
+            self.sock.close()
+            self._connect()     # yeni session zaten sıfır
+
+    def SetWords(self, words: bool):
+        self._words = bool(words)
+        self._send(b"W", b"1" if words else b"0")
+
+    def close(self):
+        self.sock.close()
+
+
+def server_available(sock_path: str = MODELS_SOCKET) -> bool:
+    try:
+        query_stats(sock_path)
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+def open_model(path, sock_path: str = MODELS_SOCKET, use_server: Optional[bool] = None):
+    """
+    Model handle: RemoteModel if the model server is up (use_server None: auto),
+    otherwise a local vosk Model (eski davranış).
+    """
+    if use_server is None:
+        use_server = server_available(sock_path)
+    if use_server:
+        m = RemoteModel(path, sock_path)
+        print(f"[MODELS] 🔗 {os.path.basename(m.path)} via model server")
+        return m
+    if Model is None:
+        raise ModelServerError("vosk is not installed and the model server is not running")
+    return Model(str(path))
+
+
+def make_recognizer(model, rate: float, grammar: Optional[str] = None):
+    """KaldiRecognizer(model, rate[, grammar]) for local or remote models."""
+    if isinstance(model, RemoteModel):
+        return RemoteRecognizer(model, rate, grammar)
+    if grammar is not None:
+        return KaldiRecognizer(model, rate, grammar)
+    return KaldiRecognizer(model, rate)
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def main():
+    ap = argparse.ArgumentParser(description="ROBI shared Vosk model server")
+    ap.add_argument("--socket", default=MODELS_SOCKET)
+    ap.add_argument("--preload", action="append", default=[], metavar="MODEL_DIR",
+                    help="load at startup (repeatable); also allowed even outside models/")
+    ap.add_argument("--stats", action="store_true", help="query a running server and exit")
+    args = ap.parse_args()
+
+    if args.stats:
+        try:
+            print(json.dumps(query_stats(args.socket, timeout=2.0), indent=2))
+        except (OSError, ValueError) as e:
+            print("[MODELS][ERR]", e)
+            raise SystemExit(1)
+        return
+
+    try:
+        if SetLogLevel is not None:
+            SetLogLevel(-1)
+        server = ModelServer(args.socket)
+        for p in args.preload:
+            server.preload(p)
+        if args.preload:
+            print(f"[MODELS] RSS after preload: {_rss_mb()} MB")
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    except ModelServerError as e:
+        print("[MODELS][ERR]", e)
+        raise SystemExit(1)
+    finally:
+        print("[MODELS] 🧠 ROBI model server offline")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,8 @@
 
 import time
 import math
-import struct
 import os
-import subprocess
+from array import array
 from collections import deque
 
 import cv2
@@ -17,8 +16,11 @@ from vision.face_detect import detect_faces
 from vision.face_service import update_confirmed_person
 
 from collections import deque, Counter
-from robi_bus import BusClient
+from robi_client import BusClient, get_publisher
 from robi_constants import BUS_SOCKET
+from robi_mic import MicReader, MicRingError
+from robi_rpc import RpcServer, request_topic
+from robi_stateboard import slot_writer
 
 FACE_VOTE_WINDOW = 7
 FACE_VOTE_MIN_HITS = 4
@@ -29,7 +31,51 @@ face_vote_buffer = deque(maxlen=FACE_VOTE_WINDOW)
 last_confirmed_name = None
 last_confirm_time = 0.0
 
-arecord = None
+mic = None   # robi_mic.MicReader (init_audio)
+
+bus = get_publisher(BUS_SOCKET)
+
+# Frame başına telemetri: bus yerine state board (robi_stateboard)
+faces_slot = slot_writer("vision.faces")
+presence_slot = slot_writer("vision.presence")
+
+
+def board_faces(faces, motion: int):
+    boxes = [int(v) for box in list(faces)[:4] for v in box]
+    boxes += [0] * (16 - len(boxes))
+    faces_slot.write(min(len(faces), 255), min(motion // 1000, 65535), *boxes)
+
+
+def presence_locked(now: float) -> bool:
+    return bool(last_confirmed_name) and (now - last_confirm_time) < FACE_LOCK_SECONDS
+
+
+_board_presence = None   # slot'a son yazılan (locked, name)
+
+
+def board_presence(now: float):
+    """vision.presence: RPC ile aynı kilit ifadesi; sadece değişince yazılır (kilit süresi dolunca da)."""
+    global _board_presence
+    state = (presence_locked(now), last_confirmed_name)
+    if state != _board_presence:
+        presence_slot.write(int(state[0]), (last_confirmed_name or "").encode("utf-8")[:23])
+        _board_presence = state
+
+
+# RPC: "perception.presence" (main loop'ta frame başına servis edilir)
+rpc = RpcServer("perception", BusClient(BUS_SOCKET, topics=[request_topic("perception")]))
+
+
+@rpc.register("presence")
+def rpc_presence():
+    now = time.time()
+    return {
+        "name": last_confirmed_name,
+        "since": last_confirm_time or None,
+        "locked": presence_locked(now),
+        "unknown_streak": unknown_streak,
+    }
+
 
 def on_person_detected(person_id=None):
     bus.publish({
@@ -38,12 +84,9 @@ def on_person_detected(person_id=None):
         "ts": time.time()
     })
 # =====================================================
-# EVENT SYSTEM (callback + JSONL output)
+# EVENT SYSTEM (callback + bus)
 # =====================================================
-import json
-
 event_callback = None
-EVENT_LOG_PATH = "/tmp/robi_events.jsonl"
 
 def on_event(func):
     global event_callback
@@ -54,13 +97,9 @@ def emit(event: dict):
     if event_callback:
         event_callback(event)
 
-    # 2) her zaman dosyaya yaz (brain buradan okur)
-    try:
-        event["_ts"] = time.time()
-        with open(EVENT_LOG_PATH, "a", encoding="utf-8") as f:
-            f.write(json.dumps(event, ensure_ascii=False) + "\n")
-    except Exception as e:
-        print("EVENT WRITE ERROR:", e)
+    # 2) her zaman bus'a yolla (kalıcı kayıt: robi_journal)
+    event["_ts"] = time.time()
+    bus.publish(event)
 
 # =====================================================
 # CONFIG: FACE CONSENSUS (anti-flicker)
@@ -125,71 +164,48 @@ def motion_score(g1, g2) -> int:
     return cv2.countNonZero(thr)
 
 # =====================================================
-# SOUND (AUTO DEVICE FALLBACK)
+# SOUND (robi_mic ring: cihazı açmaz, capture owner'a bağlanır)
 # =====================================================
-RATE = 16000
-CHUNK_MS = 50
 SOUND_THRESH = 0.005
 SOUND_DELTA = 200
 SOUND_COOLDOWN = 5.0
 
-chunk_frames = int(RATE * CHUNK_MS / 1000)
-chunk_bytes = chunk_frames * 2
-
-AUDIO_DEVICE_CANDIDATES = [
-    "plughw:CARD=sndrpigooglevoi,DEV=0",
-]
-
-# arecord = None
-
-def _start_arecord(dev: str):
-    return subprocess.Popen(
-        ["arecord", "-D", dev, "-f", "S16_LE", "-r", str(RATE), "-c", "1", "-t", "raw"],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.DEVNULL,
-        bufsize=chunk_bytes * 6
-    )
-
 def init_audio():
-    global arecord
-    for dev in AUDIO_DEVICE_CANDIDATES:
-        p = _start_arecord(dev)
-        time.sleep(0.15)
-        if p.poll() is None:
-            arecord = p
-            print(f"🎤 Audio device OK: {dev}")
-            return True
-    print("⚠️ Audio init failed (arecord device not found)")
-    return False
+    global mic
+    try:
+        mic = MicReader()
+    except (OSError, MicRingError) as e:
+        print(f"⚠️ Audio init failed (robi_mic.py running?): {e}")
+        return False
+    print(f"🎤 Mic ring OK: {mic.path}")
+    return True
 
 last_rms = 0.0
 last_sound_time = 0.0
 rms_smooth = 0.0
 
 def read_rms() -> float:
-    global arecord
-
-    # Brain mic kullanıyorsa → perception mic'i bırakır
-    if os.path.exists("/tmp/robi_mic.lock"):
-        if arecord and arecord.poll() is None:
-            arecord.terminate()
-            arecord = None
+    """RMS of the frames captured since the last call (kopyasız, bloklamaz)."""
+    # Brain mic kullanıyorsa → kendi sesimizi ölçme (cihaz açık kalır, frame'ler atlanır)
+    if os.path.exists(MIC_LOCK_PATH):
+        if mic is not None:
+            mic.skip()
         return 0.0
 
-    # arecord kapalıysa → aç
-    if arecord is None or arecord.poll() is not None:
-        if not init_audio():
-            return 0.0
-
-    data = arecord.stdout.read(chunk_bytes)
-    if not data or len(data) != chunk_bytes:
+    if mic is None and not init_audio():
         return 0.0
 
-    samples = struct.unpack("<" + "h" * (len(data) // 2), data)
-    s2 = 0
-    for v in samples:
-        s2 += v * v
-    return math.sqrt(s2 / len(samples))
+    s2 = 0.0
+    n = 0
+    while mic.pending() > 0:
+        view = mic.read(timeout=0.0)
+        if view is None:
+            break
+        # audioop 3.13'te yok: int16 örneklerin kareler toplamı
+        a = array("h", view)
+        s2 += sum(x * x for x in a)
+        n += len(a)
+    return math.sqrt(s2 / n) if n else 0.0
 
 
 # =====================================================
@@ -231,7 +247,7 @@ try:
                 unknown_streak += 1
 
                 # Eğer yakın zamanda CONFIRMED olmuş biri varsa, hiç unknown basma
-                if last_confirmed_name and (now - last_confirm_time) < FACE_LOCK_SECONDS:
+                if presence_locked(now):
                     pass
                 else:
                     if unknown_streak >= UNKNOWN_MIN_FRAMES and (now - last_unknown_emit) > UNKNOWN_COOLDOWN:
@@ -280,6 +296,12 @@ try:
 
         motion_hits = motion_hits + 1 if ms > MOTION_THRESH else 0
         net_motion = motion_hits >= MOTION_CONFIRM
+        board_faces(faces, ms)
+        board_presence(time.time())
+
+        # ---- RPC (presence sorguları) ----
+        for ev in rpc.bus.recv_many(timeout=0.0):
+            rpc.handle(ev)
 
         # ---- SOUND ----
         # ---- SOUND (GEÇİCİ OLARAK KAPALI) ----
@@ -336,9 +358,6 @@ finally:
         picam2.stop()
     except Exception:
         pass
-    try:
-        if arecord is not None:
-            arecord.terminate()
-    except Exception:
-        pass
+    if mic is not None:
+        mic.close()
 
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+robi_rpc.py
+Request/reply over robi_bus (correlation id + deadline).
+
+Request:  {"type": "rpc.req.<service>", "id": "...", "method": "listen",
+           "params": {...}, "reply_to": "rpc.rep.<client>", "deadline": <unix ts>}
+Reply:    {"type": "rpc.rep.<client>", "id": "...", "result": ..., "error": null}
+
+Server side runs inside the owner's own loop (handlers never race the owner):
+    rpc = RpcServer("audio", bus)           # bus topics must include rpc.topic
+    rpc.register("listen", fn)
+    ...
+    if rpc.handle(ev): continue
+
+Client side has its own reply subscription and reader thread:
+    rpc = RpcClient()
+    rpc.call("audio", "listen", {"mode": "once"}, timeout=0.3)
+    fut = rpc.call_async(...)  /  await rpc.acall(...)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+from robi_client import BusClient
+from robi_constants import BUS_SOCKET
+
+REQ_PREFIX = "rpc.req."
+REP_PREFIX = "rpc.rep."
+
+
+class RpcError(Exception):
+    pass
+
+
+class RpcTimeout(RpcError):
+    pass
+
+
+def request_topic(service: str) -> str:
+    return REQ_PREFIX + service
+
+
+# -----------------------------
+# Server
+# -----------------------------
+class RpcServer:
+    def __init__(self, service: str, bus: BusClient):
+        self.service = service
+        self.topic = request_topic(service)
+        self.bus = bus
+        self._handlers: Dict[str, Callable[..., Any]] = {}
+        self.expired = 0
+
+    def register(self, method: str, fn: Callable[..., Any] = None):
+        """rpc.register("x", fn) or @rpc.register("x")"""
+        if fn is None:
+            def deco(f):
+                self._handlers[method] = f
+                return f
+            return deco
+        self._handlers[method] = fn
+        return fn
+
+    def handle(self, ev: dict) -> bool:
+        """Serve ev if it is a request for this service. True → consumed."""
+        if not ev or ev.get("type") != self.topic:
+            return False
+
+        deadline = ev.get("deadline")
+        if deadline is not None and time.time() > deadline:
+            # çağıran zaten vazgeçti, iş yapma
+            self.expired += 1
+            return True
+
+        result, error = None, None
+        fn = self._handlers.get(ev.get("method"))
+        if fn is None:
+            error = f"unknown method {self.service}.{ev.get('method')}"
+        else:
+            try:
+                result = fn(**(ev.get("params") or {}))
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+
+        reply_to = ev.get("reply_to")
+        if reply_to:
+            self.bus.publish({
+                "type": reply_to,
+                "id": ev.get("id"),
+                "result": result,
+                "error": error,
+                "ts": time.time(),
+            })
+        return True
+
+
+# -----------------------------
+# Client
+# -----------------------------
+class RpcClient:
+    def __init__(self, sock_path: str = BUS_SOCKET):
+        self.name = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.reply_topic = REP_PREFIX + self.name
+        self.bus = BusClient(sock_path, topics=[self.reply_topic])
+        self._ids = itertools.count(1)
+        self._pending: Dict[str, tuple] = {}   # id -> (future, deadline)
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._reader, name="robi-rpc", daemon=True)
+        self._thread.start()
+
+    def _reader(self):
+        while not self.bus.closed:
+            for ev in self.bus.recv_many(timeout=0.1):
+                with self._lock:
+                    entry = self._pending.pop(ev.get("id"), None)
+                if entry is None:
+                    continue  # geç gelen / bilinmeyen cevap
+                fut = entry[0]
+                if ev.get("error"):
+                    fut.set_exception(RpcError(ev["error"]))
+                else:
+                    fut.set_result(ev.get("result"))
+            self._expire()
+
+    def _expire(self):
+        now = time.time()
+        with self._lock:
+            dead = [cid for cid, (_, dl) in self._pending.items() if dl < now]
+            entries = [self._pending.pop(cid) for cid in dead]
+        for fut, _ in entries:
+            if not fut.done():
+                fut.set_exception(RpcTimeout("deadline exceeded"))
+
+    def call_async(self, service: str, method: str, params: Optional[dict] = None,
+                   timeout: float = 1.0) -> Future:
+        cid = f"{self.name}-{next(self._ids)}"
+        deadline = time.time() + timeout
+        fut: Future = Future()
+        with self._lock:
+            self._pending[cid] = (fut, deadline)
+        self.bus.publish({
+            "type": request_topic(service),
+            "id": cid,
+            "method": method,
+            "params": params or {},
+            "reply_to": self.reply_topic,
+            "deadline": deadline,
+            "ts": time.time(),
+        })
+        return fut
+
+    def call(self, service: str, method: str, params: Optional[dict] = None,
+             timeout: float = 1.0) -> Any:
+        fut = self.call_async(service, method, params, timeout)
+        try:
+            return fut.result(timeout + 0.05)
+        except TimeoutError:
+            raise RpcTimeout(f"{service}.{method}: no reply in {timeout}s") from None
+
+    async def acall(self, service: str, method: str, params: Optional[dict] = None,
+                    timeout: float = 1.0) -> Any:
+        return await asyncio.wrap_future(self.call_async(service, method, params, timeout))
+
+    def close(self):
+        self.bus.close()
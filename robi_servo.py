@@ -1,6 +1,8 @@
 import time
 import RPi.GPIO as GPIO
 
+from robi_stateboard import slot_writer
+
 SERVO_PIN = 13
 SERVO_MIN = 30
 SERVO_MAX = 170
@@ -8,6 +10,7 @@ CENTER_ANGLE = 100
 
 _pwm = None
 _inited = False
+_angle_slot = slot_writer("servo.angle")   # açı + varış zamanı (state board)
 
 def _angle_to_duty(angle: float) -> float:
     return 2.5 + (angle / 180.0) * 10.0
@@ -32,6 +35,7 @@ def servo_goto(angle: int, hold: float = 0.30):
     if not _inited:
         servo_init()
     angle = _clamp(angle)
+    _angle_slot.write(angle, time.time() + hold)
     _pwm.ChangeDutyCycle(_angle_to_duty(angle))
     time.sleep(hold)
     _pwm.ChangeDutyCycle(0)
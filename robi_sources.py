@@ -0,0 +1,540 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+robi_sources.py
+Pluggable audio sources: fixed-size 16-bit mono PCM frames from a device,
+the robi_mic ring, a WAV/raw file or a synthetic generator.
+
+Hepsi aynı arayüz (robi_audio, robi_wake ve robi_mic capture döngüsü bunu kullanır):
+  src = open_source("file:test.wav", rate=16000, frame_ms=20, realtime=False)
+  while True:
+      if src.readinto(view, timeout=0.1):   # view'a bir frame yazar
+          use(view, src.ts)                 # ts: frame'in capture zamanı
+      elif src.eof:                         # sadece dosya / sentetik kaynaklar biter
+          break
+  data = src.read(timeout=0.1)              # bytes (ring: kopyasız view) ya da None
+
+Spec'ler:
+  ring[:PATH]                 robi_mic.py ring'i (varsayılan MIC_RING_PATH)
+  arecord[:DEVICE]            kendi arecord'umuz (Google voice HAT)
+  sd[:DEVICE]                 sounddevice / PortAudio (index ya da isim)
+  file:PATH | PATH.wav/.raw   dosya replay; raw = S16_LE mono, rate Hz
+  synth:KIND[:SECONDS]        silence | tone | noise (SECONDS yok: sonsuz)
+
+Replay: realtime=True frame'leri gerçek zamanlı verir (mic gibi), False
+olabildiğince hızlı (test / profil). WAV gerekirse mono'ya indirilir ve
+resample edilir; pad_ms sona sessizlik ekler (VAD endpoint'i kapansın).
+
+Run:
+  python3 robi_sources.py wake.wav --fast --segments
+  python3 robi_sources.py test.wav --fast --stt-model models/vosk-model-small-tr-0.3
+  python3 robi_sources.py synth:tone:2
+"""
+
+from __future__ import annotations
+
+import argparse
+import audioop
+import json
+import math
+import os
+import queue
+import random
+import subprocess
+import time
+import wave
+from array import array
+from typing import Optional
+
+from robi_constants import MIC_RING_PATH
+from robi_mic import MicRingError, attach, read_full
+
+# -----------------------------
+# Optional sounddevice (sadece sd: kaynağı için)
+# -----------------------------
+try:
+    import sounddevice as sd  # type: ignore
+except Exception:
+    sd = None
+
+DEFAULT_DEVICE = "plughw:CARD=sndrpigooglevoi,DEV=0"
+
+
+class AudioSourceError(Exception):
+    pass
+
+
+class AudioSource:
+    """
+    Base class. Subclasses implement readinto(); frames are always
+    frame_bytes long (S16_LE mono at rate). Not thread-safe: one reader.
+    """
+
+    kind = ""
+    realtime = True     # False: hızlı replay, tüketici beklenebilir (backpressure)
+
+    def __init__(self, rate: int = 16000, frame_ms: int = 20):
+        self.rate = rate
+        self.frame_ms = frame_ms
+        self.frame_bytes = int(rate * frame_ms / 1000) * 2
+        self.period = frame_ms / 1000.0
+        self.ts = 0.0           # son frame'in capture zamanı (time.time())
+        self.frames = 0         # verilen frame sayısı
+        self.dropped = 0        # kaynak tarafında kaybolan frame'ler
+        self.restarts = 0
+        self.eof = False
+
+    def readinto(self, view: memoryview, timeout: Optional[float] = None) -> bool:
+        """Fill view with the next frame. False: nothing yet (timeout) or eof."""
+        raise NotImplementedError
+
+    def read(self, timeout: Optional[float] = None):
+        buf = bytearray(self.frame_bytes)
+        return bytes(buf) if self.readinto(memoryview(buf), timeout) else None
+
+    def stats(self) -> dict:
+        return {
+            "source": self.kind,
+            "frames": self.frames,
+            "seconds": round(self.frames * self.period, 2),
+            "dropped": self.dropped,
+            "restarts": self.restarts,
+            "eof": self.eof,
+        }
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# -----------------------------
+# Devices
+# -----------------------------
+class ArecordSource(AudioSource):
+    """arecord subprocess; restarted if it exits (device error). timeout is ignored (blocking pipe)."""
+
+    kind = "arecord"
+
+    def __init__(self, device: str = DEFAULT_DEVICE, rate: int = 16000, frame_ms: int = 20,
+                 channels: int = 1, debug: bool = False):
+        super().__init__(rate, frame_ms)
+        self.device = device
+        self.channels = channels
+        self.cmd = [
+            "arecord",
+            "-D", device,
+            "-f", "S16_LE",
+            "-r", str(rate),
+            "-c", str(channels),
+            "-t", "raw",
+            "--buffer-size=32768",
+        ]
+        if debug:
+            print("[AUDIO] 🎙️ arecord:", " ".join(self.cmd))
+        self._raw = bytearray(self.frame_bytes * channels) if channels > 1 else None
+        self._closed = False
+        self._start()
+
+    def _start(self):
+        self.proc = subprocess.Popen(self.cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0)
+
+    def _stop(self):
+        try:
+            self.proc.terminate()
+            self.proc.wait(timeout=1.0)
+        except Exception:
+            pass
+
+    def readinto(self, view: memoryview, timeout: Optional[float] = None) -> bool:
+        if self._closed:
+            self.eof = True
+            return False
+        if self._raw is None:
+            ok = read_full(self.proc.stdout, view)
+        else:
+            ok = read_full(self.proc.stdout, memoryview(self._raw))
+            if ok:
+                # stereo: iki kanalın ortalaması; daha fazlası: ilk kanal
+                if self.channels == 2:
+                    view[:] = audioop.tomono(self._raw, 2, 0.5, 0.5)
+                else:
+                    view[:] = array("h", self._raw)[::self.channels].tobytes()
+        if ok:
+            self.ts = time.time()
+            self.frames += 1
+            return True
+        if self._closed:
+            self.eof = True
+            return False
+        print(f"[AUDIO] ⚠️ arecord exited (rc={self.proc.poll()}), restarting")
+        self.restarts += 1
+        self._stop()
+        time.sleep(0.5)
+        self._start()
+        return False
+
+    def close(self):
+        self._closed = True
+        self._stop()    # pipe kapanır → bekleyen readinto EOF ile döner
+
+
+class SoundDeviceSource(AudioSource):
+    """PortAudio input stream (sounddevice); the callback queues whole frames."""
+
+    kind = "sd"
+
+    def __init__(self, device=None, rate: int = 16000, frame_ms: int = 20, queue_sec: float = 4.0):
+        super().__init__(rate, frame_ms)
+        if sd is None:
+            raise AudioSourceError("sounddevice is not installed (pip install sounddevice)")
+        if isinstance(device, str) and device.isdigit():
+            device = int(device)
+        self.device = device
+        self._q: "queue.Queue[tuple]" = queue.Queue(maxsize=max(2, int(queue_sec / self.period)))
+        self.stream = sd.RawInputStream(
+            samplerate=rate,
+            blocksize=self.frame_bytes // 2,
+            device=device,
+            dtype="int16",
+            channels=1,
+            callback=self._cb,
+        )
+        self.stream.start()
+
+    def _cb(self, indata, frames, time_info, status):
+        try:
+            self._q.put_nowait((bytes(indata), time.time()))
+        except queue.Full:
+            self.dropped += 1   # okuyan yetişemiyor: yeni frame'i at
+
+    def readinto(self, view: memoryview, timeout: Optional[float] = None) -> bool:
+        try:
+            data, ts = self._q.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        if len(data) != self.frame_bytes:
+            return False
+        view[:] = data
+        self.ts = ts
+        self.frames += 1
+        return True
+
+    def close(self):
+        try:
+            self.stream.stop()
+            self.stream.close()
+        except Exception:
+            pass
+
+
+class MicRingSource(AudioSource):
+    """Reader on the robi_mic.py shared-memory ring (waits for the capture owner)."""
+
+    kind = "ring"
+
+    def __init__(self, path: str = MIC_RING_PATH, rate: int = 16000, frame_ms: int = 20):
+        super().__init__(rate, frame_ms)
+        self.path = path
+        self.mic = attach(path)
+        if self.mic.rate != rate or self.mic.frame_bytes != self.frame_bytes:
+            self.mic.close()
+            raise MicRingError(
+                f"mic ring is {self.mic.rate} Hz / {self.mic.frame_bytes} B frames, "
+                f"need {rate} Hz / {self.frame_bytes} B"
+            )
+
+    def read(self, timeout: Optional[float] = None):
+        """Zero-copy view into the ring; valid until the next read()."""
+        view = self.mic.read(timeout=timeout)
+        if view is not None:
+            self.ts = self.mic.ts
+            self.frames += 1
+        return view
+
+    def readinto(self, view: memoryview, timeout: Optional[float] = None) -> bool:
+        data = self.read(timeout)
+        if data is None:
+            return False
+        view[:] = data
+        return True
+
+    def stats(self) -> dict:
+        st = super().stats()
+        st["dropped"] = self.mic.dropped
+        return st
+
+    def close(self):
+        self.mic.close()
+
+
+# -----------------------------
+# Replay / synthetic
+# -----------------------------
+class _Paced(AudioSource):
+    """Finite sources: realtime pacing (frame n at t0 + n × period) or as fast as possible."""
+
+    def __init__(self, rate: int, frame_ms: int, realtime: bool, loop: bool):
+        super().__init__(rate, frame_ms)
+        self.realtime = realtime
+        self.loop = loop
+        self._t0 = None
+
+    def _pace(self):
+        if self._t0 is None:
+            self._t0 = time.monotonic()
+            return
+        if self.realtime:
+            delay = self._t0 + self.frames * self.period - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    def _fill(self, view: memoryview) -> bool:
+        raise NotImplementedError
+
+    def _rewind(self) -> bool:
+        return False
+
+    def readinto(self, view: memoryview, timeout: Optional[float] = None) -> bool:
+        if self.eof:
+            return False
+        if not self._fill(view):
+            if not (self.loop and self._rewind() and self._fill(view)):
+                self.eof = True
+                return False
+        self._pace()
+        self.ts = time.time()
+        self.frames += 1
+        return True
+
+
+class FileSource(_Paced):
+    """
+    WAV (any rate / 1-2 channels / 8-32 bit → S16_LE mono at rate) or raw
+    S16_LE mono at rate. Streams the file in 1 s chunks.
+    """
+
+    kind = "file"
+
+    def __init__(self, path: str, rate: int = 16000, frame_ms: int = 20, realtime: bool = True,
+                 loop: bool = False, pad_ms: int = 0):
+        super().__init__(rate, frame_ms, realtime, loop)
+        self.path = path
+        self.pad_bytes = int(rate * pad_ms / 1000) * 2
+        self.is_wav = path.lower().endswith(".wav")
+        self._buf = bytearray()
+        self._open()
+
+    def _open(self):
+        self._ratecv = None
+        self._padded = 0
+        self._done = False
+        if self.is_wav:
+            try:
+                self._f = wave.open(self.path, "rb")
+            except (wave.Error, EOFError) as e:
+                raise AudioSourceError(f"{self.path}: {e}") from e
+            self.src_rate = self._f.getframerate()
+            self.src_width = self._f.getsampwidth()
+            self.src_channels = self._f.getnchannels()
+            if self.src_channels not in (1, 2):
+                raise AudioSourceError(f"{self.path}: {self.src_channels} channels not supported")
+            self.duration = self._f.getnframes() / float(self.src_rate)
+        else:
+            self._f = open(self.path, "rb")
+            self.src_rate, self.src_width, self.src_channels = self.rate, 2, 1
+            self.duration = os.path.getsize(self.path) / (2.0 * self.rate)
+
+    def _chunk(self) -> bytes:
+        """~1 s of source audio converted to S16_LE mono at rate (b"": dosya bitti)."""
+        if self.is_wav:
+            data = self._f.readframes(self.src_rate)
+        else:
+            data = self._f.read(self.rate * 2)
+            data = data[:len(data) & ~1]
+        if not data:
+            return b""
+        if self.src_width != 2:
+            if self.src_width == 1:
+                data = audioop.bias(data, 1, -128)     # WAV 8 bit unsigned
+            data = audioop.lin2lin(data, self.src_width, 2)
+        if self.src_channels == 2:
+            data = audioop.tomono(data, 2, 0.5, 0.5)
+        if self.src_rate != self.rate:
+            data, self._ratecv = audioop.ratecv(data, 2, 1, self.src_rate, self.rate, self._ratecv)
+        return data
+
+    def _fill(self, view: memoryview) -> bool:
+        n = self.frame_bytes
+        while len(self._buf) < n and not self._done:
+            data = self._chunk()
+            if data:
+                self._buf += data
+                continue
+            self._done = True
+            self._buf += bytes(self.pad_bytes)
+            if self._buf and len(self._buf) < n:
+                self._buf += bytes(n - len(self._buf))  # son yarım frame sessizlikle tamamlanır
+        if len(self._buf) < n:
+            return False
+        view[:] = self._buf[:n]
+        del self._buf[:n]
+        return True
+
+    def _rewind(self) -> bool:
+        self._f.close()
+        self._open()
+        return True
+
+    def close(self):
+        self._f.close()
+
+
+class SyntheticSource(_Paced):
+    """silence | tone (sine, freq Hz) | noise (gaussian, seeded). seconds None: never ends."""
+
+    kind = "synth"
+
+    def __init__(self, kind: str = "silence", rate: int = 16000, frame_ms: int = 20,
+                 seconds: Optional[float] = None, freq: float = 440.0, level: float = 0.3,
+                 realtime: bool = True, seed: int = 0):
+        super().__init__(rate, frame_ms, realtime, loop=False)
+        if kind not in ("silence", "tone", "noise"):
+            raise AudioSourceError(f"unknown synthetic source {kind!r}")
+        self.signal = kind
+        self.total = None if seconds is None else int(seconds / self.period)
+        self.freq = freq
+        self.amp = level * 32767.0
+        self._rng = random.Random(seed)
+        self._n = self.frame_bytes // 2
+        self._phase = 0.0
+
+    def _fill(self, view: memoryview) -> bool:
+        if self.total is not None and self.frames >= self.total:
+            return False
+        if self.signal == "silence":
+            view[:] = bytes(self.frame_bytes)
+            return True
+        if self.signal == "tone":
+            step = 2.0 * math.pi * self.freq / self.rate
+            p = self._phase
+            a = array("h", (int(self.amp * math.sin(p + i * step)) for i in range(self._n)))
+            self._phase = (p + self._n * step) % (2.0 * math.pi)
+        else:
+            g = self._rng.gauss
+            a = array("h", (max(-32768, min(32767, int(g(0.0, self.amp / 3.0)))) for _ in range(self._n)))
+        view[:] = a.tobytes()
+        return True
+
+
+# -----------------------------
+# Factory
+# -----------------------------
+def device_spec(mic_ring: Optional[str], arecord_device: Optional[str]) -> str:
+    """Spec for the legacy options: mic ring if set, otherwise our own arecord."""
+    return f"ring:{mic_ring}" if mic_ring else f"arecord:{arecord_device or DEFAULT_DEVICE}"
+
+
+def open_source(spec: str, rate: int = 16000, frame_ms: int = 20, realtime: bool = True,
+                loop: bool = False, pad_ms: int = 0, debug: bool = False) -> AudioSource:
+    """AudioSource for a spec string (see module docstring)."""
+    kind, _, arg = spec.partition(":")
+    if kind == "ring":
+        return MicRingSource(arg or MIC_RING_PATH, rate, frame_ms)
+    if kind == "arecord":
+        return ArecordSource(arg or DEFAULT_DEVICE, rate, frame_ms, debug=debug)
+    if kind == "sd":
+        return SoundDeviceSource(arg or None, rate, frame_ms)
+    if kind == "synth":
+        signal, _, seconds = arg.partition(":")
+        try:
+            secs = float(seconds) if seconds else None
+        except ValueError:
+            raise AudioSourceError(f"bad synthetic duration in {spec!r}")
+        return SyntheticSource(signal or "silence", rate, frame_ms, seconds=secs, realtime=realtime)
+    path = arg if kind == "file" else spec
+    if kind == "file" or os.path.isfile(path) or path.lower().endswith((".wav", ".raw", ".pcm")):
+        try:
+            return FileSource(path, rate, frame_ms, realtime=realtime, loop=loop, pad_ms=pad_ms)
+        except OSError as e:
+            raise AudioSourceError(f"{path}: {e}") from e
+    raise AudioSourceError(f"unknown audio source {spec!r}")
+
+
+# -----------------------------
+# CLI: replay a source through the robi_audio stages
+# -----------------------------
+def main():
+    ap = argparse.ArgumentParser(description="ROBI audio source replay / smoke test")
+    ap.add_argument("source", help="ring[:PATH] | arecord[:DEV] | sd[:DEV] | file:PATH | PATH.wav | synth:KIND[:SEC]")
+    ap.add_argument("--rate", type=int, default=16000)
+    ap.add_argument("--frame-ms", type=int, default=20, choices=[10, 20, 30])
+    ap.add_argument("--fast", action="store_true", help="replay as fast as possible (default: realtime)")
+    ap.add_argument("--loop", action="store_true")
+    ap.add_argument("--pad-ms", type=int, default=500, help="trailing silence after a file")
+    ap.add_argument("--seconds", type=float, default=None, help="stop after this much audio (live sources)")
+    ap.add_argument("--segments", action="store_true", help="print VAD segments (robi_audio.Segmenter)")
+    ap.add_argument("--wake-model", default=None, help="run WakeRecognizer.detect on each segment")
+    ap.add_argument("--stt-model", default=None, help="run SttRecognizer.transcribe on each segment")
+    ap.add_argument("--vad-mode", type=int, default=2, choices=[0, 1, 2, 3])
+    args = ap.parse_args()
+
+    seg = wake = stt = None
+    if args.segments or args.wake_model or args.stt_model:
+        from robi_audio import AudioCfg, Segmenter, SttRecognizer, WakeRecognizer
+        from robi_models import open_model
+        cfg = AudioCfg(arecord_device=DEFAULT_DEVICE, sample_rate=args.rate, frame_ms=args.frame_ms,
+                       vad_mode=args.vad_mode)
+        seg = Segmenter(cfg, max_sec=cfg.listen_max_sec)
+        if args.wake_model:
+            wake = WakeRecognizer(open_model(args.wake_model), cfg)
+        if args.stt_model:
+            stt = SttRecognizer(open_model(args.stt_model), cfg)
+
+    try:
+        src = open_source(args.source, args.rate, args.frame_ms, realtime=not args.fast,
+                          loop=args.loop, pad_ms=args.pad_ms)
+    except (AudioSourceError, MicRingError) as e:
+        print("[AUDIO][ERR]", e)
+        raise SystemExit(1)
+
+    view = memoryview(bytearray(src.frame_bytes))
+    peak = 0
+    t0 = time.perf_counter()
+    try:
+        while args.seconds is None or src.frames * src.period < args.seconds:
+            if not src.readinto(view, timeout=0.5):
+                if src.eof:
+                    break
+                continue
+            peak = max(peak, audioop.max(view, 2))
+            if seg is None:
+                continue
+            utt = seg.push(bytes(view))
+            if utt is None:
+                continue
+            end = src.frames * src.period
+            line = f"[AUDIO] 🗣️ {end - len(utt) / (2.0 * args.rate):6.2f}-{end:6.2f}s"
+            if wake is not None:
+                line += f" wake={json.dumps(wake.detect(utt), ensure_ascii=False)}"
+            if stt is not None:
+                line += f" stt={stt.transcribe(utt).get('text', '')!r}"
+            print(line)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        src.close()
+    wall = time.perf_counter() - t0
+    st = src.stats()
+    st["wall_s"] = round(wall, 2)
+    st["x_realtime"] = round(st["seconds"] / wall, 1) if wall else None
+    st["peak"] = round(peak / 32768.0, 3)
+    print("[AUDIO] 📼", json.dumps(st))
+
+
+if __name__ == "__main__":
+    main()
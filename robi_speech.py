@@ -10,13 +10,12 @@ Tek işi: ROBI'yi konuşturmak (TTS) + (opsiyonel) LED yüz senkronu
 
 from __future__ import annotations
 
-import json
 import os
-import socket
 import subprocess
 import threading
 import time
 from typing import Optional
+from robi_client import get_publisher
 from robi_constants import BUS_SOCKET
 
 
@@ -65,39 +64,10 @@ print("[SPEECH] OPENAI_API_KEY in env:", bool(os.getenv("OPENAI_API_KEY")))
 
 
 # -----------------------------
-# Minimal bus publisher (best-effort)
+# Bus publisher (shared, non-blocking)
 # -----------------------------
-class _BusPub:
-    def __init__(self, sock_path: str):
-        self.sock_path = sock_path
-        self._sock: Optional[socket.socket] = None
-
-    def _ensure(self):
-        if self._sock is not None:
-            return
-        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        s.connect(self.sock_path)
-        s.sendall(b"PUB\n")
-        self._sock = s
-
-    def publish(self, ev: dict):
-        try:
-            if not os.path.exists(self.sock_path):
-                return
-            self._ensure()
-            line = (json.dumps(ev, ensure_ascii=False) + "\n").encode("utf-8")
-            self._sock.sendall(line)
-        except Exception:
-            # bus yoksa / koparsa konuşmayı engellemeyelim
-            try:
-                if self._sock:
-                    self._sock.close()
-            except Exception:
-                pass
-            self._sock = None
-
-
-_bus = _BusPub(BUS_SOCKET)
+# bus yoksa / koparsa konuşmayı engellemez: event buffer'da bekler
+_bus = get_publisher(BUS_SOCKET)
 
 
 # -----------------------------
@@ -136,6 +106,17 @@ def _clear_mic_lock():
         pass
 
 
+def release_mic():
+    """
+    Önceki process konuşurken öldüyse (son TTS event'i TTS_START kaldı):
+    mic kilidini kaldır ve audio'ya TTS_END yolla ki mic muted kalmasın.
+    """
+    if speaking_now():
+        return
+    _clear_mic_lock()
+    _bus.publish({"type": "TTS_END", "ts": time.time(), "reason": "stale"})
+
+
 def _fallback_say(text: str) -> bool:
     """
     OpenAI yoksa: espeak-ng / espeak ile gerçek ses.
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+robi_stateboard.py
+Shared-memory state board: fixed-layout telemetry slots under /dev/shm.
+
+Yüksek frekanslı, "son değer yeter" sinyaller (ses seviyesi, yüz kutuları,
+servo açısı, core state) bus'a JSON olarak basılmaz; her yazar kendi
+slot'una yazar, isteyen process istediği hızda lock'suz okur.
+
+Layout (little-endian):
+  header  64 B   magic "RBRD", version, slot sayısı, slot boyu
+  slot    N × slot_size
+          seq u64 | ts f64 | crc32 u32 | name 24s | fmt 16s | len u32 | payload
+
+Seqlock: yazar seq'i tek yapar → payload + ts + crc → seq'i çift yapar.
+Okuyan seq tek ise ya da okuma sırasında değiştiyse tekrar dener; crc32
+ayrıca yarım okunmuş payload'ı yakalar (ARM'da bellek sırası garantisi yok).
+Her slot'un tek yazarı vardır (sahibi olan process).
+
+Kullanım:
+  board = StateBoard()
+  level = board.writer("audio.level")          # fmt SLOTS'tan
+  level.write(0.12, 0.40)
+  board.read("audio.level")                    # Reading(values=(...), ts=..., seq=...)
+
+  python3 robi_stateboard.py                   # slot'ları listele
+  python3 robi_stateboard.py --watch 0.2       # canlı izle
+  python3 robi_stateboard.py --bench           # yazma/okuma maliyeti vs bus publish
+"""
+
+from __future__ import annotations
+
+import argparse
+import fcntl
+import mmap
+import os
+import struct
+import time
+import zlib
+from typing import Dict, List, NamedTuple, Optional
+
+from robi_constants import STATEBOARD_PATH
+
+MAGIC = b"RBRD"
+VERSION = 1
+HEADER = struct.Struct("<4sIII")
+HEADER_SIZE = 64
+SLOT_HDR = struct.Struct("<QdI24s16sI")   # seq, ts, crc, name, fmt, len
+_SEQ = struct.Struct("<Q")
+_TS_CRC = struct.Struct("<dI")
+_TS_CRC_OFF = 8
+DEFAULT_SLOTS = 64
+DEFAULT_SLOT_SIZE = 256
+READ_RETRIES = 64
+
+# Bilinen slot'lar: isim -> struct formatı (yazar/okuyan aynı tabloyu kullanır)
+SLOTS: Dict[str, str] = {
+    "audio.level": "<ff",         # rms, peak (0..1)
+    "vision.faces": "<BH16h",     # adet, motion/1000, 4 × (x, y, w, h)
+    "vision.presence": "<B23s",   # kilitli mi, son onaylanan isim
+    "servo.angle": "<fd",         # açı (derece), hedefe varış zamanı
+    "hw.face": "<12s",            # LED yüz animasyonu
+    "core.state": "<B16s",        # robi_core.State.value, adı
+}
+
+
+class Reading(NamedTuple):
+    values: tuple
+    ts: float
+    seq: int
+
+
+class StateBoardError(Exception):
+    pass
+
+
+# -----------------------------
+# Board
+# -----------------------------
+class StateBoard:
+    def __init__(self, path: str = STATEBOARD_PATH, slots: int = DEFAULT_SLOTS,
+                 slot_size: int = DEFAULT_SLOT_SIZE, create: bool = True):
+        """OSError: /dev/shm yok / izin yok. StateBoardError: dosya board değil."""
+        self.path = path
+        flags = os.O_RDWR | (os.O_CREAT if create else 0)
+        self._fd = os.open(path, flags, 0o666)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                size = os.fstat(self._fd).st_size
+                if size == 0:
+                    if not create:
+                        raise StateBoardError(f"{path}: empty")
+                    os.ftruncate(self._fd, HEADER_SIZE + slots * slot_size)
+                    os.pwrite(self._fd, HEADER.pack(MAGIC, VERSION, slots, slot_size), 0)
+                head = os.pread(self._fd, HEADER.size, 0)
+                magic, version, self.nslots, self.slot_size = HEADER.unpack(head)
+                if magic != MAGIC or version != VERSION:
+                    raise StateBoardError(f"{path}: not a v{VERSION} state board")
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self.mm = mmap.mmap(self._fd, HEADER_SIZE + self.nslots * self.slot_size)
+        except Exception:
+            os.close(self._fd)
+            raise
+        self._index: Dict[str, int] = {}
+        self._last: Dict[str, Reading] = {}
+
+    def close(self):
+        try:
+            self.mm.close()
+        finally:
+            os.close(self._fd)
+
+    # ---- directory ----
+    def _offset(self, i: int) -> int:
+        return HEADER_SIZE + i * self.slot_size
+
+    def _scan(self):
+        mm = self.mm
+        for i in range(self.nslots):
+            _, _, _, name, _, _ = SLOT_HDR.unpack_from(mm, self._offset(i))
+            name = name.rstrip(b"\0")
+            if not name:
+                break
+            self._index[name.decode("utf-8")] = i
+
+    def _find(self, name: str) -> Optional[int]:
+        i = self._index.get(name)
+        if i is None:
+            self._scan()   # başka process yeni slot açmış olabilir
+            i = self._index.get(name)
+        return i
+
+    def names(self) -> List[str]:
+        self._scan()
+        return sorted(self._index, key=self._index.get)
+
+    # ---- write side ----
+    def writer(self, name: str, fmt: Optional[str] = None) -> "SlotWriter":
+        fmt = fmt or SLOTS.get(name)
+        if not fmt:
+            raise StateBoardError(f"unknown slot {name!r} (fmt gerekli)")
+        st = struct.Struct(fmt)
+        if len(name.encode()) > 24 or len(fmt.encode()) > 16:
+            raise StateBoardError(f"slot name/fmt too long: {name!r} {fmt!r}")
+        if SLOT_HDR.size + st.size > self.slot_size:
+            raise StateBoardError(f"slot {name!r}: {st.size} B payload does not fit")
+
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            self._scan()
+            i = self._index.get(name)
+            if i is None:
+                i = len(self._index)
+                if i >= self.nslots:
+                    raise StateBoardError("state board full")
+                SLOT_HDR.pack_into(self.mm, self._offset(i), 0, 0.0, 0,
+                                   name.encode(), fmt.encode(), st.size)
+                self._index[name] = i
+            else:
+                _, _, _, _, old_fmt, _ = SLOT_HDR.unpack_from(self.mm, self._offset(i))
+                if old_fmt.rstrip(b"\0").decode() != fmt:
+                    # layout değişti (yeni sürüm): slot'u yeniden tanımla
+                    SLOT_HDR.pack_into(self.mm, self._offset(i), 0, 0.0, 0,
+                                       name.encode(), fmt.encode(), st.size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return SlotWriter(self, self._offset(i), st)
+
+    # ---- read side ----
+    def read(self, name: str) -> Optional[Reading]:
+        """
+        Latest value (None: slot yok / hiç yazılmadı). If no consistent copy
+        can be taken (writer preempted mid-write), the last good one is returned.
+        """
+        i = self._find(name)
+        if i is None:
+            return None
+        mm = self.mm
+        off = self._offset(i)
+        for _ in range(READ_RETRIES):
+            seq1 = _SEQ.unpack_from(mm, off)[0]
+            if seq1 & 1:
+                time.sleep(0)   # yazar yazıyor: ona CPU bırak (tek çekirdek)
+                continue
+            if seq1 == 0:
+                return None
+            _, ts, crc, _, fmt, n = SLOT_HDR.unpack_from(mm, off)
+            p = off + SLOT_HDR.size
+            data = mm[p:p + n]
+            if _SEQ.unpack_from(mm, off)[0] != seq1 or zlib.crc32(data) != crc:
+                continue
+            try:
+                values = struct.unpack(fmt.rstrip(b"\0").decode(), data)
+            except struct.error:
+                return None
+            r = self._last[name] = Reading(values, ts, seq1 >> 1)
+            return r
+        return self._last.get(name)
+
+    def snapshot(self) -> Dict[str, Reading]:
+        out = {}
+        for name in self.names():
+            r = self.read(name)
+            if r is not None:
+                out[name] = r
+        return out
+
+
+class SlotWriter:
+    """Single writer of one slot (write() is not thread-safe across threads)."""
+
+    __slots__ = ("mm", "off", "st", "seq", "_p")
+
+    def __init__(self, board: StateBoard, off: int, st: struct.Struct):
+        self.mm = board.mm
+        self.off = off
+        self.st = st
+        self._p = off + SLOT_HDR.size
+        seq = _SEQ.unpack_from(self.mm, off)[0]
+        self.seq = seq + (seq & 1)   # önceki yazar yarıda öldüyse çifte yuvarla
+
+    def write(self, *values, ts: Optional[float] = None):
+        data = self.st.pack(*values)
+        mm = self.mm
+        off = self.off
+        seq = self.seq
+        _SEQ.pack_into(mm, off, seq + 1)
+        mm[self._p:self._p + len(data)] = data
+        _TS_CRC.pack_into(mm, off + _TS_CRC_OFF, time.time() if ts is None else ts, zlib.crc32(data))
+        self.seq = seq + 2
+        _SEQ.pack_into(mm, off, self.seq)
+
+
+class _NullWriter:
+    def write(self, *values, ts: Optional[float] = None):
+        pass
+
+
+_board: Optional[StateBoard] = None
+_board_failed = False
+
+
+def get_board() -> Optional[StateBoard]:
+    """Process-wide board (None: /dev/shm kullanılamıyor)."""
+    global _board, _board_failed
+    if _board is None and not _board_failed:
+        try:
+            _board = StateBoard()
+        except (OSError, StateBoardError) as e:
+            _board_failed = True
+            print(f"[BOARD] ⚠️ state board disabled: {e}")
+    return _board
+
+
+def slot_writer(name: str, fmt: Optional[str] = None):
+    """Writer for name, or a no-op writer if the board is unavailable (telemetry never breaks the caller)."""
+    board = get_board()
+    if board is None:
+        return _NullWriter()
+    try:
+        return board.writer(name, fmt)
+    except StateBoardError as e:
+        print(f"[BOARD] ⚠️ {e}")
+        return _NullWriter()
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def _fmt_values(values: tuple) -> str:
+    out = []
+    for v in values:
+        if isinstance(v, bytes):
+            v = v.rstrip(b"\0").decode("utf-8", errors="replace")
+        elif isinstance(v, float):
+            v = round(v, 3)
+        out.append(str(v))
+    return " ".join(out)
+
+
+def dump(board: StateBoard):
+    now = time.time()
+    for name, r in board.snapshot().items():
+        print(f"{name:18s} seq={r.seq:<8d} age={now - r.ts:7.3f}s  {_fmt_values(r.values)}")
+
+
+def bench(n: int = 200000):
+    import tempfile
+
+    path = os.path.join(tempfile.mkdtemp(prefix="robi_board_"), "board")
+    board = StateBoard(path)
+    w = board.writer("audio.level")
+    t0 = time.perf_counter()
+    for i in range(n):
+        w.write(0.1, 0.2)
+    t_write = (time.perf_counter() - t0) / n
+    t0 = time.perf_counter()
+    for i in range(n):
+        board.read("audio.level")
+    t_read = (time.perf_counter() - t0) / n
+
+    from robi_wire import encode_frame
+    ev = {"type": "audio.level", "rms": 0.1, "peak": 0.2, "ts": time.time()}
+    t0 = time.perf_counter()
+    for i in range(n):
+        encode_frame(ev, "json")
+    t_enc = (time.perf_counter() - t0) / n
+    print(f"[BOARD][BENCH] write {t_write * 1e6:.2f} us  read {t_read * 1e6:.2f} us  "
+          f"(bus publish: JSON encode alone {t_enc * 1e6:.2f} us + socket + bus + decode per subscriber)")
+    board.close()
+    os.remove(path)
+    os.rmdir(os.path.dirname(path))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="ROBI shared-memory state board")
+    ap.add_argument("--path", default=STATEBOARD_PATH)
+    ap.add_argument("--watch", type=float, default=0.0, metavar="SEC", help="her SEC saniyede bir yazdır")
+    ap.add_argument("--bench", action="store_true", help="yazma/okuma maliyetini ölç")
+    args = ap.parse_args()
+
+    if args.bench:
+        bench()
+        return
+    try:
+        board = StateBoard(args.path, create=False)
+    except (OSError, StateBoardError) as e:
+        raise SystemExit(f"[BOARD][ERR] {e}")
+    try:
+        while True:
+            dump(board)
+            if args.watch <= 0:
+                break
+            time.sleep(args.watch)
+            print()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        board.close()
+
+
+if __name__ == "__main__":
+    main()
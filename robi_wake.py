@@ -9,11 +9,8 @@ ROBI Wake Word Service (stable, wake-only)
   - webrtcvad for speech segmentation (VAD)
   - Vosk with GRAMMAR for robust "Robi" detection (no full-STT)
 
-Writes events to JSONL:
-  /tmp/robi_events.jsonl
-
-Event example:
-  {"type":"WAKE_WORD","word":"robi","confidence":0.86,"_ts":1730000000.123}
+Publishes events to robi_bus (kept on disk by robi_journal):
+  {"type":"WAKE_WORD","source":"wake","payload":{"word":"robi","confidence":0.86,...},"_ts":...}
 
 Install:
   pip install sounddevice webrtcvad vosk
@@ -35,38 +32,32 @@ Tips:
 from __future__ import annotations
 
 import audioop
-import subprocess
 import argparse
 import json
 import os
-import queue
 import signal
 import sys
 import time
 from dataclasses import dataclass
 from typing import Optional, List
 
-import sounddevice as sd
 import webrtcvad
-from vosk import Model, KaldiRecognizer  # type: ignore
-import socket, json, time
+
+from robi_client import get_publisher
+from robi_constants import BUS_SOCKET, MIC_RING_PATH
+from robi_models import SessionLost, make_recognizer, open_model
+from robi_sources import AudioSource, device_spec, open_source, sd
+from robi_wakeword import StreamingWake
 
 MIC_LOCK_PATH = "/tmp/robi_mic.lock"
 
-EVENTBUS_SOCK = "/tmp/robi_eventbus.sock"
+_bus = get_publisher(BUS_SOCKET)
 
 def send_event(event: dict):
-    try:
-        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        s.connect(EVENTBUS_SOCK)
-        s.sendall((json.dumps(event) + "\n").encode())
-        s.close()
-    except Exception as e:
-        print("[WAKE] ❌ EventBus send failed:", e)
+    # kalıcı bağlantı; bus yoksa event buffer'da bekler, wake döngüsü bloklanmaz
+    _bus.publish(event)
 
 
-DEFAULT_EVENTS_PATH = "/tmp/robi_events.jsonl"
-
 # -----------------------------
 # Utilities
 # -----------------------------
@@ -74,12 +65,6 @@ def now_ts() -> float:
     return time.time()
 
 
-def write_jsonl(path: str, obj: dict) -> None:
-    line = json.dumps(obj, ensure_ascii=False)
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(line + "\n")
-
-
 def clamp(n: int, lo: int, hi: int) -> int:
     return max(lo, min(hi, n))
 
@@ -100,8 +85,10 @@ class WakeConfig:
     pre_roll_ms: int = 200           # keep a little audio before speech start
     cooldown_sec: float = 1.2        # ignore new wake for a moment after a trigger
 
-    events_path: str = DEFAULT_EVENTS_PATH
     device: Optional[str] = None     # device name or index as string for sounddevice
+    mic_ring: Optional[str] = MIC_RING_PATH  # robi_mic.py ring; None → own arecord (legacy)
+    source: Optional[str] = None     # robi_sources spec (file:wake.wav, sd:1 ...); None → mic_ring / arecord
+    source_realtime: bool = True     # dosya replay: False → olabildiğince hızlı
 
     # Grammar: limit recognition to wake word variants.
     # Vosk "grammar" expects JSON array of phrases.
@@ -111,6 +98,8 @@ class WakeConfig:
     accept_if_contains: List[str] = None  # tokens to accept if detected in result text
     debug: bool = False
     beep_on_wake: bool = False
+    streaming: bool = True           # continuous grammar spotting (robi_wakeword.StreamingWake)
+    model_server: Optional[bool] = None  # robi_models.py session; None → socket varsa
 
 
 # -----------------------------
@@ -199,25 +188,31 @@ class SpeechSegmenter:
 class WakeDetector:
     def __init__(self, model_path: str, cfg: WakeConfig):
         self.cfg = cfg
-        self.model = Model(model_path)
+        self.model = open_model(model_path, use_server=cfg.model_server)
 
         grammar = cfg.grammar_phrases or ["robi"]
         grammar_json = json.dumps(grammar, ensure_ascii=False)
 
-        self.rec = KaldiRecognizer(self.model, cfg.sample_rate, grammar_json)
+        self.rec = make_recognizer(self.model, cfg.sample_rate, grammar_json)
         self.rec.SetWords(True)
 
-    def detect(self, audio_bytes: bytes) -> Optional[dict]:
-        """
-        Returns dict with detection details if wake found.
-        """
+    def _decode(self, audio_bytes: bytes) -> str:
         self.rec.Reset()
         # Feed in chunks to recognizer
         chunk = 4000
         for i in range(0, len(audio_bytes), chunk):
             self.rec.AcceptWaveform(audio_bytes[i:i + chunk])
+        return self.rec.FinalResult()
 
-        result = self.rec.FinalResult()
+    def detect(self, audio_bytes: bytes) -> Optional[dict]:
+        """
+        Returns dict with detection details if wake found.
+        """
+        try:
+            result = self._decode(audio_bytes)
+        except SessionLost:
+            # model server yeniden başladı: segment elde, yeni session'da baştan çöz
+            result = self._decode(audio_bytes)
         try:
             data = json.loads(result)
         except Exception:
@@ -262,146 +257,129 @@ class WakeService:
         self.cfg = cfg
         self.model_path = model_path
 
-        self._q: "queue.Queue[bytes]" = queue.Queue(maxsize=200)
         self._stop = False
         self._cooldown_until = 0.0
 
         self.segmenter = SpeechSegmenter(cfg)
-        self.detector = WakeDetector(model_path, cfg)
+        # stream modunda segment detector'ı hiç kurulmaz (fazladan recognizer / model server session'ı)
+        self.detector = None
+        self.stream = None
+        if cfg.streaming:
+            self.stream = StreamingWake(
+                open_model(model_path, use_server=cfg.model_server),
+                cfg.sample_rate,
+                cfg.frame_ms,
+                grammar=cfg.grammar_phrases or ["robi"],
+                accept=cfg.accept_if_contains or ["robi", "roby", "robby", "rubi"],
+                vad_mode=clamp(cfg.vad_mode, 0, 3),
+            )
+        else:
+            self.detector = WakeDetector(model_path, cfg)
 
     def stop(self):
         self._stop = True
 
-    def _audio_cb(self, indata, frames, time_info, status):
-        if status and self.cfg.debug:
-            print("[AUDIO STATUS]", status, file=sys.stderr)
-
-        # indata is bytes in RawInputStream
-        try:
-            self._q.put_nowait(bytes(indata))
-        except queue.Full:
-            # drop if overloaded
-            pass
-
     def run(self):
-        # Make sure events path dir exists
-        os.makedirs(os.path.dirname(self.cfg.events_path), exist_ok=True)
-
         # Print header
         print("🤖 [WAKE] ROBI Wake | online")
-        print(f"🔊 [WAKE] device={self.cfg.device or 'default'} sr={self.cfg.sample_rate} frame={self.cfg.frame_ms}ms vad={self.cfg.vad_mode}")
+        spec = self.cfg.source or device_spec(self.cfg.mic_ring, self.cfg.arecord_device)
+        print(f"🔊 [WAKE] source={spec} sr={self.cfg.sample_rate} frame={self.cfg.frame_ms}ms vad={self.cfg.vad_mode}")
         print(f"🧠 [WAKE] vosk_model={self.model_path}")
-        print(f"📝 [WAKE] events={self.cfg.events_path}")
+        print(f"📝 [WAKE] events=bus:{BUS_SOCKET}")
         if self.cfg.debug:
             print(f"[WAKE] 🧪 grammar={self.cfg.grammar_phrases} accept_tokens={self.cfg.accept_if_contains}")
 
-        # arecord üzerinden RAW PCM okuyacağız (eski çalışan yöntem)
         frame_bytes = int(self.cfg.sample_rate * (self.cfg.frame_ms / 1000.0) * 2)  # int16 mono
-        cmd = [
-            "arecord",
-            "-D", self.cfg.arecord_device,
-            "-f", "S16_LE",
-            "-r", str(self.cfg.sample_rate),
-            "-c", str(self.cfg.channels),
-            "-t", "raw",
-        ]
-
-        if self.cfg.debug:
-            print("[WAKE] 🎙️ arecord cmd:", " ".join(cmd))
-
-        p = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL,
-            bufsize=frame_bytes * 50,
+        # varsayılan robi_mic ring (cihazı açmayız, kopyasız okuruz); --own-mic: eski arecord
+        src = open_source(
+            spec,
+            self.cfg.sample_rate,
+            self.cfg.frame_ms,
+            realtime=self.cfg.source_realtime,
+            pad_ms=500,
+            debug=self.cfg.debug,
         )
-
         try:
-            while not self._stop:
-                data = p.stdout.read(frame_bytes)
-                data = audioop.mul(data, 2, 2.5)  # 2 byte sample, gain x2.5
-
-                # print("audio frame", len(data))
-
-                if not data or len(data) != frame_bytes:
-                    continue
-
-                # 🔇 Brain konuşuyor/dinliyor → wake durmalı
-                if os.path.exists(MIC_LOCK_PATH):
-                    if self.cfg.debug:
-                        print("[WAKE] 🔇 MIC locked by brain, wake paused")
-                    continue
-
-                utt = self.segmenter.push_frame(data)
-                if utt is None:
-                    continue
-
-                # cooldown
-                t = now_ts()
-                if t < self._cooldown_until:
-                    continue
-
-                det = self.detector.detect(utt)
-                if det:
-                    print("[WAKE] ✅ WAKE:", det["heard"], det["confidence"])
-
-                    write_jsonl(self.cfg.events_path, det)
-
-                    send_event({
-                        "type": "WAKE_WORD",
-                        "source": "wake",
-                        "payload": {
-                            "word": det["word"],
-                            "confidence": det["confidence"],
-                            "heard": det["heard"],
-                        },
-                        "_ts": det["_ts"],
-                    })
-
-                    self._cooldown_until = now_ts() + self.cfg.cooldown_sec
-
-                    if self.cfg.beep_on_wake:
-                        sys.stdout.write("\a")
-                        sys.stdout.flush()
+            self._loop(src, frame_bytes)
         finally:
-            try:
-                p.terminate()
-            except Exception:
-                pass
-
-            while not self._stop:
-                try:
-                    frame = self._q.get(timeout=0.5)
-                except queue.Empty:
-                    continue
-
-                utt = self.segmenter.push_frame(frame)
-                if utt is None:
-                    continue
-
-                # cooldown
-                t = now_ts()
-                if t < self._cooldown_until:
-                    continue
-
-                det = self.detector.detect(utt)
-                if det:
-                    write_jsonl(self.cfg.events_path, det)
-                    if self.cfg.debug:
-                        print("[WAKE] ✅ WAKE:", det)
+            src.close()
+
+    def _detect(self, data: bytes) -> Optional[dict]:
+        if self.stream is not None:
+            hit = self.stream.push(data)
+            if hit is None or now_ts() < self._cooldown_until:
+                return None
+            return {
+                "type": "WAKE_WORD",
+                "word": "robi",
+                "heard": hit["heard"],
+                "confidence": hit["confidence"],
+                "_ts": now_ts(),
+            }
+
+        utt = self.segmenter.push_frame(data)
+        if utt is None:
+            return None
 
-                    self._cooldown_until = now_ts() + self.cfg.cooldown_sec
+        # cooldown
+        t = now_ts()
+        if t < self._cooldown_until:
+            return None
 
-                    if self.cfg.beep_on_wake:
-                        # simple terminal bell (works on some setups)
-                        sys.stdout.write("\a")
-                        sys.stdout.flush()
+        return self.detector.detect(utt)
+
+    def _loop(self, src: AudioSource, frame_bytes: int):
+        """Frame loop over an AudioSource (returns when a file / synthetic source ends)."""
+        while not self._stop:
+            data = src.read(timeout=0.1)
+            if data is None:
+                if src.eof:
+                    break
+                continue
+            data = audioop.mul(data, 2, 2.5)  # 2 byte sample, gain x2.5 (kopya: ring view'ı tutulmaz)
+
+            # print("audio frame", len(data))
+
+            if not data or len(data) != frame_bytes:
+                continue
+
+            # 🔇 Brain konuşuyor/dinliyor → wake durmalı
+            if os.path.exists(MIC_LOCK_PATH):
+                if self.cfg.debug:
+                    print("[WAKE] 🔇 MIC locked by brain, wake paused")
+                if self.stream is not None:
+                    self.stream.reset()
+                continue
+
+            det = self._detect(data)
+            if det:
+                print("[WAKE] ✅ WAKE:", det["heard"], det["confidence"])
+
+                send_event({
+                    "type": "WAKE_WORD",
+                    "source": "wake",
+                    "payload": {
+                        "word": det["word"],
+                        "confidence": det["confidence"],
+                        "heard": det["heard"],
+                    },
+                    "_ts": det["_ts"],
+                })
+
+                self._cooldown_until = now_ts() + self.cfg.cooldown_sec
+
+                if self.cfg.beep_on_wake:
+                    sys.stdout.write("\a")
+                    sys.stdout.flush()
 
 
 # -----------------------------
 # CLI
 # -----------------------------
 def list_devices() -> None:
+    if sd is None:
+        print("[WAKE] ❌ sounddevice is not installed (pip install sounddevice)", file=sys.stderr)
+        return
     print(sd.query_devices())
 
 
@@ -410,9 +388,15 @@ def parse_args():
 
     p.add_argument("--model", required=False, default=os.environ.get("ROBI_VOSK_MODEL"),
                    help="Path to Vosk model folder (or set ROBI_VOSK_MODEL)")
-    p.add_argument("--events", default=DEFAULT_EVENTS_PATH, help="JSONL event bus path")
+    p.add_argument("--events", default=None, help="(deprecated, ignored) events go to robi_bus / robi_journal")
     p.add_argument("--device", default=None, help="Sounddevice input device (index or name). Use --list-devices")
     p.add_argument("--list-devices", action="store_true", help="List audio devices and exit")
+    p.add_argument("--mic-ring", default=MIC_RING_PATH, help="robi_mic.py PCM ring to read from")
+    p.add_argument("--own-mic", action="store_true",
+                   help="open the device ourselves instead of the robi_mic ring (arecord; sounddevice with --device)")
+    p.add_argument("--source", default=None,
+                   help="robi_sources spec instead of the mic: file:wake.wav, sd:DEV, synth:noise:10 ...")
+    p.add_argument("--replay-fast", action="store_true", help="replay --source files as fast as possible")
 
     p.add_argument("--sr", type=int, default=16000, help="Sample rate (default 16000)")
     p.add_argument("--frame-ms", type=int, default=20, choices=[10, 20, 30], help="Frame size for VAD (10/20/30)")
@@ -429,6 +413,10 @@ def parse_args():
     p.add_argument("--accept", default="robi,roby,robby,rubi",
                    help="Comma-separated tokens; if any appears in recognized text => wake")
 
+    p.add_argument("--wake-mode", choices=["stream", "segment"], default="stream",
+                   help="stream: continuous grammar spotting; segment: re-decode each VAD segment")
+    p.add_argument("--model-server", choices=["auto", "on", "off"], default="auto",
+                   help="recognizer session from robi_models.py (auto: if its socket answers) or load the model here")
     p.add_argument("--debug", action="store_true", help="Verbose logging")
     p.add_argument("--beep", action="store_true", help="Beep on wake trigger")
 
@@ -455,12 +443,16 @@ def main():
         end_silence_ms=args.end_silence_ms,
         pre_roll_ms=args.pre_roll_ms,
         cooldown_sec=args.cooldown,
-        events_path=args.events,
         device=args.device,
+        mic_ring=None if args.own_mic else args.mic_ring,
+        source=args.source or (f"sd:{args.device}" if args.own_mic and args.device else None),
+        source_realtime=not args.replay_fast,
         grammar_phrases=[s.strip() for s in args.grammar.split(",") if s.strip()],
         accept_if_contains=[s.strip() for s in args.accept.split(",") if s.strip()],
         debug=args.debug,
         beep_on_wake=args.beep,
+        streaming=args.wake_mode == "stream",
+        model_server={"auto": None, "on": True, "off": False}[args.model_server],
     )
 
     svc = WakeService(cfg, model_path=args.model)
@@ -477,7 +469,8 @@ def main():
         pass
     except Exception as e:
         # Crash-safe log to event bus (so brain can see wake service died)
-        write_jsonl(cfg.events_path, {"type": "WAKE_SERVICE_ERROR", "error": str(e), "_ts": now_ts()})
+        send_event({"type": "WAKE_SERVICE_ERROR", "error": str(e), "_ts": now_ts()})
+        _bus.flush(1.0)
         raise
     finally:
         print("[WAKE] \n👋 ROBI Wake | offline")
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+robi_wakeword.py
+Streaming wake-word spotter shared by robi_audio and robi_wake.
+
+İki ayrı daemon aynı spotter'ı kullanır; sadece webrtcvad ve robi_models'e
+bağlı (audio servisinin rpc / stateboard / capture kodunu çekmez).
+
+  spot = StreamingWake(model, 16000, 20, grammar=["robi"], accept=["robi"])
+  hit = spot.push(frame)          # {"heard": ..., "confidence": ...} ya da None
+"""
+
+from __future__ import annotations
+
+import json
+from typing import List, Optional
+
+import webrtcvad
+
+from robi_models import SessionLost, make_recognizer
+
+
+class StreamingWake:
+    """
+    Continuous wake spotting: one grammar recognizer is fed frame by frame
+    (no segment re-decode) and fires as soon as an accept token shows up in
+    a partial or final result. VAD only gates feeding: after hangover_ms of
+    non-speech the remaining result is checked and the recognizer is reset;
+    uninterrupted sound is reset every reset_sec to bound decoder state.
+    """
+
+    def __init__(self, model, sample_rate: int, frame_ms: int, grammar: List[str],
+                 accept: List[str], vad_mode: int = 2, hangover_ms: int = 300,
+                 partial_ms: int = 100, reset_sec: float = 10.0):
+        # [unk]: grammar dışı konuşma "robi"ye zorlanmasın (sürekli beslemede şart)
+        grammar = list(grammar) + ([] if "[unk]" in grammar else ["[unk]"])
+        self.rec = make_recognizer(model, sample_rate, json.dumps(grammar, ensure_ascii=False))
+        self.rec.SetWords(True)
+        self.accept = accept
+        self.vad = webrtcvad.Vad(vad_mode)
+        self.sample_rate = sample_rate
+        self.hang_frames = max(1, hangover_ms // frame_ms)
+        self.partial_every = max(1, partial_ms // frame_ms)
+        self.reset_frames = max(1, int(reset_sec * 1000 / frame_ms))
+        self.resets = 0
+        self._hang = 0
+        self._fed = 0
+
+    def reset(self):
+        if self._fed:   # mute sırasında her frame çağrılır: boşsa Kaldi Reset'e gerek yok
+            self.rec.Reset()
+        self._hang = 0
+        self._fed = 0
+
+    def _match(self, data: dict, key: str) -> Optional[dict]:
+        text = (data.get(key) or "").replace("[unk]", " ").strip().lower()
+        if not text or not any(t in text for t in self.accept):
+            return None
+        conf = None
+        words = data.get("result")
+        if isinstance(words, list) and words:
+            confs = [
+                w.get("conf")
+                for w in words
+                if isinstance(w, dict) and isinstance(w.get("conf"), (int, float))
+                and any(t in (w.get("word") or "") for t in self.accept)
+            ]
+            if confs:
+                conf = sum(confs) / len(confs)
+        return {"heard": " ".join(text.split()), "confidence": conf}
+
+    def push(self, frame: bytes) -> Optional[dict]:
+        try:
+            return self._push(frame)
+        except SessionLost:
+            # model server yeniden başladı, yeni session boş: bu konuşma baştan sayılır
+            self._hang = 0
+            self._fed = 0
+            return None
+
+    def _push(self, frame: bytes) -> Optional[dict]:
+        if self.vad.is_speech(frame, self.sample_rate):
+            self._hang = self.hang_frames
+        elif self._hang == 0:
+            return None     # sessizlik: recognizer zaten sıfır, CPU harcama
+        else:
+            self._hang -= 1
+
+        self._fed += 1
+        if self.rec.AcceptWaveform(frame):
+            hit = self._match(json.loads(self.rec.Result() or "{}"), "text")
+        elif self._fed % self.partial_every == 0:
+            hit = self._match(json.loads(self.rec.PartialResult() or "{}"), "partial")
+        else:
+            hit = None
+
+        if hit is None and self._hang == 0:
+            # konuşma bitti: kalan sonucu kontrol et, state'i bırak
+            hit = self._match(json.loads(self.rec.FinalResult() or "{}"), "text")
+            self.reset()
+        elif hit is not None:
+            self.reset()
+        elif self._fed >= self.reset_frames:
+            self.resets += 1
+            self.reset()
+        return hit
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+robi_wire.py
+ROBI bus wire protocol: role header, framing and codecs.
+
+v1 (legacy):  "PUB\n" / "SUB\n" header, then one JSON object per line.
+v2:           "PUB v2 codec=msgpack\n" header, server answers "OK v2 codec=<name>\n",
+              then length-prefixed frames: 4 byte big-endian length + encoded body.
+
+Old clients never send "v2", so they keep talking JSON lines.
+"""
+
+from __future__ import annotations
+
+import json
+import struct
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+# -----------------------------
+# Optional msgpack codec
+# -----------------------------
+try:
+    import msgpack  # type: ignore
+except Exception:
+    msgpack = None  # type: ignore
+
+
+def _json_dumps(ev: dict) -> bytes:
+    return json.dumps(ev, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _json_loads(body: bytes) -> dict:
+    return json.loads(body)
+
+
+CODECS: Dict[str, tuple] = {"json": (_json_dumps, _json_loads)}
+if msgpack is not None:
+    CODECS["msgpack"] = (
+        lambda ev: msgpack.packb(ev, use_bin_type=True),
+        lambda body: msgpack.unpackb(body, raw=False),
+    )
+
+DEFAULT_CODEC = "msgpack" if "msgpack" in CODECS else "json"
+
+_LEN = struct.Struct(">I")
+MAX_FRAME = 1 << 20  # 1 MB: bundan büyük frame protokol hatası sayılır
+MAX_HEADER = 512
+ROLES = ("PUB", "SUB", "STATS")   # STATS: tek seferlik istatistik sorgusu
+
+
+def pick_codec(name: Optional[str]) -> str:
+    return name if name in CODECS else "json"
+
+
+# -----------------------------
+# Priority classes
+# -----------------------------
+# Kontrol event'leri (gecikmeye hassas) kuyruklarda bulk trafiğin önüne geçer.
+CONTROL_TYPES = frozenset({
+    "TTS_START", "TTS_END", "LISTEN", "WAKE", "WAKE_WORD", "DONE", "TIMEOUT",
+})
+CONTROL_PREFIXES = ("rpc.",)
+
+
+def is_control(typ: Optional[str], extra=()) -> bool:
+    if typ is None:
+        return False
+    return typ in CONTROL_TYPES or typ.startswith(CONTROL_PREFIXES) or typ in extra
+
+
+def wants(topics, typ: str) -> bool:
+    """Would a SUB with these topics receive typ? (robi_bus.Router semantics, one subscriber)"""
+    if not topics:
+        return True
+    for t in topics:
+        if t == "*" or t == typ or (t.endswith("*") and typ.startswith(t[:-1])):
+            return True
+    return False
+
+
+# -----------------------------
+# Role header
+# -----------------------------
+@dataclass
+class Header:
+    role: str                       # "PUB" / "SUB" / "STATS"
+    version: int = 1
+    opts: Dict[str, str] = field(default_factory=dict)
+    topics: List[str] = field(default_factory=list)
+
+
+def parse_header(line: bytes, roles=ROLES) -> Optional[Header]:
+    """
+    "SUB v2 codec=json speech.* LISTEN" -> Header("SUB", 2, {"codec": "json"}, [...])
+    Returns None if the line is not a role header (legacy: first message).
+    roles: accepted first words (robi_bridge uses the same grammar with its own).
+    """
+    parts = line.decode("utf-8", errors="ignore").split()
+    if not parts or parts[0] not in roles:
+        return None
+
+    h = Header(role=parts[0])
+    for p in parts[1:]:
+        if p[0] == "v" and p[1:].isdigit():
+            h.version = int(p[1:])
+        elif "=" in p:
+            k, v = p.split("=", 1)
+            h.opts[k] = v
+        else:
+            h.topics.append(p)
+    return h
+
+
+def make_header(role: str, version: int = 1, topics=None, **opts) -> bytes:
+    parts = [role]
+    if version > 1:
+        parts.append(f"v{version}")
+    parts += [f"{k}={v}" for k, v in opts.items() if v is not None]
+    parts += list(topics or [])
+    return (" ".join(parts) + "\n").encode("utf-8")
+
+
+def make_ack(version: int, codec: str) -> bytes:
+    return f"OK v{version} codec={codec}\n".encode("utf-8")
+
+
+def parse_ack(line: bytes) -> Optional[str]:
+    """ "OK v2 codec=msgpack" -> "msgpack" (None: ack değil) """
+    parts = line.decode("utf-8", errors="ignore").split()
+    if len(parts) < 2 or parts[0] != "OK" or parts[1] != "v2":
+        return None
+    for p in parts[2:]:
+        if p.startswith("codec="):
+            return pick_codec(p[6:])
+    return "json"
+
+
+# -----------------------------
+# Encoders
+# -----------------------------
+def encode_line(ev: dict) -> bytes:
+    return (json.dumps(ev, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def encode_frame(ev: dict, codec: str) -> bytes:
+    body = CODECS[codec][0](ev)
+    return _LEN.pack(len(body)) + body
+
+
+def decode_body(body: bytes, codec: str) -> dict:
+    return CODECS[codec][1](body)
+
+
+# -----------------------------
+# Decoders (incremental, no rescans)
+# -----------------------------
+class LineDecoder:
+    """
+    Newline-delimited stream → complete lines (with "\\n").
+    Only the newly received bytes are searched for a newline.
+    """
+
+    def __init__(self):
+        self.buf = bytearray()
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        buf = self.buf
+        scan = len(buf)
+        buf += chunk
+        out = []
+        start = 0
+        while True:
+            nl = buf.find(b"\n", scan)
+            if nl < 0:
+                break
+            out.append(bytes(buf[start:nl + 1]))
+            start = scan = nl + 1
+        if start:
+            del buf[:start]
+        return out
+
+
+class FrameDecoder:
+    """
+    Length-prefixed stream → frame bodies.
+    Raises ValueError on an oversize frame (connection should be dropped).
+    """
+
+    def __init__(self):
+        self.buf = bytearray()
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        buf = self.buf
+        buf += chunk
+        out = []
+        pos = 0
+        n = len(buf)
+        while n - pos >= 4:
+            (size,) = _LEN.unpack_from(buf, pos)
+            if size > MAX_FRAME:
+                raise ValueError(f"frame too large: {size}")
+            end = pos + 4 + size
+            if end > n:
+                break
+            out.append(bytes(buf[pos + 4:end]))
+            pos = end
+        if pos:
+            del buf[:pos]
+        return out
+
+
+# -----------------------------
+# Message (bus içi, encode cache'li)
+# -----------------------------
+class Message:
+    """
+    One event travelling through the bus. Decoding and each encoding is done
+    at most once, and only if some connection actually needs it.
+    """
+
+    __slots__ = ("_ev", "_line", "_frames")
+
+    def __init__(self, ev: Optional[dict] = None, line: Optional[bytes] = None):
+        self._ev = ev
+        self._line = line
+        self._frames: Dict[str, bytes] = {}
+
+    @classmethod
+    def from_frame(cls, body: bytes, codec: str) -> "Message":
+        m = cls()
+        m._frames[codec] = _LEN.pack(len(body)) + body
+        return m
+
+    @property
+    def ev(self) -> Any:
+        if self._ev is None:
+            if self._line is not None:
+                self._ev = json.loads(self._line)
+            else:
+                codec, frame = next(iter(self._frames.items()))
+                self._ev = decode_body(frame[4:], codec)
+        return self._ev
+
+    @property
+    def type(self) -> Optional[str]:
+        """Event "type" (None: decode edilemedi / dict değil)."""
+        try:
+            ev = self.ev
+        except Exception:
+            return None
+        return ev.get("type") if isinstance(ev, dict) else None
+
+    def peek_type(self) -> Optional[str]:
+        """Event "type" only if already decoded (never decodes)."""
+        ev = self._ev
+        return ev.get("type") if isinstance(ev, dict) else None
+
+    def mentions(self, needles) -> bool:
+        """
+        Cheap prefilter (never decodes): False only if none of the byte
+        strings appears in the encoded event, so its type can't be one of them.
+        """
+        raw = self._line
+        if raw is None:
+            if not self._frames:
+                return True
+            raw = next(iter(self._frames.values()))
+        return any(n in raw for n in needles)
+
+    def line(self) -> bytes:
+        if self._line is None:
+            self._line = encode_line(self.ev)
+        return self._line
+
+    def frame(self, codec: str) -> bytes:
+        f = self._frames.get(codec)
+        if f is None:
+            f = self._frames[codec] = encode_frame(self.ev, codec)
+        return f
+
+    def encoded(self, codec: Optional[str]) -> bytes:
+        """codec None → v1 JSON line, else v2 frame. ValueError on bad payload."""
+        return self.line() if codec is None else self.frame(codec)
+
+
+# -----------------------------
+# Client-side handshake
+# -----------------------------
+def client_handshake(sock, role: str, version: int = 2, topics=None,
+                     codec: Optional[str] = None, timeout: float = 1.0, **opts):
+    """
+    Sends the role header and, for v2, waits for the server ack.
+    Returns (codec, leftover): codec None means v1 JSON lines (old bus),
+    leftover is any data received after the ack.
+    """
+    if version < 2:
+        sock.sendall(make_header(role, 1, topics, **opts))
+        return None, b""
+
+    sock.sendall(make_header(role, version, topics, codec=codec or DEFAULT_CODEC, **opts))
+
+    old_timeout = sock.gettimeout()
+    sock.settimeout(timeout)
+    buf = b""
+    try:
+        while b"\n" not in buf and len(buf) < MAX_HEADER:
+            chunk = sock.recv(256)
+            if not chunk:
+                raise ConnectionError("bus closed during handshake")
+            buf += chunk
+    except OSError as e:
+        if not isinstance(e, TimeoutError):
+            raise
+        # eski bus: ack yok → v1'e düş
+    finally:
+        sock.settimeout(old_timeout)
+
+    line, sep, rest = buf.partition(b"\n")
+    got = parse_ack(line) if sep else None
+    if got is None:
+        return None, buf
+    return got, rest
@@ -13,13 +13,23 @@ STT_MODEL="$BASE_DIR/models/vosk-model-small-tr-0.3"
 
 # BUS + BRAIN (venv311)
 source "$VENV_BRAIN/bin/activate"
-python robi_bus.py &
+# yüksek frekanslı perception event'lerinde yavaş aboneye sadece son değer gitsin
+# retained: yeniden başlayan brain/audio core state, TTS ve presence'ı hemen alsın
+python robi_bus.py --coalesce "UNKNOWN_FACE=latest" --coalesce "PERSON_DETECTED=latest" \
+  --retain core.state --retain "tts=TTS_START,TTS_END" --retain FACE_CONFIRMED &
 sleep 0.3
+python robi_journal.py &
 python robi_brain.py &
+# tek capture owner: audio/wake/perception mic'i /dev/shm ring'inden okur
+python robi_mic.py &
 sleep 0.3
 
 # AUDIO (venv)
 source "$VENV_AUDIO/bin/activate"
+# modeller bir kez yüklenir; audio / wake / STT worker session açar
+rm -f /tmp/robi_models.sock
+python robi_models.py --preload "$WAKE_MODEL" --preload "$STT_MODEL" &
+for _ in $(seq 50); do [ -S /tmp/robi_models.sock ] && break; sleep 0.2; done
 python robi_audio.py \
   --wake-model "$WAKE_MODEL" \
   --stt-model "$STT_MODEL"